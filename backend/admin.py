@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import (
     users_collection, 
     schemes_collection, 
@@ -10,16 +10,20 @@ from models import (
     get_marquee_settings,
     update_marquee_settings
 )
+from catalog import bump_catalog_revision, catalog_stats
+from metrics import get_metrics
+from chat_cache import chat_cache_stats
+from genai_client import gemini_breaker
+from pagination import paged_listing
+from user_index import eligible_users_for_scheme, schedule_scheme_fanout, note_user_changed
+from eligibility_store import forget_user_eligibility
+from refresh_tokens import revoke_user_refresh_tokens
+from roles import admin_required, is_admin, revoke_admin_role, restore_admin_role, ADMIN
 from bson import ObjectId
 import bcrypt
 
 admin_bp = Blueprint('admin', __name__)
 
-def is_admin():
-    user_id = get_jwt_identity()
-    user = find_user_by_id(user_id)
-    return user and user.get('role') == 'admin'
-
 @admin_bp.route('/check', methods=['GET'])
 @jwt_required()
 def check_admin():
@@ -28,24 +32,21 @@ def check_admin():
     return jsonify({'is_admin': False}), 200
 
 @admin_bp.route('/users', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
+    page = paged_listing(users_collection, projection={'password_hash': 0})
+    if page is not None:
+        return page
     
-    users = list(users_collection.find())
+    users = list(users_collection.find({}, {'password_hash': 0}))
     for user in users:
         user['_id'] = str(user['_id'])
-        user.pop('password_hash', None)
     
     return jsonify(users), 200
 
 @admin_bp.route('/users/<user_id>', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_user(user_id):
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     user = find_user_by_id(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -55,54 +56,85 @@ def get_user(user_id):
     return jsonify(user), 200
 
 @admin_bp.route('/users/<user_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_user(user_id):
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     result = users_collection.delete_one({'_id': ObjectId(user_id)})
     if result.deleted_count == 0:
         return jsonify({'error': 'User not found'}), 404
     
+    note_user_changed(user_id)
+    forget_user_eligibility(user_id)
+    revoke_admin_role(user_id)
+    revoke_user_refresh_tokens(user_id)
     return jsonify({'message': 'User deleted successfully'}), 200
 
+@admin_bp.route('/users/<user_id>/role', methods=['PUT'])
+@admin_required
+def update_user_role(user_id):
+    role = (request.json or {}).get('role')
+    if role not in (ADMIN, 'user'):
+        return jsonify({'error': "Role must be 'admin' or 'user'"}), 400
+    
+    result = users_collection.update_one({'_id': ObjectId(user_id)}, {'$set': {'role': role}})
+    if result.matched_count == 0:
+        return jsonify({'error': 'User not found'}), 404
+    
+    # Tokens issued before a demotion still carry the admin claim
+    if role == ADMIN:
+        restore_admin_role(user_id)
+    else:
+        revoke_admin_role(user_id)
+    return jsonify({'message': 'Role updated successfully'}), 200
+
 @admin_bp.route('/schemes', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_schemes():
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
+    page = paged_listing(schemes_collection)
+    if page is not None:
+        return page
     
     schemes = get_all_schemes()
     return jsonify(schemes), 200
 
 @admin_bp.route('/schemes/<scheme_id>', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_scheme(scheme_id):
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     scheme = get_scheme_by_id(scheme_id)
     if not scheme:
         return jsonify({'error': 'Scheme not found'}), 404
     
     return jsonify(scheme), 200
 
+@admin_bp.route('/schemes/<scheme_id>/eligible-users', methods=['GET'])
+@admin_required
+def admin_get_scheme_eligible_users(scheme_id):
+    scheme = get_scheme_by_id(scheme_id)
+    if not scheme:
+        return jsonify({'error': 'Scheme not found'}), 404
+    
+    limit = request.args.get('limit', 100, type=int)
+    result = eligible_users_for_scheme(scheme, limit=max(limit, 0))
+    
+    return jsonify({
+        'scheme_id': scheme_id,
+        'total_users': result['total_users'],
+        'eligible_count': result['eligible_count'],
+        'eligible_via_tags_count': result['via_tags_count'],
+        'user_ids': result['user_ids']
+    }), 200
+
 @admin_bp.route('/schemes', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_create_scheme():
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     data = request.json
     scheme_id = create_scheme(data)
+    bump_catalog_revision(scheme_id)
+    schedule_scheme_fanout(scheme_id, data)
     return jsonify({'message': 'Scheme created', 'id': str(scheme_id)}), 201
 
 @admin_bp.route('/schemes/<scheme_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_scheme(scheme_id):
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     data = request.json
     data.pop('_id', None)
     
@@ -114,26 +146,24 @@ def admin_update_scheme(scheme_id):
     if result.matched_count == 0:
         return jsonify({'error': 'Scheme not found'}), 404
     
+    bump_catalog_revision(scheme_id)
+    schedule_scheme_fanout(scheme_id, get_scheme_by_id(scheme_id))
     return jsonify({'message': 'Scheme updated successfully'}), 200
 
 @admin_bp.route('/schemes/<scheme_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def admin_delete_scheme(scheme_id):
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     result = schemes_collection.delete_one({'_id': ObjectId(scheme_id)})
     if result.deleted_count == 0:
         return jsonify({'error': 'Scheme not found'}), 404
     
+    bump_catalog_revision(scheme_id)
+    schedule_scheme_fanout(scheme_id, None)
     return jsonify({'message': 'Scheme deleted successfully'}), 200
 
 @admin_bp.route('/stats', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_stats():
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     total_users = users_collection.count_documents({})
     total_schemes = schemes_collection.count_documents({})
     
@@ -143,22 +173,26 @@ def get_stats():
     }), 200
 
 
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_cache_metrics():
+    result = get_metrics()
+    result['catalog'] = catalog_stats()
+    result['chat_cache'] = chat_cache_stats()
+    result['gemini_circuit'] = gemini_breaker.stats()
+    return jsonify(result), 200
+
+
 @admin_bp.route('/marquee', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_marquee():
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     settings = get_marquee_settings()
     return jsonify(settings), 200
 
 
 @admin_bp.route('/marquee', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_marquee():
-    if not is_admin():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
     data = request.json
     update_marquee_settings(data)
     return jsonify({'message': 'Marquee settings updated successfully'}), 200
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -6,9 +7,11 @@ from auth import auth_bp
 from schemes import schemes_bp
 from admin import admin_bp
 from chat import chat_bp
+from indexes import ensure_indexes
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = Config.JWT_SECRET
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=Config.JWT_ACCESS_TOKEN_MINUTES)
 CORS(app, origins=[Config.CORS_ORIGIN])
 jwt = JWTManager(app)
 
@@ -17,6 +20,8 @@ app.register_blueprint(schemes_bp, url_prefix='/schemes')
 app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(chat_bp, url_prefix='/chat')
 
+ensure_indexes()
+
 @app.route('/')
 def home():
     return {'message': 'InfoMitra API'}, 200
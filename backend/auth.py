@@ -1,10 +1,19 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import bcrypt
-from models import create_user, find_user_by_phone, find_user_by_email, find_user_by_id, update_user_profile
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from functools import partial
+from pymongo.errors import DuplicateKeyError
+from models import create_user, find_user_by_phone, find_user_by_email, find_user_by_id, update_user_profile, update_password_hash
+from passwords import PasswordHasherBusy, hash_password, check_password, needs_rehash, schedule_rehash
+from user_index import note_user_changed
+from eligibility_store import refresh_user_eligibility
+from roles import create_user_token
+from refresh_tokens import issue_refresh_token, rotate_refresh_token, revoke_refresh_token
 
 auth_bp = Blueprint('auth', __name__)
 
+def busy_response():
+    return jsonify({'error': 'Server is busy, please try again in a moment'}), 503, {'Retry-After': '1'}
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     data = request.json
@@ -18,24 +27,35 @@ def signup():
     if not phone.isdigit() or len(phone) != 10:
         return jsonify({'error': 'Phone number must be exactly 10 digits'}), 400
     
-    existing_user = find_user_by_phone(phone)
-    if existing_user:
+    # Checked before hashing so repeat signups don't each cost a bcrypt hash,
+    # and so duplicates are refused even if the unique indexes could not be built
+    if find_user_by_phone(phone):
         return jsonify({'error': 'User already exists'}), 400
-    
-    if email:
-        existing_email = find_user_by_email(email)
-        if existing_email:
+
+    if email and find_user_by_email(email):
+        return jsonify({'error': 'Email already exists'}), 400
+
+    try:
+        password_hash = hash_password(password)
+    except PasswordHasherBusy:
+        return busy_response()
+
+    # The unique phone and email indexes catch signups racing past the checks above
+    try:
+        user_id = create_user(email, phone, password_hash)
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get('keyPattern') or {}
+        if 'email' in key_pattern or 'email_unique' in str(e):
             return jsonify({'error': 'Email already exists'}), 400
+        return jsonify({'error': 'User already exists'}), 400
     
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    
-    user_id = create_user(email, phone, password_hash)
-    
-    access_token = create_access_token(identity=str(user_id))
+    note_user_changed(user_id, {})
+    access_token = create_user_token(user_id, 'user')
     
     return jsonify({
         'message': 'User created successfully',
         'access_token': access_token,
+        'refresh_token': issue_refresh_token(user_id),
         'user_id': str(user_id)
     }), 201
 
@@ -61,17 +81,51 @@ def login():
     if not user:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+    try:
+        password_ok = check_password(password, user['password_hash'])
+    except PasswordHasherBusy:
+        return busy_response()
+    
+    if not password_ok:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    access_token = create_access_token(identity=str(user['_id']))
+    if needs_rehash(user['password_hash']):
+        schedule_rehash(password, user['password_hash'], partial(update_password_hash, user['_id']))
+    
+    access_token = create_user_token(user['_id'], user.get('role'))
     
     return jsonify({
         'message': 'Login successful',
         'access_token': access_token,
+        'refresh_token': issue_refresh_token(user['_id']),
         'user_id': str(user['_id'])
     }), 200
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Trade a refresh token for a new access token and a new refresh token."""
+    data = request.json or {}
+    rotated = rotate_refresh_token(data.get('refresh_token'))
+    if not rotated:
+        return jsonify({'error': 'Invalid or expired refresh token'}), 401
+    
+    user_id, refresh_token = rotated
+    user = find_user_by_id(user_id)
+    if not user:
+        return jsonify({'error': 'Invalid or expired refresh token'}), 401
+    
+    return jsonify({
+        'access_token': create_user_token(user_id, user.get('role')),
+        'refresh_token': refresh_token,
+        'user_id': user_id
+    }), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    data = request.json or {}
+    revoke_refresh_token(data.get('refresh_token'))
+    return jsonify({'message': 'Logged out'}), 200
+
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
@@ -111,5 +165,7 @@ def update_profile():
     }
     
     update_user_profile(user_id, profile)
+    note_user_changed(user_id, profile)
+    refresh_user_eligibility(user_id, profile)
     
     return jsonify({'message': 'Profile updated successfully'}), 200
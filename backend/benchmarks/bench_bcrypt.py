@@ -0,0 +1,57 @@
+"""
+Benchmark: login throughput at each bcrypt cost factor.
+
+A login is one bcrypt.checkpw. For every cost the script times checks on a
+single thread (logins per second per core) and on a pool of --threads workers,
+the way passwords.py runs them. Use it to pick BCRYPT_ROUNDS: each extra round
+halves throughput.
+
+Usage (from the backend folder):
+    python benchmarks/bench_bcrypt.py --costs 10 11 12 13 --seconds 2
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+PASSWORD = b'correct horse battery staple'
+
+
+def checks_per_second(password_hash, seconds, threads):
+    """Run checkpw for about `seconds` on `threads` workers; return checks per second."""
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        done = 0
+        while time.perf_counter() < deadline:
+            bcrypt.checkpw(PASSWORD, password_hash)
+            done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(f.result() for f in [pool.submit(worker) for _ in range(threads)])
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--costs', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--seconds', type=float, default=2.0, help='time spent per measurement')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help='pool size for the parallel measurement (default: CPU count)')
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}, pool threads: {args.threads}\n")
+    print(f"{'cost':>4}  {'ms/login':>9}  {'logins/s/core':>13}  {'logins/s pool':>13}")
+    for cost in args.costs:
+        password_hash = bcrypt.hashpw(PASSWORD, bcrypt.gensalt(cost))
+        single = checks_per_second(password_hash, args.seconds, 1)
+        pooled = checks_per_second(password_hash, args.seconds, args.threads)
+        print(f"{cost:>4}  {1000 / single:>9.1f}  {single:>13.1f}  {pooled:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: end-to-end /chat/message latency against a local Gemini stand-in.
+
+Starts benchmarks/fake_gemini.py in-process (or uses --base-url), points the
+backend at it and posts chat messages through the Flask test client from
+--concurrency threads. Reports:
+
+    - end-to-end latency per message (mean and percentiles) and throughput
+    - time spent in each chat tool, from the turn's usage report
+    - request and response bytes per round of the function-calling loop, as
+      seen by the fake model
+
+The answer cache and the intent router are off unless --cache / --router are
+given, so every message goes through the model loop. Needs the app's MongoDB
+with schemes in it (python seed.py).
+
+Usage (from the backend folder):
+    python benchmarks/bench_chat.py --messages 200 --concurrency 8 --latency 300 --jitter 100
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import FakeGemini, load_script
+
+MESSAGES = [
+    'What schemes are there for farmers?',
+    'I am a 21 year old SC student from Maharashtra, what can I get?',
+    'Is there any scholarship for girls in engineering?',
+    'My mother is a widow, does she get a pension?',
+    'Housing loan subsidy for poor families',
+    'Schemes for people with disability',
+    'How do I start a small business with government help?',
+    'Health insurance for senior citizens',
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summary_row(label, values, width=34):
+    return (f"{label:<{width}} {len(values):>6}  {sum(values) / len(values) if values else 0:>8.1f}  "
+            f"{percentile(values, 50):>8.1f}  {percentile(values, 90):>8.1f}  {percentile(values, 99):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100, help='chat messages to send')
+    parser.add_argument('--concurrency', type=int, default=4, help='messages in flight at once')
+    parser.add_argument('--latency', type=float, default=300, help='fake model latency in milliseconds')
+    parser.add_argument('--jitter', type=float, default=100, help='+/- milliseconds of random latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of model calls that fail')
+    parser.add_argument('--script', help='JSON reply script for the fake model (see fake_gemini.py)')
+    parser.add_argument('--base-url', help='use an already running model endpoint instead')
+    parser.add_argument('--cache', action='store_true', help='leave the answer cache on')
+    parser.add_argument('--router', action='store_true', help='leave the intent router on')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    fake = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        fake = FakeGemini(
+            script=load_script(args.script) if args.script else None,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ).start()
+        base_url = fake.url
+
+    # Config reads the environment on import
+    os.environ['GEMINI_BASE_URL'] = base_url
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    if not args.cache:
+        os.environ['CHAT_CACHE_TTL'] = '0'
+    if not args.router:
+        os.environ['CHAT_INTENT_ROUTER'] = 'false'
+
+    from app import app
+    client = app.test_client()
+
+    def send(i):
+        start = time.perf_counter()
+        response = client.post('/chat/message', json={'message': MESSAGES[i % len(MESSAGES)]})
+        return (time.perf_counter() - start) * 1000, response.status_code, response.get_json() or {}
+
+    # One untimed message warms up the catalog, indexes and connections
+    send(0)
+    if fake:
+        fake.stats.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(send, range(args.messages)))
+    wall = time.perf_counter() - start
+
+    latencies = [ms for ms, status, _ in results if status == 200]
+    tool_ms = defaultdict(list)
+    model_calls = []
+    local_replies = defaultdict(int)
+    for _, status, body in results:
+        usage = body.get('usage') or {}
+        model_calls.append(usage.get('model_calls', 0))
+        for timing in usage.get('tools', []):
+            tool_ms[timing['name']].append(timing['ms'])
+        if usage.get('local_reply'):
+            local_replies[usage['local_reply']] += 1
+
+    print(f"Model endpoint: {base_url}  messages: {args.messages}  concurrency: {args.concurrency}")
+    print(f"Throughput: {args.messages / wall:.1f} messages/s, errors: {len(results) - len(latencies)}, "
+          f"model calls per message: {sum(model_calls) / len(model_calls):.2f}")
+    if local_replies:
+        print("Answered locally: " + ', '.join(f"{reason} {count}" for reason, count in local_replies.items()))
+
+    print(f"\n{'milliseconds':<34} {'count':>6}  {'mean':>8}  {'p50':>8}  {'p90':>8}  {'p99':>8}")
+    print(summary_row('end to end', latencies))
+    for name, values in sorted(tool_ms.items()):
+        print(summary_row(f'tool {name}', values))
+
+    if fake:
+        rounds = defaultdict(list)
+        for entry in fake.stats:
+            rounds[entry['round']].append(entry)
+        print(f"\n{'round':<6} {'calls':>6}  {'request bytes':>13}  {'max':>8}  {'response bytes':>14}  {'failed':>6}")
+        for number, entries in sorted(rounds.items()):
+            request_bytes = [e['request_bytes'] for e in entries]
+            response_bytes = [e['response_bytes'] for e in entries]
+            print(f"{number:<6} {len(entries):>6}  {sum(request_bytes) / len(entries):>13.0f}  {max(request_bytes):>8}  "
+                  f"{sum(response_bytes) / len(entries):>14.0f}  {sum(e['failed'] for e in entries):>6}")
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
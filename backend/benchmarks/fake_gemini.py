@@ -0,0 +1,248 @@
+"""
+A local stand-in for the Gemini API, for benchmarking the chatbot offline.
+
+It answers generateContent and streamGenerateContent (SSE) requests in the
+REST format the google-genai client uses, after a configurable delay. Replies
+follow a script indexed by the round of the function-calling loop (round 0 is
+the first call for a user message, round 1 the call after the first tool
+results, and so on):
+
+    [
+        {"function_calls": [{"name": "search_schemes_by_text", "args": {"query": "{message}"}}]},
+        {"text": "Here is what I found."}
+    ]
+
+"{message}" in a string argument is replaced by the user's message, and the
+last step repeats for later rounds. Without a script the model searches by
+text and then lists the first schemes in the tool result. Every request is
+recorded (round, bytes in and out, delay) in FakeGemini.stats.
+
+Point the backend at it with GEMINI_BASE_URL=http://127.0.0.1:<port> and any
+GEMINI_API_KEY.
+
+Usage (from the backend folder):
+    python benchmarks/fake_gemini.py --port 8089 --latency 400 --jitter 150
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SCRIPT = [
+    {"function_calls": [{"name": "search_schemes_by_text", "args": {"query": "{message}"}}]},
+    {"text": None},  # list the schemes from the tool result
+]
+
+
+def _fill(value, message):
+    if isinstance(value, str):
+        return value.replace('{message}', message)
+    if isinstance(value, dict):
+        return {k: _fill(v, message) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, message) for v in value]
+    return value
+
+
+def _turn_state(contents):
+    """(user message, round) for a request: text of the last user message and tool rounds since."""
+    rounds = 0
+    for content in reversed(contents):
+        parts = content.get('parts') or []
+        if content.get('role') == 'user' and any('text' in p for p in parts):
+            return next(p['text'] for p in parts if 'text' in p), rounds
+        if any('functionResponse' in p for p in parts):
+            rounds += 1
+    return '', rounds
+
+
+def _listing(contents):
+    """Reply text naming the schemes in the latest tool results."""
+    names = []
+    for part in (contents[-1].get('parts') or []) if contents else []:
+        result = (part.get('functionResponse') or {}).get('response', {}).get('result') or {}
+        names += [s.get('name', '') for s in result.get('schemes', [])]
+    if not names:
+        return "I couldn't find matching schemes. Could you tell me your age, state and category?"
+    lines = '\n'.join(f"• **{name}** — see the official link for details" for name in names[:5])
+    return f"Here are schemes that may suit you:\n{lines}\n\nAsk me about any of them for eligibility and documents."
+
+
+class FakeGemini:
+    """
+    The stand-in server. start() serves on a background thread; url is the
+    GEMINI_BASE_URL to use.
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        script: List of steps, see the module docstring
+        latency: Milliseconds before each reply
+        jitter: Up to this many milliseconds added to or taken from the latency
+        chunk_delay: Milliseconds between streamed chunks
+        error_rate: Fraction of requests answered with 503 UNAVAILABLE
+        seed: Random seed for jitter and errors
+    """
+
+    def __init__(self, port=0, script=None, latency=0, jitter=0, chunk_delay=0, error_rate=0.0, seed=None):
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.stats = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _delay_and_error(self):
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)) / 1000
+            failed = self._rng.random() < self.error_rate
+        return delay, failed
+
+    def reply_parts(self, contents):
+        """Model parts for a request, from the script."""
+        message, rounds = _turn_state(contents)
+        step = self.script[min(rounds, len(self.script) - 1)]
+        if step.get('function_calls'):
+            return rounds, [
+                {'functionCall': {'name': call['name'], 'args': _fill(call.get('args', {}), message)}}
+                for call in step['function_calls']
+            ]
+        text = step.get('text')
+        return rounds, [{'text': _fill(text, message) if text is not None else _listing(contents)}]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                path = self.path.split('?')[0]
+                if not path.endswith((':generateContent', ':streamGenerateContent')):
+                    return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+
+                request = json.loads(body or b'{}')
+                contents = request.get('contents') or []
+                rounds, parts = fake.reply_parts(contents)
+                delay, failed = fake._delay_and_error()
+                time.sleep(delay)
+                if failed:
+                    sent = self._send(503, {'error': {'code': 503, 'message': 'Injected failure', 'status': 'UNAVAILABLE'}})
+                elif path.endswith(':streamGenerateContent'):
+                    sent = self._stream(parts, len(body))
+                else:
+                    sent = self._send(200, _response(parts, len(body)))
+                with fake._lock:
+                    fake.stats.append({
+                        'round': rounds,
+                        'stream': path.endswith(':streamGenerateContent'),
+                        'request_bytes': len(body),
+                        'response_bytes': sent,
+                        'delay_ms': round(delay * 1000, 1),
+                        'failed': failed,
+                    })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return len(data)
+
+            def _stream(self, parts, request_bytes):
+                # Text goes out a few words per chunk; function calls in one chunk
+                chunks = []
+                for part in parts:
+                    if 'text' in part:
+                        words = part['text'].split(' ')
+                        chunks += [[{'text': ' '.join(words[i:i + 4]) + (' ' if i + 4 < len(words) else '')}]
+                                   for i in range(0, len(words), 4)]
+                    else:
+                        chunks.append([part])
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                sent = 0
+                for i, chunk in enumerate(chunks):
+                    if i and fake.chunk_delay:
+                        time.sleep(fake.chunk_delay / 1000)
+                    payload = _response(chunk, request_bytes if i == len(chunks) - 1 else None)
+                    data = f"data: {json.dumps(payload)}\r\n\r\n".encode('utf-8')
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    sent += len(data)
+                self.wfile.write(b"0\r\n\r\n")
+                return sent
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _response(parts, request_bytes):
+    """generateContent response body; usage is only reported when request_bytes is given."""
+    response = {'candidates': [{'content': {'role': 'model', 'parts': parts}, 'finishReason': 'STOP'}]}
+    if request_bytes is not None:
+        response['usageMetadata'] = {
+            # Rough token counts: about 4 bytes per token
+            'promptTokenCount': request_bytes // 4,
+            'candidatesTokenCount': len(json.dumps(parts)) // 4,
+        }
+    return response
+
+
+def load_script(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--script', help='JSON file with the reply script')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds before each reply')
+    parser.add_argument('--jitter', type=float, default=0, help='+/- milliseconds of random latency')
+    parser.add_argument('--chunk-delay', type=float, default=0, help='milliseconds between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail with 503')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    fake = FakeGemini(
+        port=args.port,
+        script=load_script(args.script) if args.script else None,
+        latency=args.latency,
+        jitter=args.jitter,
+        chunk_delay=args.chunk_delay,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    print(f"Fake Gemini on {fake.url} — start the backend with GEMINI_BASE_URL={fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Versioned in-process cache of the scheme catalog.
+
+Readers get an immutable CatalogSnapshot. The admin write paths bump a
+monotonic catalog revision; the next reader notices the snapshot is older than
+the revision, loads a fresh one and swaps it in with a single assignment, so
+readers of a fresh snapshot never take a lock. Loads are single-flight: when
+the snapshot goes stale, one request reloads it and the others wait for that
+load instead of each reading the whole collection. A TTL catches writes made
+outside this process (other workers, seed.py, the Mongo shell).
+
+Each bump also increments a catalog version kept in Mongo (site_settings,
+type 'catalog_version'). get_current_catalog() checks it, at the cost of one
+find_one, for callers that must not act on another worker's stale snapshot.
+"""
+import hashlib
+import json
+import threading
+import time
+from pymongo.errors import PyMongoError
+from config import Config
+from models import schemes_collection, site_settings_collection, project_scheme
+from eligibility import invalidate_compiled_catalog
+import metrics
+
+# Distinct field/language projections memoized per snapshot
+MAX_CACHED_PROJECTIONS = 32
+
+
+class CatalogSnapshot:
+    """
+    One consistent view of the catalog. Treat everything in it as read-only:
+    the same scheme dicts are shared by every request.
+
+    Attributes:
+        revision: Catalog revision the snapshot was loaded at
+        version: Shared catalog version (in Mongo) the snapshot was loaded at
+        schemes: Tuple of scheme dicts (string _id), in Mongo natural order
+        by_id: Dict of scheme _id -> scheme
+        recent: Tuple of schemes, newest _id first
+        loaded_at: time.monotonic() of the load
+    """
+
+    __slots__ = ('revision', 'version', 'schemes', 'by_id', 'recent', 'loaded_at', '_projections',
+                 '_scheme_digests', '_digest')
+
+    def __init__(self, revision, schemes, previous=None, version=0):
+        previous_by_id = previous.by_id if previous is not None else {}
+        previous_digests = previous._scheme_digests if previous is not None else {}
+        loaded = []
+        for scheme in schemes:
+            scheme['_id'] = str(scheme['_id'])
+            # Keep the old object for unchanged schemes so per-scheme caches stay valid
+            old = previous_by_id.get(scheme['_id'])
+            loaded.append(old if old == scheme else scheme)
+
+        self.revision = revision
+        self.version = version
+        self.schemes = tuple(loaded)
+        self.by_id = {scheme['_id']: scheme for scheme in loaded}
+        # ObjectId hex strings sort in creation order
+        self.recent = tuple(sorted(loaded, key=lambda s: s['_id'], reverse=True))
+        self.loaded_at = time.monotonic()
+        self._projections = {}
+        # Digests of reused scheme objects are still valid
+        self._scheme_digests = {
+            scheme_id: digest for scheme_id, digest in previous_digests.items()
+            if self.by_id.get(scheme_id) is previous_by_id.get(scheme_id)
+        }
+        self._digest = None
+
+    def __len__(self):
+        return len(self.schemes)
+
+    def scheme_digest(self, scheme_id):
+        """Content digest of one scheme (None if it is not in the catalog)."""
+        digest = self._scheme_digests.get(scheme_id)
+        if digest is None:
+            scheme = self.by_id.get(scheme_id)
+            if scheme is None:
+                return None
+            encoded = json.dumps(scheme, sort_keys=True, ensure_ascii=False, default=str)
+            digest = self._scheme_digests[scheme_id] = hashlib.sha1(encoded.encode()).hexdigest()
+        return digest
+
+    @property
+    def digest(self):
+        """
+        Content digest of the whole catalog. Unlike the revision it is the same
+        in every worker, so it can back ETags.
+        """
+        if self._digest is None:
+            combined = hashlib.sha1()
+            for scheme in self.schemes:
+                combined.update(self.scheme_digest(scheme['_id']).encode())
+            self._digest = combined.hexdigest()
+        return self._digest
+
+    def projected(self, projection):
+        """
+        The schemes narrowed by a build_scheme_projection projection.
+
+        The result is memoized on the snapshot, so each projection is built
+        once per catalog revision.
+        """
+        if projection is None:
+            return self.schemes
+        key = tuple(projection)
+        schemes = self._projections.get(key)
+        if schemes is None:
+            metrics.incr('catalog.projection_misses')
+            schemes = tuple(project_scheme(scheme, projection) for scheme in self.schemes)
+            if len(self._projections) < MAX_CACHED_PROJECTIONS:
+                self._projections[key] = schemes
+        return schemes
+
+
+_revision = 0
+_revision_lock = threading.Lock()
+_snapshot = None
+_load_lock = threading.Lock()
+_listeners = []
+
+
+def add_change_listener(listener):
+    """Register listener(scheme_id) to run after every catalog write (scheme_id may be None)."""
+    _listeners.append(listener)
+    return listener
+
+
+def get_catalog_revision():
+    return _revision
+
+
+def get_shared_version():
+    """The catalog version in Mongo, bumped by every app worker's scheme writes."""
+    doc = site_settings_collection.find_one({'type': 'catalog_version'}, {'version': 1})
+    return doc.get('version', 0) if doc else 0
+
+
+def bump_catalog_revision(scheme_id=None):
+    """
+    Mark the catalog as changed. Call after every scheme write.
+
+    Args:
+        scheme_id: The scheme that was created, updated or deleted (None if unknown)
+
+    Returns:
+        int: The new revision
+    """
+    global _revision
+    with _revision_lock:
+        _revision += 1
+        revision = _revision
+    try:
+        site_settings_collection.update_one(
+            {'type': 'catalog_version'}, {'$inc': {'version': 1}}, upsert=True,
+        )
+    except PyMongoError as e:
+        # Other workers still pick the write up within CATALOG_TTL
+        print(f"Could not bump the shared catalog version: {e}")
+    metrics.incr('catalog.revision_bumps')
+    for listener in _listeners:
+        listener(str(scheme_id) if scheme_id is not None else None)
+    return revision
+
+
+def _is_fresh(snapshot, min_version=0):
+    return (snapshot is not None
+            and snapshot.revision == _revision
+            and snapshot.version >= min_version
+            and time.monotonic() - snapshot.loaded_at < Config.CATALOG_TTL)
+
+
+def get_catalog(min_version=0):
+    """
+    Return the current CatalogSnapshot, loading a new one if it is stale.
+
+    Args:
+        min_version: Also reload if the snapshot is older than this shared version
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if _is_fresh(snapshot, min_version):
+        metrics.incr('catalog.hits')
+        return snapshot
+
+    with _load_lock:
+        # Another request may have reloaded while this one waited
+        snapshot = _snapshot
+        if _is_fresh(snapshot, min_version):
+            metrics.incr('catalog.hits')
+            return snapshot
+
+        metrics.incr('catalog.misses')
+        if snapshot is not None and snapshot.revision == _revision:
+            if snapshot.version < min_version:
+                metrics.incr('catalog.shared_version_reloads')
+            else:
+                metrics.incr('catalog.ttl_expiries')
+
+        # Read the revisions first: a write that lands during the load leaves
+        # this snapshot one revision behind, so the next reader reloads again.
+        revision = _revision
+        try:
+            version = get_shared_version()
+        except PyMongoError:
+            version = min_version
+        start = time.perf_counter()
+        fresh = CatalogSnapshot(revision, list(schemes_collection.find()), previous=snapshot,
+                                version=max(version, min_version))
+        metrics.observe('catalog.load', time.perf_counter() - start)
+
+        _snapshot = fresh
+        return fresh
+
+
+def get_current_catalog():
+    """
+    get_catalog(), also reloading when another worker has written a scheme
+    since this worker's snapshot was loaded. Costs one find_one per call.
+    """
+    try:
+        version = get_shared_version()
+    except PyMongoError as e:
+        print(f"Could not read the shared catalog version: {e}")
+        version = 0
+    return get_catalog(min_version=version)
+
+
+def catalog_stats():
+    """Hit/miss counters and the state of the current snapshot."""
+    snapshot = _snapshot
+    hits = metrics.get_counter('catalog.hits')
+    misses = metrics.get_counter('catalog.misses')
+    return {
+        'revision': _revision,
+        'snapshot_revision': snapshot.revision if snapshot is not None else None,
+        'snapshot_version': snapshot.version if snapshot is not None else None,
+        'snapshot_size': len(snapshot) if snapshot is not None else 0,
+        'snapshot_age_seconds': (
+            round(time.monotonic() - snapshot.loaded_at, 3) if snapshot is not None else None
+        ),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'ttl_expiries': metrics.get_counter('catalog.ttl_expiries'),
+        'shared_version_reloads': metrics.get_counter('catalog.shared_version_reloads'),
+    }
+
+
+# Compiled eligibility rules follow the catalog
+add_change_listener(invalidate_compiled_catalog)
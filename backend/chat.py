@@ -1,9 +1,22 @@
-from flask import Blueprint, request, jsonify
-from google import genai
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from google.genai import types
-from models import get_all_schemes, get_scheme_by_id
+from genai_client import get_client, gemini_breaker
+from models import FALLBACK_LANGUAGE, SUPPORTED_LANGUAGES
+from catalog import get_catalog
+from text_index import search_schemes_by_text
+from chat_cache import cache_key as chat_cache_key, get_cached_reply, store_reply
+from intent_router import route as route_intent, render as render_intent, BY_TEXT
 from config import Config
+from chat_sessions import (
+    create_session, load_session, append_turns, compaction_usage, estimate_tokens, set_summarizer,
+)
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import heapq
 import json
+import time
+import metrics
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -12,7 +25,8 @@ chat_bp = Blueprint('chat', __name__)
 get_all_schemes_declaration = {
     "name": "get_all_schemes",
     "description": (
-        "Retrieves all available government schemes from the InfoMitra database. "
+        "Gives an overview of the government schemes in the InfoMitra database: the number "
+        "of schemes per category and the newest schemes. "
         "Use this when the user asks what schemes are available, wants a list of schemes, "
         "or asks general questions about government programs."
     ),
@@ -88,51 +102,140 @@ search_schemes_by_eligibility_declaration = {
     }
 }
 
+search_schemes_by_text_declaration = {
+    "name": "search_schemes_by_text",
+    "description": (
+        "Search the schemes by meaning of their name, objective, eligibility, benefits and "
+        "tags. Use this for free-text needs that are not a single category or a set of "
+        "personal details, e.g. 'help for widows starting a tailoring business' or "
+        "'loan for a small shop'. Works with English, Hindi and Marathi words."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Key words describing what the user needs"
+            }
+        },
+        "required": ["query"]
+    }
+}
+
+get_scheme_details_declaration = {
+    "name": "get_scheme_details",
+    "description": (
+        "Get the full details of one scheme: objective, eligibility, benefits, required "
+        "documents, how to apply, official link and eligibility rules. Use the id from a "
+        "search result when the user wants to know more about a specific scheme."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "scheme_id": {
+                "type": "string",
+                "description": "The scheme's id, as returned by the search functions"
+            }
+        },
+        "required": ["scheme_id"]
+    }
+}
+
 # ─── Function Implementations ─────────────────────────────────────────────────
 
-def fn_get_all_schemes():
-    """Fetch all schemes and return a summarized list."""
-    schemes = get_all_schemes()
-    result = []
-    for s in schemes:
-        name = s.get('scheme_name', {})
-        result.append({
-            "id": s.get('_id'),
-            "name": name.get('en', 'Unknown') if isinstance(name, dict) else str(name),
-            "category": s.get('category', ''),
-            "benefits": (s.get('benefits', {}).get('en', '') if isinstance(s.get('benefits'), dict) else ''),
-            "eligibility": (s.get('eligibility', {}).get('en', '') if isinstance(s.get('eligibility'), dict) else ''),
-            "official_link": s.get('official_link', ''),
-            "tags": s.get('tags', [])
-        })
+# Search results list at most CHAT_TOOL_TOP_K schemes in this short form and
+# stop early once CHAT_TOOL_RESULT_TOKENS is reached; get_scheme_details has the rest
+SUMMARY_CHARS = 160
+DETAIL_CHARS = 600
+DETAILS_HINT = "Call get_scheme_details with a scheme id for eligibility, documents and how to apply."
+
+
+def _text(value):
+    """English text of a localized field."""
+    if isinstance(value, dict):
+        return value.get(FALLBACK_LANGUAGE) or next((v for v in value.values() if v), '')
+    return value or ''
+
+
+def _clip(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+def compact_scheme(scheme):
+    """Short form of a scheme for search results."""
+    return {
+        "id": scheme['_id'],
+        "name": _text(scheme.get('scheme_name')) or 'Unknown',
+        "category": scheme.get('category', ''),
+        "benefits": _clip(_text(scheme.get('benefits')), SUMMARY_CHARS),
+        "official_link": scheme.get('official_link', ''),
+    }
+
+
+def ranked_result(scored, **extra):
+    """
+    Tool result for (score, scheme) pairs: the best CHAT_TOOL_TOP_K schemes,
+    newest first among equal scores, within the token budget.
+    """
+    top = heapq.nlargest(Config.CHAT_TOOL_TOP_K, scored, key=lambda pair: (pair[0], pair[1]['_id']))
+    result = {"total_matches": len(scored), **extra, "schemes": []}
+    note = f"Showing the {len(top)} best matches. " + DETAILS_HINT
+    budget = Config.CHAT_TOOL_RESULT_TOKENS - estimate_tokens(json.dumps({**result, "note": note}))
+    for _, scheme in top:
+        entry = compact_scheme(scheme)
+        cost = estimate_tokens(json.dumps(entry)) + 1
+        if result["schemes"] and cost > budget:
+            break
+        result["schemes"].append(entry)
+        budget -= cost
+    shown = len(result["schemes"])
+    result["note"] = (f"Showing the {shown} best matches. " + DETAILS_HINT
+                      if shown < result["total_matches"] else DETAILS_HINT)
     return result
 
 
-def fn_search_schemes_by_category(category: str):
-    """Filter schemes by category (case-insensitive partial match)."""
-    schemes = get_all_schemes()
+def fn_get_all_schemes(snapshot):
+    """Newest schemes plus a count per category."""
+    schemes = snapshot.schemes
+    categories = Counter(s.get('category') or 'Other' for s in schemes)
+    return ranked_result([(0, s) for s in schemes], categories=dict(categories.most_common()))
+
+
+def fn_search_schemes_by_category(snapshot, category: str):
+    """Schemes in a category (case-insensitive partial match), exact matches first."""
     category_lower = category.lower().strip()
-    result = []
-    for s in schemes:
-        scheme_category = s.get('category', '').lower()
-        if category_lower in scheme_category or scheme_category in category_lower:
-            name = s.get('scheme_name', {})
-            result.append({
-                "id": s.get('_id'),
-                "name": name.get('en', 'Unknown') if isinstance(name, dict) else str(name),
-                "category": s.get('category', ''),
-                "benefits": (s.get('benefits', {}).get('en', '') if isinstance(s.get('benefits'), dict) else ''),
-                "eligibility": (s.get('eligibility', {}).get('en', '') if isinstance(s.get('eligibility'), dict) else ''),
-                "official_link": s.get('official_link', ''),
-                "tags": s.get('tags', [])
-            })
-    return result
+    scored = []
+    for s in snapshot.schemes:
+        scheme_category = (s.get('category') or '').lower()
+        if not scheme_category:
+            continue
+        if scheme_category == category_lower:
+            scored.append((1, s))
+        elif category_lower in scheme_category or scheme_category in category_lower:
+            scored.append((0, s))
+    return ranked_result(scored)
+
+
+def fn_search_schemes_by_text(snapshot, query: str):
+    """Schemes ranked by text relevance to the query."""
+    total, scored = search_schemes_by_text(query, limit=Config.CHAT_TOOL_TOP_K, snapshot=snapshot)
+    return ranked_result(scored, total_matches=total)
+
 
+def _listed(value, values):
+    value = (value or '').strip().lower()
+    return bool(value) and any(value == str(v).strip().lower() for v in values or [])
 
-def fn_search_schemes_by_eligibility(age=None, category=None, state=None,
+
+def fn_search_schemes_by_eligibility(snapshot, age=None, category=None, state=None,
                                       gender=None, is_student=None, has_disability=None):
-    """Filter schemes based on eligibility criteria."""
-    from eligibility import check_eligibility
+    """
+    Schemes matching the given criteria. Schemes whose own rules admit the
+    person rank above tag-only matches, and schemes that name the person's
+    state or category rank above general ones.
+    """
+    from eligibility_engine import filter_eligible_schemes
 
     # Build a mock user profile from the provided criteria
     user_profile = {}
@@ -149,38 +252,126 @@ def fn_search_schemes_by_eligibility(age=None, category=None, state=None,
     if has_disability is not None:
         user_profile['disability'] = 'yes' if has_disability else 'no'
 
-    schemes = get_all_schemes()
-    result = []
-    for s in schemes:
-        is_eligible, reason = check_eligibility(user_profile, s)
-        if is_eligible:
-            name = s.get('scheme_name', {})
-            result.append({
-                "id": s.get('_id'),
-                "name": name.get('en', 'Unknown') if isinstance(name, dict) else str(name),
-                "category": s.get('category', ''),
-                "benefits": (s.get('benefits', {}).get('en', '') if isinstance(s.get('benefits'), dict) else ''),
-                "eligibility": (s.get('eligibility', {}).get('en', '') if isinstance(s.get('eligibility'), dict) else ''),
-                "official_link": s.get('official_link', ''),
-                "tags": s.get('tags', [])
-            })
-    return result
+    scored = []
+    for s, reason in filter_eligible_schemes(user_profile, list(snapshot.schemes)):
+        score = 2 if reason == 'Eligible' else 0
+        score += _listed(state, s.get('states')) + _listed(category, s.get('eligible_categories'))
+        scored.append((score, s))
+    return ranked_result(scored)
+
+
+def fn_get_scheme_details(snapshot, scheme_id: str):
+    """Full English details of one scheme."""
+    s = snapshot.by_id.get(str(scheme_id))
+    if s is None:
+        return {"error": f"No scheme with id {scheme_id}"}
+    documents = s.get('documents')
+    documents = documents.get(FALLBACK_LANGUAGE, []) if isinstance(documents, dict) else documents or []
+    return {
+        "id": s['_id'],
+        "name": _text(s.get('scheme_name')) or 'Unknown',
+        "category": s.get('category', ''),
+        "objective": _clip(_text(s.get('objective')), DETAIL_CHARS),
+        "eligibility": _clip(_text(s.get('eligibility')), DETAIL_CHARS),
+        "benefits": _clip(_text(s.get('benefits')), DETAIL_CHARS),
+        "documents": [_clip(d, SUMMARY_CHARS) for d in documents[:15]],
+        "apply_process": _clip(_text(s.get('apply_process')), DETAIL_CHARS),
+        "official_link": s.get('official_link', ''),
+        "min_age": s.get('min_age'),
+        "max_age": s.get('max_age'),
+        "states": s.get('states', []),
+        "eligible_categories": s.get('eligible_categories', []),
+        "student_required": s.get('student_required'),
+        "education_required": s.get('education_required', []),
+        "tags": s.get('tags', []),
+    }
+
+
+# Built once and shared by every request; never modified after import
+CHAT_MODEL = Config.GEMINI_MODEL
+
+CHAT_TOOLS = types.Tool(function_declarations=[
+    get_all_schemes_declaration,
+    search_schemes_by_category_declaration,
+    search_schemes_by_eligibility_declaration,
+    search_schemes_by_text_declaration,
+    get_scheme_details_declaration,
+])
 
 
 # ─── Function Dispatcher ──────────────────────────────────────────────────────
 
-def execute_function(name: str, args: dict):
-    """Execute the named function with the given arguments."""
+def execute_function(name: str, args: dict, snapshot=None):
+    """Execute the named function with the given arguments against a catalog snapshot."""
+    snapshot = snapshot or get_catalog()
     if name == "get_all_schemes":
-        return fn_get_all_schemes()
+        return fn_get_all_schemes(snapshot)
     elif name == "search_schemes_by_category":
-        return fn_search_schemes_by_category(**args)
+        return fn_search_schemes_by_category(snapshot, **args)
     elif name == "search_schemes_by_eligibility":
-        return fn_search_schemes_by_eligibility(**args)
+        return fn_search_schemes_by_eligibility(snapshot, **args)
+    elif name == "search_schemes_by_text":
+        return fn_search_schemes_by_text(snapshot, **args)
+    elif name == "get_scheme_details":
+        return fn_get_scheme_details(snapshot, **args)
     else:
         return {"error": f"Unknown function: {name}"}
 
 
+# Tool calls from one model response run side by side on this pool
+_tool_executor = ThreadPoolExecutor(max_workers=Config.CHAT_TOOL_WORKERS, thread_name_prefix='chat-tool')
+
+
+def _timed_call(name, args, snapshot):
+    """Run one tool call; returns (result, timing)."""
+    start = time.perf_counter()
+    failed = False
+    try:
+        result = execute_function(name, args, snapshot)
+    except Exception as e:
+        print(f"Chat tool {name} failed: {e}")
+        metrics.incr('chat.tool_errors')
+        result = {"error": f"{name} failed"}
+        failed = True
+    elapsed = time.perf_counter() - start
+    metrics.observe(f'chat.tool.{name}', elapsed)
+    return result, {'name': name, 'ms': round(elapsed * 1000, 1), 'timed_out': False, 'failed': failed}
+
+
+def execute_functions(calls, snapshot):
+    """
+    Run a model response's tool calls concurrently, all against one snapshot.
+
+    Args:
+        calls: List of (name, args) pairs
+        snapshot: The turn's CatalogSnapshot
+
+    Returns:
+        list: (result, timing) pairs in the order of calls. A call that takes
+              longer than CHAT_TOOL_TIMEOUT gets an error result (it keeps
+              running in the background, but its result is dropped).
+    """
+    if len(calls) == 1:
+        name, args = calls[0]
+        return [_timed_call(name, args, snapshot)]
+
+    start = time.perf_counter()
+    deadline = start + Config.CHAT_TOOL_TIMEOUT
+    futures = [_tool_executor.submit(_timed_call, name, args, snapshot) for name, args in calls]
+    results = []
+    for (name, _), future in zip(calls, futures):
+        try:
+            result, timing = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            metrics.incr('chat.tool_timeouts')
+            result = {"error": f"{name} took too long"}
+            timing = {'name': name, 'ms': round((time.perf_counter() - start) * 1000, 1),
+                      'timed_out': True, 'failed': False}
+        results.append((result, timing))
+    metrics.observe('chat.tool_batch', time.perf_counter() - start)
+    return results
+
+
 # ─── System Prompt ────────────────────────────────────────────────────────────
 
 SYSTEM_PROMPT = """You are InfoMitra Assistant, a helpful AI chatbot for the InfoMitra platform — 
@@ -196,125 +387,423 @@ Your responsibilities:
 Guidelines:
 - Always be polite, empathetic, and helpful
 - If a user shares personal details (age, category, state, etc.), use search_schemes_by_eligibility to find relevant schemes
+- For needs described in words (an occupation, a life situation, a kind of help), use search_schemes_by_text
 - When listing schemes, include the name, key benefit, and official link
+- Search results show only the best few matches in short form; call get_scheme_details for
+  eligibility rules, documents and how to apply before answering detailed questions
 - If no schemes match, suggest the user complete their profile on InfoMitra for personalized recommendations
 - You support English primarily, but can understand Hindi/Marathi queries and respond in English
 - Do NOT make up scheme information — always use the database functions for scheme data"""
 
 
-# ─── Chat Endpoint ────────────────────────────────────────────────────────────
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and
+InfoMitra Assistant (a government scheme helper). Merge the earlier summary and the new
+turns into one summary of at most 150 words. Keep the user's personal details (age,
+state, category, gender, education, student or disability status), what they asked for
+and which schemes were discussed. Reply with the summary only."""
+
+LANGUAGE_NAMES = {'en': 'English', 'hi': 'Hindi', 'mr': 'Marathi'}
+
+# One prebuilt config per app language
+CHAT_CONFIGS = {
+    lang: types.GenerateContentConfig(
+        system_instruction=SYSTEM_PROMPT if lang == FALLBACK_LANGUAGE else (
+            f"{SYSTEM_PROMPT}\n- The user has set the app to {LANGUAGE_NAMES[lang]}: reply in "
+            f"{LANGUAGE_NAMES[lang]} unless they write in another language"
+        ),
+        tools=[CHAT_TOOLS],
+        temperature=0.7,
+    )
+    for lang in SUPPORTED_LANGUAGES
+}
 
-@chat_bp.route('/message', methods=['POST'])
-def chat_message():
-    data = request.get_json()
-    if not data or 'message' not in data:
-        return jsonify({'error': 'Message is required'}), 400
+SUMMARY_CONFIG = types.GenerateContentConfig(system_instruction=SUMMARY_PROMPT, temperature=0.2)
 
-    user_message = data.get('message', '').strip()
-    history = data.get('history', [])  # List of {role, parts: [{text}]}
 
-    if not user_message:
-        return jsonify({'error': 'Message cannot be empty'}), 400
+def summarize_turns(summary, turns):
+    """Fold chat turns into the running session summary with a model call."""
+    transcript = '\n'.join(f"{t['role']}: {t['text']}" for t in turns)
+    if not gemini_breaker.allow():
+        raise RuntimeError('Gemini circuit is open')
+    start = time.perf_counter()
+    try:
+        response = get_client().models.generate_content(
+            model=CHAT_MODEL,
+            contents=f"Earlier summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}",
+            config=SUMMARY_CONFIG,
+        )
+    except Exception:
+        gemini_breaker.record(time.perf_counter() - start, ok=False)
+        raise
+    gemini_breaker.record(time.perf_counter() - start)
+    return (response.text or '').strip()
+
+
+if Config.GEMINI_API_KEY:
+    set_summarizer(summarize_turns)
+
+
+def session_contents(session):
+    """Model contents for a session's summary and stored turns."""
+    contents = []
+    if session.get('summary'):
+        contents.append(types.Content(
+            role='user',
+            parts=[types.Part(text=f"Summary of our conversation so far:\n{session['summary']}")]
+        ))
+    for turn in session.get('turns', []):
+        contents.append(types.Content(role=turn['role'], parts=[types.Part(text=turn['text'])]))
+    return contents
+
+
+# ─── Chat Turn ────────────────────────────────────────────────────────────────
+
+# Progress text shown while a tool runs
+TOOL_STATUS = {
+    "get_all_schemes": "Looking up all schemes…",
+    "search_schemes_by_category": "Searching schemes by category…",
+    "search_schemes_by_eligibility": "Checking which schemes you are eligible for…",
+    "search_schemes_by_text": "Searching scheme descriptions…",
+    "get_scheme_details": "Fetching scheme details…",
+}
 
-    if not Config.GEMINI_API_KEY:
-        return jsonify({'error': 'Gemini API key not configured'}), 500
+FALLBACK_REPLY = 'I encountered an issue processing your request. Please try again.'
+
+# A model call with less time than this left is not started
+MIN_MODEL_CALL_SECONDS = 0.5
+
+LOCAL_REPLY_NOTE = (
+    "The assistant is busy right now, so here is what a quick search of the scheme catalog found."
+)
+
+
+def local_reply(user_message, snapshot, lang):
+    """
+    Answer a message without the model: a plain request goes to its tool as
+    in the intent router, anything else to a text search of the catalog.
+
+    Returns:
+        tuple: (tool name, args, reply text, tool timing)
+    """
+    routed = route_intent(user_message, snapshot) if lang == FALLBACK_LANGUAGE else None
+    tool, args = routed or (BY_TEXT, {'query': user_message})
+    [(result, timing)] = execute_functions([(tool, args)], snapshot)
+    if timing['failed']:
+        return tool, args, FALLBACK_REPLY, timing
+    return tool, args, f"{LOCAL_REPLY_NOTE}\n\n{render_intent(tool, args, result)}", timing
+
+
+def answer_locally(session, user_message, snapshot, lang, stream, usage, reason):
+    """Finish a chat turn with local_reply(); yields the same events as run_chat_turn."""
+    metrics.incr(f'chat.local_replies.{reason}')
+    tool, args, reply, timing = local_reply(user_message, snapshot, lang)
+    # A tool event also clears any partial model text the client has shown
+    yield 'tool', {'name': tool, 'args': args, 'status': TOOL_STATUS[tool]}
+    usage['tools'].append(timing)
+    append_turns(session, user_message, reply)
+    if stream:
+        yield 'delta', {'text': reply}
+    usage['cached'] = False
+    usage['local_reply'] = reason
+    yield 'done', {'response': reply, 'session_id': session['_id'], 'usage': usage}
+
+
+def run_chat_turn(session, user_message, stream=False, lang=FALLBACK_LANGUAGE):
+    """
+    Run one user message through the function-calling loop.
+
+    Yields (event, data) tuples:
+        ('tool', {'name', 'args', 'status'})  before each tool runs
+        ('delta', {'text'})                   model text as it arrives (stream=True only)
+        ('done', {'response', 'session_id', 'usage'})  once, at the end
+
+    Model calls share a deadline of CHAT_REQUEST_DEADLINE seconds from the
+    start of the turn. If the Gemini circuit is open, a call fails or the
+    deadline passes, the turn is finished by answer_locally() and
+    usage['local_reply'] says why ('circuit_open', 'model_error' or 'deadline').
+
+    Args:
+        session: Chat session from chat_sessions
+        user_message: The user's new message
+        stream: Use the streaming API and emit text deltas
+        lang: App language (one of SUPPORTED_LANGUAGES)
+    """
+    started = time.perf_counter()
+    deadline = started + Config.CHAT_REQUEST_DEADLINE
+    # Every tool call in this turn sees the same catalog
+    snapshot = get_catalog()
+
+    # Follow-up messages lean on earlier turns ("SC from Maharashtra" after the
+    # model asked for age, state and category), so only an opening message is
+    # routed or answered from the cache
+    opening = not session.get('turns') and not session.get('summary')
+
+    # Messages that clearly ask for one tool are answered without the model
+    if opening and Config.CHAT_INTENT_ROUTER and lang == FALLBACK_LANGUAGE:
+        routed = route_intent(user_message, snapshot)
+        if routed is None:
+            metrics.incr('chat_router.fallthrough')
+        else:
+            tool, args = routed
+            yield 'tool', {'name': tool, 'args': args, 'status': TOOL_STATUS[tool]}
+            [(result, timing)] = execute_functions([(tool, args)], snapshot)
+            if not timing['failed']:
+                metrics.incr(f'chat_router.{tool}')
+                reply = render_intent(tool, args, result)
+                append_turns(session, user_message, reply)
+                if stream:
+                    yield 'delta', {'text': reply}
+                yield 'done', {
+                    'response': reply,
+                    'session_id': session['_id'],
+                    'usage': {'routed': tool, 'cached': False, 'tools': [timing]},
+                }
+                return
+
+    cache_key = None
+    if opening:
+        cache_key = chat_cache_key(user_message, lang, snapshot)
+        cached = get_cached_reply(cache_key)
+        if cached is not None:
+            append_turns(session, user_message, cached['response'])
+            if stream:
+                yield 'delta', {'text': cached['response']}
+            yield 'done', {
+                'response': cached['response'],
+                'session_id': session['_id'],
+                'usage': {'cached': True, 'saved_ms': round(cached['elapsed'] * 1000, 1)},
+            }
+            return
 
-    try:
-        client = genai.Client(api_key=Config.GEMINI_API_KEY)
-
-        tools = types.Tool(function_declarations=[
-            get_all_schemes_declaration,
-            search_schemes_by_category_declaration,
-            search_schemes_by_eligibility_declaration
-        ])
-
-        config = types.GenerateContentConfig(
-            system_instruction=SYSTEM_PROMPT,
-            tools=[tools],
-            temperature=0.7,
+    client = get_client()
+    config = CHAT_CONFIGS[lang]
+
+    # Conversation so far comes from the server-side session
+    contents = session_contents(session)
+
+    # Add the new user message
+    contents.append(
+        types.Content(
+            role='user',
+            parts=[types.Part(text=user_message)]
         )
+    )
+
+    usage = {
+        **compaction_usage(session),
+        'message_tokens': estimate_tokens(user_message),
+        'request_bytes': sum(
+            len(part.text.encode('utf-8')) for content in contents for part in content.parts
+        ),
+        'prompt_tokens': 0,
+        'response_tokens': 0,
+        'model_calls': 0,
+        'tools': [],
+    }
+
+    # ── Function calling loop ──────────────────────────────────────────────────
+    max_iterations = 5
+    iteration = 0
 
-        # Build conversation contents from history
-        contents = []
-        for turn in history:
-            role = turn.get('role', 'user')
-            text = turn.get('text', '')
-            if text:
-                contents.append(
-                    types.Content(
-                        role=role,
-                        parts=[types.Part(text=text)]
-                    )
+    while iteration < max_iterations:
+        iteration += 1
+
+        remaining = deadline - time.perf_counter()
+        if remaining < MIN_MODEL_CALL_SECONDS or not gemini_breaker.allow():
+            reason = 'deadline' if remaining < MIN_MODEL_CALL_SECONDS else 'circuit_open'
+            yield from answer_locally(session, user_message, snapshot, lang, stream, usage, reason)
+            return
+
+        # The call may not outlast the turn's deadline (a timeout of 0 would mean none)
+        call_config = config.model_copy(update={
+            'http_options': types.HttpOptions(timeout=max(1, int(min(Config.GEMINI_TIMEOUT, remaining) * 1000))),
+        })
+        call_started = time.perf_counter()
+        # A stream is judged by its time to first chunk: a long answer is not a slow model
+        first_chunk_at = None
+        out_of_time = False
+        try:
+            if stream:
+                # Collect the streamed parts; text goes out as soon as it arrives
+                parts = []
+                usage_metadata = None
+                for chunk in client.models.generate_content_stream(
+                    model=CHAT_MODEL,
+                    contents=contents,
+                    config=call_config,
+                ):
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                    # Totals are cumulative, so the last chunk's numbers count
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.candidates and chunk.candidates[0].content:
+                        for part in chunk.candidates[0].content.parts or []:
+                            parts.append(part)
+                            if part.text and not part.function_call:
+                                yield 'delta', {'text': part.text}
+                    # The timeout covers each read, not a slow trickle of chunks
+                    if time.perf_counter() > deadline:
+                        out_of_time = True
+                        break
+                response_content = types.Content(role='model', parts=parts)
+                fallback_text = None
+            else:
+                response = client.models.generate_content(
+                    model=CHAT_MODEL,
+                    contents=contents,
+                    config=call_config,
                 )
+        except Exception as e:
+            gemini_breaker.record(time.perf_counter() - call_started, ok=False)
+            print(f"Gemini call failed: {e}")
+            metrics.incr('chat.model_errors')
+            yield from answer_locally(session, user_message, snapshot, lang, stream, usage, 'model_error')
+            return
+        elapsed = time.perf_counter() - call_started
+        gemini_breaker.record((first_chunk_at or call_started + elapsed) - call_started)
+        metrics.observe('chat.model_call', elapsed)
+        if out_of_time:
+            yield from answer_locally(session, user_message, snapshot, lang, stream, usage, 'deadline')
+            return
+
+        if not stream:
+            usage_metadata = response.usage_metadata
+            response_content = response.candidates[0].content
+            fallback_text = response.text
+
+        usage['model_calls'] += 1
+        if usage_metadata:
+            usage['prompt_tokens'] += usage_metadata.prompt_token_count or 0
+            usage['response_tokens'] += usage_metadata.candidates_token_count or 0
+
+        # Check if there are function calls in any part
+        function_calls = []
+        text_parts = []
+
+        for part in response_content.parts or []:
+            if hasattr(part, 'function_call') and part.function_call:
+                function_calls.append(part.function_call)
+            elif hasattr(part, 'text') and part.text:
+                text_parts.append(part.text)
+
+        if not function_calls:
+            # No function calls — this is the answer
+            if stream:
+                final_text = ''.join(text_parts)
+            else:
+                final_text = ' '.join(text_parts) if text_parts else fallback_text
+            append_turns(session, user_message, final_text or '')
+            # Answers built on failed or timed-out tools are not worth repeating
+            if final_text and not any(t['timed_out'] or t['failed'] for t in usage['tools']):
+                store_reply(cache_key, final_text, time.perf_counter() - started)
+            usage['cached'] = False
+            yield 'done', {'response': final_text, 'session_id': session['_id'], 'usage': usage}
+            return
+
+        # Append the model's response (with function calls) to contents
+        contents.append(response_content)
+
+        # Execute the function calls together and collect results in order
+        calls = [(fc.name, dict(fc.args) if fc.args else {}) for fc in function_calls]
+        for fn_name, fn_args in calls:
+            yield 'tool', {
+                'name': fn_name,
+                'args': fn_args,
+                'status': TOOL_STATUS.get(fn_name, 'Working on it…'),
+            }
 
-        # Add the new user message
+        function_response_parts = []
+        for (fn_name, _), (fn_result, timing) in zip(calls, execute_functions(calls, snapshot)):
+            usage['tools'].append(timing)
+            function_response_parts.append(
+                types.Part.from_function_response(
+                    name=fn_name,
+                    response={"result": fn_result}
+                )
+            )
+
+        # Append function results back to contents
         contents.append(
             types.Content(
                 role='user',
-                parts=[types.Part(text=user_message)]
+                parts=function_response_parts
             )
         )
 
-        # ── Function calling loop ──────────────────────────────────────────────
-        max_iterations = 5
-        iteration = 0
-
-        while iteration < max_iterations:
-            iteration += 1
+    # If we exhausted iterations, say so
+    yield 'done', {'response': FALLBACK_REPLY, 'session_id': session['_id'], 'usage': usage}
 
-            response = client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=contents,
-                config=config,
-            )
 
-            candidate = response.candidates[0]
-            response_content = candidate.content
+def read_chat_request():
+    """
+    Validate a chat request body.
 
-            # Check if there are function calls in any part
-            function_calls = []
-            text_parts = []
-
-            for part in response_content.parts:
-                if hasattr(part, 'function_call') and part.function_call:
-                    function_calls.append(part.function_call)
-                elif hasattr(part, 'text') and part.text:
-                    text_parts.append(part.text)
+    Returns:
+        tuple: (session, user_message, lang, None) or (None, None, None, error response)
+    """
+    data = request.get_json(silent=True)
+    if not data or 'message' not in data:
+        return None, None, None, (jsonify({'error': 'Message is required'}), 400)
 
-            if not function_calls:
-                # No function calls — return the text response
-                final_text = ' '.join(text_parts) if text_parts else response.text
-                return jsonify({'response': final_text}), 200
+    user_message = str(data.get('message') or '').strip()
+    if not user_message:
+        return None, None, None, (jsonify({'error': 'Message cannot be empty'}), 400)
 
-            # Append the model's response (with function calls) to contents
-            contents.append(response_content)
+    lang = data.get('lang') or FALLBACK_LANGUAGE
+    if lang not in SUPPORTED_LANGUAGES:
+        return None, None, None, (jsonify({'error': f"lang must be one of: {', '.join(SUPPORTED_LANGUAGES)}"}), 400)
 
-            # Execute each function call and collect results
-            function_response_parts = []
-            for fc in function_calls:
-                fn_name = fc.name
-                fn_args = dict(fc.args) if fc.args else {}
+    if not Config.GEMINI_API_KEY:
+        return None, None, None, (jsonify({'error': 'Gemini API key not configured'}), 500)
 
-                fn_result = execute_function(fn_name, fn_args)
+    # history (list of {role, text}) is only used to seed a new session
+    session = load_session(data.get('session_id')) or create_session(data.get('history', []))
+    return session, user_message, lang, None
 
-                function_response_parts.append(
-                    types.Part.from_function_response(
-                        name=fn_name,
-                        response={"result": fn_result}
-                    )
-                )
 
-            # Append function results back to contents
-            contents.append(
-                types.Content(
-                    role='user',
-                    parts=function_response_parts
-                )
-            )
+# ─── Chat Endpoints ───────────────────────────────────────────────────────────
 
-        # If we exhausted iterations, return whatever text we have
-        return jsonify({'response': 'I encountered an issue processing your request. Please try again.'}), 200
+@chat_bp.route('/message', methods=['POST'])
+def chat_message():
+    session, user_message, lang, error = read_chat_request()
+    if error:
+        return error
 
+    try:
+        for event, data in run_chat_turn(session, user_message, lang=lang):
+            if event == 'done':
+                return jsonify(data), 200
     except Exception as e:
         print(f"Chat error: {e}")
         return jsonify({'error': f'Chat service error: {str(e)}'}), 500
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@chat_bp.route('/stream', methods=['POST'])
+def chat_stream():
+    """
+    Same request body as /message, answered as Server-Sent Events:
+    session, then any number of tool and delta events, then done
+    (or error). The session event goes out before the model is called.
+    """
+    session, user_message, lang, error = read_chat_request()
+    if error:
+        return error
+
+    def generate():
+        yield sse_event('session', {'session_id': session['_id']})
+        try:
+            for event, data in run_chat_turn(session, user_message, stream=True, lang=lang):
+                yield sse_event(event, data)
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event('error', {'error': f'Chat service error: {str(e)}'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,134 @@
+"""
+Cache of chatbot answers to first messages.
+
+Most chats open with one of a handful of questions. The answer to an opening
+message depends only on the message, the language and the catalog, so it is
+cached under a key built from all three:
+
+    - the message after alias_key (case, punctuation and spacing ignored)
+    - the chat language
+    - the catalog digest (a content hash, the same in every worker)
+
+Follow-up turns and sessions seeded with client history are never cached.
+Entries stop matching as soon as the catalog changes; the in-process backend
+is also cleared then so stale answers do not hold memory.
+
+The default backend is an in-process LRU with a TTL. Anything with
+get(key) and set(key, value, ttl) can replace it via set_backend() to share
+answers between workers (e.g. a thin Redis wrapper).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from catalog import add_change_listener
+from normalization import alias_key
+import metrics
+
+
+class MemoryBackend:
+    """Thread-safe LRU of at most max_entries values, each expiring after its ttl."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_backend = MemoryBackend(Config.CHAT_CACHE_SIZE)
+
+
+def set_backend(backend):
+    """Use another backend, e.g. one shared by all workers."""
+    global _backend
+    _backend = backend
+
+
+def cache_key(message, lang, snapshot):
+    """Key for an opening message, or None if it normalizes to nothing."""
+    normalized = alias_key(message)
+    if not normalized:
+        return None
+    raw = f"{snapshot.digest}|{lang}|{normalized}"
+    return 'chat:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_cached_reply(key):
+    """
+    Cached reply for a key.
+
+    Returns:
+        dict or None: {'response', 'elapsed'} where elapsed is the seconds the
+                      original answer took to generate
+    """
+    if not Config.CHAT_CACHE_TTL or key is None:
+        return None
+    try:
+        entry = _backend.get(key)
+    except Exception as e:
+        print(f"Chat cache read failed: {e}")
+        entry = None
+    if entry is None:
+        metrics.incr('chat_cache.misses')
+        return None
+    metrics.incr('chat_cache.hits')
+    metrics.incr('chat_cache.saved_ms', int(entry['elapsed'] * 1000))
+    return entry
+
+
+def store_reply(key, response, elapsed):
+    if not Config.CHAT_CACHE_TTL or key is None:
+        return
+    try:
+        _backend.set(key, {'response': response, 'elapsed': elapsed}, Config.CHAT_CACHE_TTL)
+        metrics.incr('chat_cache.stores')
+    except Exception as e:
+        print(f"Chat cache write failed: {e}")
+
+
+def chat_cache_stats():
+    hits = metrics.get_counter('chat_cache.hits')
+    misses = metrics.get_counter('chat_cache.misses')
+    return {
+        'backend': type(_backend).__name__,
+        'entries': len(_backend) if isinstance(_backend, MemoryBackend) else None,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'saved_ms': metrics.get_counter('chat_cache.saved_ms'),
+    }
+
+
+def _clear_on_catalog_change(scheme_id=None):
+    # Keys already carry the catalog digest; this only frees the memory early
+    if isinstance(_backend, MemoryBackend):
+        _backend.clear()
+
+
+add_change_listener(_clear_on_catalog_change)
@@ -0,0 +1,216 @@
+"""
+Server-side chat sessions.
+
+A session stores the conversation so the client only sends its new message.
+The model gets a running summary of older turns plus the most recent turns.
+Once the stored turns exceed CHAT_HISTORY_TOKEN_BUDGET, the oldest ones are
+folded into the summary in the background, one compaction per session at a
+time. Sessions expire CHAT_SESSION_TTL_HOURS after their last message (TTL
+index on updated_at).
+
+Session document:
+    {'_id': str, 'summary': str, 'turns': [{'role', 'text', 'tokens'}],
+     'version': int, 'total_tokens': int, 'total_bytes': int, 'compactions': int,
+     'created_at', 'updated_at'}
+
+total_tokens and total_bytes count every turn ever added, so against the
+stored history they give what compaction saves on each request.
+"""
+import secrets
+import threading
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from config import Config
+from models import chat_sessions_collection
+import metrics
+
+# Rough characters per token for Gemini models; the API's own usage numbers
+# are reported next to this estimate
+CHARS_PER_TOKEN = 4
+
+# Longest fallback summary (characters) when the summarizer is unavailable
+MAX_FALLBACK_SUMMARY_CHARS = 2000
+
+# Times a finished summary is written again after turns were added meanwhile
+MAX_COMPACTION_WRITES = 3
+
+
+def estimate_tokens(text):
+    return (len(text or '') + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _text_bytes(text):
+    return len((text or '').encode('utf-8'))
+
+
+def _turn(role, text):
+    return {'role': 'model' if role == 'model' else 'user', 'text': text,
+            'tokens': estimate_tokens(text)}
+
+
+def create_session(history=None):
+    """
+    Start a session, optionally seeded with a client-side history
+    (list of {role, text}, the format /chat/message has always accepted).
+    """
+    now = datetime.now(timezone.utc)
+    turns = [_turn(t.get('role', 'user'), t.get('text', '')) for t in history or [] if t.get('text')]
+    session = {
+        '_id': secrets.token_urlsafe(16),
+        'summary': '',
+        'turns': turns,
+        'version': 0,
+        'total_tokens': sum(t['tokens'] for t in turns),
+        'total_bytes': sum(_text_bytes(t['text']) for t in turns),
+        'created_at': now,
+        'updated_at': now,
+    }
+    chat_sessions_collection.insert_one(session)
+    metrics.incr('chat_sessions.created')
+    return session
+
+
+def load_session(session_id):
+    if not session_id or not isinstance(session_id, str):
+        return None
+    return chat_sessions_collection.find_one({'_id': session_id})
+
+
+def history_tokens(session):
+    """Estimated tokens the stored history adds to a request."""
+    return estimate_tokens(session.get('summary')) + sum(t['tokens'] for t in session.get('turns', []))
+
+
+def history_bytes(session):
+    """Bytes of text the stored history adds to a request."""
+    return _text_bytes(session.get('summary')) + sum(_text_bytes(t['text']) for t in session.get('turns', []))
+
+
+def compaction_usage(session):
+    """History size sent with the next request, with and without compaction."""
+    tokens, size = history_tokens(session), history_bytes(session)
+    # Sessions from before total_bytes was kept count from their current history
+    uncompacted_tokens = max(session.get('total_tokens', 0), tokens)
+    uncompacted_bytes = max(session.get('total_bytes', 0), size)
+    return {
+        'history_tokens': tokens,
+        'history_bytes': size,
+        'uncompacted_history_tokens': uncompacted_tokens,
+        'uncompacted_history_bytes': uncompacted_bytes,
+        'compaction_saved_tokens': uncompacted_tokens - tokens,
+        'compaction_saved_bytes': uncompacted_bytes - size,
+        'compactions': session.get('compactions', 0),
+    }
+
+
+def append_turns(session, user_text, model_text):
+    """Record one exchange and compact the session if it went over budget."""
+    new_turns = [_turn('user', user_text), _turn('model', model_text)]
+    updated = chat_sessions_collection.find_one_and_update(
+        {'_id': session['_id']},
+        {
+            '$push': {'turns': {'$each': new_turns}},
+            '$inc': {
+                'version': 1,
+                'total_tokens': sum(t['tokens'] for t in new_turns),
+                'total_bytes': sum(_text_bytes(t['text']) for t in new_turns),
+            },
+            '$set': {'updated_at': datetime.now(timezone.utc)},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated is not None and history_tokens(updated) > Config.CHAT_HISTORY_TOKEN_BUDGET:
+        schedule_compaction(updated)
+    return updated
+
+
+# ─── Compaction ───────────────────────────────────────────────────────────────
+
+_summarizer = None
+# Sessions with a compaction running in this worker
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+def set_summarizer(summarize):
+    """
+    Register summarize(summary, turns) -> str, which folds turns (list of
+    {role, text}) into the previous summary. chat.py registers a model call.
+    """
+    global _summarizer
+    _summarizer = summarize
+
+
+def _fallback_summary(summary, turns):
+    """Keep the tail of a plain transcript when no model summary is available."""
+    lines = [summary] if summary else []
+    lines += [f"{t['role']}: {t['text']}" for t in turns]
+    return '\n'.join(lines)[-MAX_FALLBACK_SUMMARY_CHARS:]
+
+
+def schedule_compaction(session):
+    """
+    Compact a session on a background thread, unless a compaction of it is
+    already running (that one's summary would make this one's redundant).
+
+    Returns:
+        bool: True if a compaction was started
+    """
+    with _compacting_lock:
+        if session['_id'] in _compacting:
+            metrics.incr('chat_sessions.compactions_skipped')
+            return False
+        _compacting.add(session['_id'])
+    threading.Thread(target=_compact_in_background, args=(session,), daemon=True).start()
+    return True
+
+
+def _compact_in_background(session):
+    try:
+        compact_session(session)
+    except Exception as e:
+        print(f"Chat compaction failed for session {session['_id']}: {e}")
+    finally:
+        with _compacting_lock:
+            _compacting.discard(session['_id'])
+
+
+def compact_session(session):
+    """
+    Fold everything but the last CHAT_KEEP_RECENT_TURNS turns into the summary.
+
+    The write is conditional on the session's version. Turns added while the
+    summary was being written only go on the end, so the same summary is
+    written again over the fresh session as long as the summarized turns and
+    the old summary are unchanged.
+    """
+    keep = Config.CHAT_KEEP_RECENT_TURNS
+    turns = session.get('turns', [])
+    if len(turns) <= keep:
+        return False
+    split = len(turns) - keep
+    previous, old = session.get('summary', ''), turns[:split]
+
+    summary = None
+    if _summarizer is not None:
+        try:
+            summary = _summarizer(previous, old)
+        except Exception as e:
+            print(f"Chat summary failed for session {session['_id']}: {e}")
+    if not summary:
+        summary = _fallback_summary(previous, old)
+
+    for _ in range(MAX_COMPACTION_WRITES):
+        result = chat_sessions_collection.update_one(
+            {'_id': session['_id'], 'version': session['version']},
+            {'$set': {'summary': summary, 'turns': session['turns'][split:]},
+             '$inc': {'version': 1, 'compactions': 1}},
+        )
+        if result.modified_count:
+            metrics.incr('chat_sessions.compactions')
+            return True
+        session = load_session(session['_id'])
+        if session is None or session.get('summary', '') != previous or session['turns'][:split] != old:
+            break
+        metrics.incr('chat_sessions.compaction_rewrites')
+    return False
@@ -0,0 +1,96 @@
+"""
+Circuit breaker for calls to an outside service.
+
+    closed     calls go through; failed and slow calls in a row are counted
+    open       after `failures` bad calls in a row, calls are refused for
+               `cooldown` seconds so nobody waits on a service that is down
+    half-open  after the cooldown one trial call goes through; if it is good
+               the circuit closes, otherwise it opens for another cooldown
+
+A call counts as bad if it raised or took longer than `slow_seconds`. A slow
+call's answer is still used; it only counts towards opening the circuit.
+"""
+import threading
+import time
+import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker; one instance per outside service."""
+
+    def __init__(self, name, failures, slow_seconds, cooldown):
+        self.name = name
+        self.failures = failures
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._bad_calls = 0
+        self._opened_at = 0.0
+        self._trial_started = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """Whether a call may go out now. Every allowed call must be followed by record()."""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and now - self._opened_at >= self.cooldown:
+                self._state = HALF_OPEN
+                self._trial_started = None
+            if self._state == HALF_OPEN:
+                # One trial at a time; a trial that never reported back is given up on
+                if self._trial_started is None or now - self._trial_started >= self.cooldown:
+                    self._trial_started = now
+                    return True
+        metrics.incr(f'circuit.{self.name}.rejected')
+        return False
+
+    def record(self, elapsed, ok=True):
+        """
+        Report how an allowed call went.
+
+        Args:
+            elapsed: Seconds the call took
+            ok: False if the call failed
+        """
+        bad = not ok or elapsed > self.slow_seconds
+        if not ok:
+            metrics.incr(f'circuit.{self.name}.failures')
+        elif bad:
+            metrics.incr(f'circuit.{self.name}.slow_calls')
+        with self._lock:
+            if not bad:
+                self._state = CLOSED
+                self._bad_calls = 0
+                self._trial_started = None
+                return
+            self._bad_calls += 1
+            if self._state == HALF_OPEN or self._bad_calls >= self.failures:
+                if self._state != OPEN:
+                    metrics.incr(f'circuit.{self.name}.opened')
+                    print(f"Circuit {self.name} opened after {self._bad_calls} bad call(s)")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_started = None
+
+    def stats(self):
+        with self._lock:
+            state, bad_calls = self._state, self._bad_calls
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+        return {
+            'state': state,
+            'bad_calls_in_a_row': bad_calls,
+            'retry_in_seconds': round(retry_in, 1),
+            'opened': metrics.get_counter(f'circuit.{self.name}.opened'),
+            'rejected': metrics.get_counter(f'circuit.{self.name}.rejected'),
+        }
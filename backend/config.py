@@ -10,3 +10,37 @@ class Config:
     PORT = int(os.getenv('PORT', 5000))
     CORS_ORIGIN = os.getenv('CORS_ORIGIN', 'http://localhost:3000')
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+    USER_SNAPSHOT_TTL = int(os.getenv('USER_SNAPSHOT_TTL', 300))
+    CATALOG_TTL = int(os.getenv('CATALOG_TTL', 60))
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+    HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+    MARQUEE_SETTINGS_TTL = int(os.getenv('MARQUEE_SETTINGS_TTL', 60))
+    ELIGIBILITY_MAX_AGE = int(os.getenv('ELIGIBILITY_MAX_AGE', 86400))
+    ELIGIBILITY_MEMO_SIZE = int(os.getenv('ELIGIBILITY_MEMO_SIZE', 1024))
+    JWT_ACCESS_TOKEN_MINUTES = int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15))
+    ROLE_REVOCATION_TTL = int(os.getenv('ROLE_REVOCATION_TTL', 30))
+    REFRESH_TOKEN_DAYS = int(os.getenv('REFRESH_TOKEN_DAYS', 30))
+    CHAT_SESSION_TTL_HOURS = int(os.getenv('CHAT_SESSION_TTL_HOURS', 24))
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', 1500))
+    CHAT_KEEP_RECENT_TURNS = int(os.getenv('CHAT_KEEP_RECENT_TURNS', 4))
+    CHAT_TOOL_TOP_K = int(os.getenv('CHAT_TOOL_TOP_K', 8))
+    CHAT_TOOL_RESULT_TOKENS = int(os.getenv('CHAT_TOOL_RESULT_TOKENS', 600))
+    CHAT_TOOL_WORKERS = int(os.getenv('CHAT_TOOL_WORKERS', 8))
+    CHAT_TOOL_TIMEOUT = float(os.getenv('CHAT_TOOL_TIMEOUT', 5))
+    CHAT_INTENT_ROUTER = os.getenv('CHAT_INTENT_ROUTER', 'true').lower() == 'true'
+    CHAT_CACHE_SIZE = int(os.getenv('CHAT_CACHE_SIZE', 512))
+    CHAT_CACHE_TTL = int(os.getenv('CHAT_CACHE_TTL', 3600))
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+    GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', '')
+    GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', 30))
+    GEMINI_MAX_CONNECTIONS = int(os.getenv('GEMINI_MAX_CONNECTIONS', 20))
+    GEMINI_SLOW_CALL = float(os.getenv('GEMINI_SLOW_CALL', 10))
+    GEMINI_BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', 5))
+    GEMINI_BREAKER_COOLDOWN = float(os.getenv('GEMINI_BREAKER_COOLDOWN', 30))
+    CHAT_REQUEST_DEADLINE = float(os.getenv('CHAT_REQUEST_DEADLINE', 45))
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
@@ -1,57 +1,47 @@
-from difflib import SequenceMatcher
+from functools import lru_cache
+from normalization import (
+    STATE, CATEGORY, EDUCATION, MATCH_THRESHOLDS, RESOLVE_CACHE_SIZE,
+    resolve, normalize_text, fuzzy_match_normalized
+)
+from tag_index import TAG_INDEX
 
-def fuzzy_match(str1, str2, threshold=0.75):
+
+# Fallback for values the canonical tables do not recognise
+cached_fuzzy_match = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(fuzzy_match_normalized)
+
+
+def values_match(kind, user_norm, allowed_norm):
     """
-    Compare two strings and return True if similarity is above threshold.
-    Uses SequenceMatcher for fuzzy string matching.
+    Compare a normalized user value with one normalized allowed value.
+    
+    When both resolve to canonical codes the codes decide; otherwise the
+    memoized fuzzy comparison is used with the threshold for this kind.
     
     Args:
-        str1: First string to compare
-        str2: Second string to compare
-        threshold: Similarity threshold (0.0 to 1.0), default 0.75
+        kind: normalization.STATE, CATEGORY or EDUCATION
+        user_norm: Normalized user value
+        allowed_norm: Normalized value from the scheme
     
     Returns:
-        bool: True if strings are similar enough
+        bool: True if the values match
     """
-    if not str1 or not str2:
-        return False
-    
-    # Convert to lowercase for case-insensitive comparison
-    str1_lower = str(str1).lower().strip()
-    str2_lower = str(str2).lower().strip()
-    
-    # Exact match
-    if str1_lower == str2_lower:
-        return True
-    
-    # Check if one string contains the other (only for short strings or very similar lengths)
-    # This prevents "Graduate" from matching "Post-Graduate"
-    len_diff = abs(len(str1_lower) - len(str2_lower))
-    if len_diff <= 3:  # Allow small length differences for substring matching
-        if str1_lower in str2_lower or str2_lower in str1_lower:
-            return True
-    
-    # Calculate similarity ratio
-    similarity = SequenceMatcher(None, str1_lower, str2_lower).ratio()
-    return similarity >= threshold
+    user_code = resolve(kind, user_norm)
+    allowed_code = resolve(kind, allowed_norm)
+    if user_code is not None and allowed_code is not None:
+        return user_code == allowed_code
+    return cached_fuzzy_match(user_norm, allowed_norm, MATCH_THRESHOLDS[kind])
 
 
-def check_tags_match(user_profile, scheme_tags):
+def get_user_attributes(user_profile):
     """
-    Check if scheme tags match user profile attributes.
-    This enables intelligent matching based on tags like 'scholarship', 'SC', 'women', etc.
+    Derive the list of lowercase attributes used for tag matching from a profile.
     
     Args:
         user_profile: Dictionary containing user profile information
-        scheme_tags: List of tags associated with the scheme
     
     Returns:
-        bool: True if any tags match user profile
+        list: Attribute strings such as the category, 'student', 'women', 'senior'
     """
-    if not scheme_tags:
-        return True  # No tags means no tag-based filtering
-    
-    # Extract user attributes for matching
     user_attributes = []
     
     # Add category
@@ -102,136 +92,329 @@ def check_tags_match(user_profile, scheme_tags):
         elif 18 <= age <= 35:
             user_attributes.extend(['youth', 'young'])
     
-    # Check if any scheme tag matches user attributes (with fuzzy matching)
-    for tag in scheme_tags:
-        tag_lower = str(tag).lower().strip()
-        for attr in user_attributes:
-            if fuzzy_match(tag_lower, attr, threshold=0.7):
+    return user_attributes
+
+
+def _tags_match_attributes(tags_lower, user_attributes):
+    """Return True if any pre-lowered tag matches any user attribute."""
+    TAG_INDEX.add_tags(tags_lower)
+    profile_tags = TAG_INDEX.tags_for_attributes(user_attributes)
+    return any(tag in profile_tags for tag in tags_lower)
+
+
+def check_tags_match(user_profile, scheme_tags):
+    """
+    Check if scheme tags match user profile attributes.
+    This enables intelligent matching based on tags like 'scholarship', 'SC', 'women', etc.
+    
+    Args:
+        user_profile: Dictionary containing user profile information
+        scheme_tags: List of tags associated with the scheme
+    
+    Returns:
+        bool: True if any tags match user profile
+    """
+    if not scheme_tags:
+        return True  # No tags means no tag-based filtering
+    
+    # Check if any scheme tag matches user attributes (via the tag index)
+    tags_lower = [normalize_text(tag) for tag in scheme_tags]
+    return _tags_match_attributes(tags_lower, get_user_attributes(user_profile))
+
+
+def get_matched_tags(user_profile, scheme_tags):
+    """
+    Report which scheme tags match the user profile.
+    
+    Args:
+        user_profile: Dictionary containing user profile information
+        scheme_tags: List of tags associated with the scheme
+    
+    Returns:
+        list: The original tags that matched, in scheme order
+    """
+    if not scheme_tags:
+        return []
+    
+    tags_lower = [normalize_text(tag) for tag in scheme_tags]
+    TAG_INDEX.add_tags(tags_lower)
+    profile_tags = TAG_INDEX.tags_for_attributes(get_user_attributes(user_profile))
+    return [tag for tag, tag_lower in zip(scheme_tags, tags_lower) if tag_lower in profile_tags]
+
+
+def _parse_age_bound(value):
+    """Parse a min_age/max_age value; falsy or unparseable bounds mean no limit."""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+class ListRule:
+    """
+    A state, category or education list from a scheme.
+    
+    Attributes:
+        kind: normalization.STATE, CATEGORY or EDUCATION
+        active: Whether the rule applies (the list is non-empty, even if no entry can match)
+        values: Tuple of normalized allowed values
+        codes: Frozenset of canonical codes the allowed values resolve to
+        unresolved: Allowed values the canonical tables do not recognise
+    """
+    
+    __slots__ = ('kind', 'active', 'values', 'codes', 'unresolved')
+    
+    def __init__(self, kind, values):
+        self.kind = kind
+        self.active = bool(values)
+        # fuzzy_match never matches a falsy value, so those entries are dropped here
+        self.values = tuple(normalize_text(v) for v in values or () if v)
+        resolved = [(value, resolve(kind, value)) for value in self.values]
+        self.codes = frozenset(code for _, code in resolved if code is not None)
+        self.unresolved = tuple(value for value, code in resolved if code is None)
+    
+    def allows(self, user_norm):
+        """Return True if any allowed value matches (see values_match)."""
+        user_code = resolve(self.kind, user_norm)
+        if user_code is not None:
+            if user_code in self.codes:
                 return True
-            # Also check if tag contains attribute or vice versa
-            if tag_lower in attr or attr in tag_lower:
+            candidates = self.unresolved
+        else:
+            candidates = self.values
+        threshold = MATCH_THRESHOLDS[self.kind]
+        for value in candidates:
+            if cached_fuzzy_match(user_norm, value, threshold):
                 return True
+        return False
+
+
+class CompiledScheme:
+    """
+    Eligibility rules of a single scheme, normalized once so that evaluating
+    a profile against it does no per-call string or type conversion.
+    
+    Attributes:
+        scheme: The original scheme dictionary
+        min_age, max_age: Parsed age bounds (None when the scheme has no limit)
+        states, categories, education: ListRule for each list requirement
+        requires_disability: True if the scheme lists supported disabilities
+        student_required: True, False or None (no student rule)
+        tags: Tuple of pre-lowered tags
+    """
+    
+    __slots__ = (
+        'scheme', 'min_age', 'max_age', 'states', 'categories', 'education',
+        'requires_disability', 'student_required', 'tags'
+    )
     
-    return False
+    def __init__(self, scheme):
+        self.scheme = scheme
+        self.min_age = _parse_age_bound(scheme.get('min_age'))
+        self.max_age = _parse_age_bound(scheme.get('max_age'))
+        self.states = ListRule(STATE, scheme.get('states'))
+        self.categories = ListRule(CATEGORY, scheme.get('eligible_categories'))
+        self.education = ListRule(EDUCATION, scheme.get('education_required'))
+        self.requires_disability = bool(scheme.get('disability_supported'))
+        self.student_required = scheme.get('student_required')
+        self.tags = tuple(normalize_text(tag) for tag in scheme.get('tags') or ())
+        # Tag neighbours are computed when a scheme is first compiled
+        TAG_INDEX.add_tags(self.tags)
 
 
-def check_eligibility(user_profile, scheme):
+class ProfileFacts:
     """
-    Enhanced eligibility check with tag matching and fuzzy string matching.
+    The parts of a user profile that eligibility rules read, extracted once
+    per profile instead of once per scheme.
+    """
+    
+    __slots__ = (
+        'profile', 'age', 'invalid_age', 'state', 'state_norm',
+        'category', 'category_norm', 'education', 'education_norm',
+        'has_disability', 'student', 'attributes', '_profile_tags', '_tag_version'
+    )
+    
+    def __init__(self, user_profile):
+        self.profile = user_profile
+        self.age = None
+        self.invalid_age = False
+        age = user_profile.get('age')
+        if age:
+            try:
+                self.age = int(age)
+            except ValueError:
+                self.invalid_age = True
+        
+        self.state = user_profile.get('state')
+        self.state_norm = normalize_text(self.state) if self.state else None
+        self.category = user_profile.get('category')
+        self.category_norm = normalize_text(self.category) if self.category else None
+        self.education = user_profile.get('education')
+        self.education_norm = normalize_text(self.education) if self.education else None
+        self.has_disability = user_profile.get('disability') == 'yes'
+        self.student = user_profile.get('student')
+        # Tags only ever loosen a verdict, so a malformed profile simply matches no tags
+        try:
+            self.attributes = [] if self.invalid_age else get_user_attributes(user_profile)
+        except (AttributeError, TypeError):
+            self.attributes = []
+        self._profile_tags = None
+        self._tag_version = None
+    
+    def matches_tags(self, tags_lower):
+        """Return True if any of the (already indexed) tags matches this profile."""
+        # The profile's tag set is derived once and refreshed only if the vocabulary grew
+        if self._tag_version != TAG_INDEX.version:
+            self._tag_version = TAG_INDEX.version
+            self._profile_tags = TAG_INDEX.tags_for_attributes(self.attributes)
+        profile_tags = self._profile_tags
+        return any(tag in profile_tags for tag in tags_lower)
+
+
+def evaluate_eligibility(facts, compiled):
+    """
+    Evaluate precomputed profile facts against a compiled scheme.
     
     Args:
-        user_profile: Dictionary containing user profile information
-        scheme: Dictionary containing scheme information
+        facts: ProfileFacts for the user
+        compiled: CompiledScheme for the scheme
     
     Returns:
-        tuple: (is_eligible: bool, reason: str)
+        tuple: (is_eligible: bool, reason: str), identical to check_eligibility
     """
-    reasons = []
+    if facts.invalid_age:
+        return False, "Invalid age"
     
-    if not user_profile:
-        return False, "Profile not completed"
+    reasons = []
     
     # Check age requirements (strict check)
-    age = user_profile.get('age')
-    if age:
-        try:
-            age = int(age)
-        except ValueError:
-            return False, "Invalid age"
-        min_age = scheme.get('min_age')
-        max_age = scheme.get('max_age')
-
-        if min_age and age < min_age:
-            reasons.append(f"Minimum age required: {min_age}")
-
-        if max_age and age > max_age:
-            reasons.append(f"Maximum age allowed: {max_age}")
-
-    
-    # Check state requirements (with fuzzy matching)
-    user_state = user_profile.get('state')
-    scheme_states = scheme.get('states', [])
-    if scheme_states and user_state:
-        # Use fuzzy matching for state names
-        state_match = False
-        for scheme_state in scheme_states:
-            if fuzzy_match(user_state, scheme_state, threshold=0.8):
-                state_match = True
-                break
-        
-        if not state_match:
-            reasons.append(f"Not available in {user_state}")
-    
-    # Check category requirements (with fuzzy matching)
-    user_category = user_profile.get('category')
-    eligible_categories = scheme.get('eligible_categories', [])
-    if eligible_categories and user_category:
-        # Use fuzzy matching for categories
-        category_match = False
-        for eligible_cat in eligible_categories:
-            if fuzzy_match(user_category, eligible_cat, threshold=0.85):
-                category_match = True
-                break
-        
-        if not category_match:
-            reasons.append(f"Category {user_category} not eligible")
+    if facts.age is not None:
+        if compiled.min_age and facts.age < compiled.min_age:
+            reasons.append(f"Minimum age required: {compiled.min_age}")
+        if compiled.max_age and facts.age > compiled.max_age:
+            reasons.append(f"Maximum age allowed: {compiled.max_age}")
+    
+    # Check state requirements (canonical codes, fuzzy fallback)
+    if compiled.states.active and facts.state:
+        if not compiled.states.allows(facts.state_norm):
+            reasons.append(f"Not available in {facts.state}")
+    
+    # Check category requirements (canonical codes, fuzzy fallback)
+    if compiled.categories.active and facts.category:
+        if not compiled.categories.allows(facts.category_norm):
+            reasons.append(f"Category {facts.category} not eligible")
     
     # Check disability requirements
-    disability_supported = scheme.get('disability_supported', [])
-    user_disability = user_profile.get('disability')
-    if disability_supported:
-        if user_disability != 'yes':
-            reasons.append("Requires disability")
-        else:
-            user_disability_type = user_profile.get('disabilityPercent')
-            if user_disability_type and disability_supported:
-                pass  # Could add more specific disability type checking here
+    if compiled.requires_disability and not facts.has_disability:
+        reasons.append("Requires disability")
     
     # Check student requirements (strict check)
-    student_required = scheme.get('student_required')
-    user_student = user_profile.get('student')
-    if student_required is True:
-        if user_student != 'yes':
+    if compiled.student_required is True:
+        if facts.student != 'yes':
             reasons.append("Only for students")
-    elif student_required is False:
-        if user_student == 'yes':
+    elif compiled.student_required is False:
+        if facts.student == 'yes':
             reasons.append("Not for students")
     
-    # Check education requirements (with fuzzy matching)
-    education_required = scheme.get('education_required', [])
-    user_education = user_profile.get('education')
-    if education_required and user_education:
-        # Use fuzzy matching for education levels
-        education_match = False
-        for required_edu in education_required:
-            if fuzzy_match(user_education, required_edu, threshold=0.8):
-                education_match = True
-                break
-        
-        if not education_match:
-            reasons.append(f"Education level {user_education} not eligible")
+    # Check education requirements (canonical codes, fuzzy fallback)
+    if compiled.education.active and facts.education:
+        if not compiled.education.allows(facts.education_norm):
+            reasons.append(f"Education level {facts.education} not eligible")
     
-    # If there are blocking reasons, check if tags can override
-    # Tags provide additional context that might make user eligible
-    scheme_tags = scheme.get('tags', [])
-    tags_match = check_tags_match(user_profile, scheme_tags)
+    if not reasons:
+        return True, "Eligible"
     
     # If strict criteria failed but tags match, reduce the strictness
-    if reasons and tags_match:
-        # Filter out non-critical reasons if tags match
-        critical_reasons = []
-        for reason in reasons:
-            # Keep only age-related and student requirement reasons as critical
-            if 'age' in reason.lower() or 'only for students' in reason.lower():
-                critical_reasons.append(reason)
+    if not compiled.tags or facts.matches_tags(compiled.tags):
+        # Keep only age-related and student requirement reasons as critical
+        critical_reasons = [
+            reason for reason in reasons
+            if 'age' in reason.lower() or 'only for students' in reason.lower()
+        ]
         
         # If only non-critical reasons remain and tags match, consider eligible
         if not critical_reasons:
             return True, "Eligible based on profile and scheme tags"
-        else:
-            reasons = critical_reasons
+        reasons = critical_reasons
+    
+    return False, "; ".join(reasons)
+
+
+def check_eligibility(user_profile, scheme):
+    """
+    Enhanced eligibility check with tag matching and fuzzy string matching.
     
-    if reasons:
-        return False, "; ".join(reasons)
+    Args:
+        user_profile: Dictionary containing user profile information
+        scheme: Dictionary containing scheme information
+    
+    Returns:
+        tuple: (is_eligible: bool, reason: str)
+    """
+    if not user_profile:
+        return False, "Profile not completed"
+    
+    return evaluate_eligibility(ProfileFacts(user_profile), CompiledScheme(scheme))
+
+
+# ─── Compiled Catalog ─────────────────────────────────────────────────────────
+
+# Compiled rules keyed by scheme _id; cleared when the catalog revision is bumped
+_compiled_catalog = {}
+
+
+def get_compiled_scheme(scheme):
+    """
+    Return the cached CompiledScheme for a scheme, compiling it on first use.
+    Catalog snapshots share scheme dicts, so a different dict for the same _id
+    means the scheme was reloaded and is compiled again.
+    """
+    scheme_id = scheme.get('_id')
+    if scheme_id is None:
+        return CompiledScheme(scheme)
+    
+    compiled = _compiled_catalog.get(scheme_id)
+    if compiled is None or compiled.scheme is not scheme:
+        compiled = CompiledScheme(scheme)
+        _compiled_catalog[scheme_id] = compiled
+    return compiled
+
+
+def invalidate_compiled_catalog(scheme_id=None):
+    """
+    Drop compiled rules after a scheme write.
+    
+    Args:
+        scheme_id: The scheme that changed, or None to drop every compiled scheme
+    """
+    if scheme_id is None:
+        _compiled_catalog.clear()
+    else:
+        _compiled_catalog.pop(str(scheme_id), None)
+
+
+def filter_eligible_schemes(user_profile, schemes):
+    """
+    Evaluate one profile against many schemes using the compiled catalog.
+    
+    Args:
+        user_profile: Dictionary containing user profile information
+        schemes: List of scheme dictionaries (with string _id)
+    
+    Returns:
+        list: (scheme, reason) tuples for the schemes the user is eligible for
+    """
+    if not user_profile:
+        return []
     
-    return True, "Eligible"
+    facts = ProfileFacts(user_profile)
+    eligible = []
+    for scheme in schemes:
+        is_eligible, reason = evaluate_eligibility(facts, get_compiled_scheme(scheme))
+        if is_eligible:
+            eligible.append((scheme, reason))
+    return eligible
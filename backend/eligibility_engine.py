@@ -0,0 +1,333 @@
+"""
+Columnar eligibility engine.
+
+The catalog is laid out as NumPy columns (age bounds, packed state/category/
+education/tag bitmasks and int8 rule flags) so that one profile is checked
+against every scheme with a handful of array operations. Verdicts and reasons
+are the same as eligibility.check_eligibility.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import Config
+from eligibility import (
+    ProfileFacts,
+    get_compiled_scheme,
+    values_match,
+)
+from tag_index import TAG_INDEX
+from normalization import STATE, CATEGORY, EDUCATION
+import metrics
+
+# Reason codes, one bit per failed rule
+REASON_MIN_AGE = 1 << 0
+REASON_MAX_AGE = 1 << 1
+REASON_STATE = 1 << 2
+REASON_CATEGORY = 1 << 3
+REASON_DISABILITY = 1 << 4
+REASON_STUDENT_ONLY = 1 << 5
+REASON_NOT_STUDENT = 1 << 6
+REASON_EDUCATION = 1 << 7
+REASON_INVALID_AGE = 1 << 8
+REASON_NO_PROFILE = 1 << 9
+
+# Memoized per-value vocabulary matches kept per engine
+_MAX_MATCH_MEMO = 1024
+
+
+class _Vocabulary:
+    """
+    Distinct normalized values of one list rule across the catalog, with each
+    scheme's allowed values packed into a bitmask row.
+    """
+
+    def __init__(self, value_lists, kind):
+        self.kind = kind
+        self.values = sorted({value for values in value_lists for value in values})
+        index = {value: i for i, value in enumerate(self.values)}
+        membership = np.zeros((len(value_lists), max(len(self.values), 1)), dtype=bool)
+        for row, values in enumerate(value_lists):
+            for value in values:
+                membership[row, index[value]] = True
+        self.bits = np.packbits(membership, axis=1)
+        self._memo = {}
+
+    def user_bits(self, user_norm):
+        """Bitmask of vocabulary values that match a normalized user value."""
+        bits = self._memo.get(user_norm)
+        if bits is None:
+            matches = np.zeros(self.bits.shape[1] * 8, dtype=bool)
+            for i, value in enumerate(self.values):
+                matches[i] = values_match(self.kind, user_norm, value)
+            bits = np.packbits(matches)
+            if len(self._memo) >= _MAX_MATCH_MEMO:
+                self._memo.clear()
+            self._memo[user_norm] = bits
+        return bits
+
+    def matches(self, user_norm):
+        """Boolean column: True where the scheme allows a value matching user_norm."""
+        return (self.bits & self.user_bits(user_norm)).any(axis=1)
+
+
+class CatalogEngine:
+    """
+    Columnar view of a list of schemes.
+
+    Columns:
+        min_age, max_age: float64, NaN where the scheme has no bound
+        has_state_rule, has_category_rule, has_education_rule: int8 flags
+        requires_disability: int8 flag
+        student_rule: int8 (1 = students only, -1 = not for students, 0 = no rule)
+        has_tags: int8 flag
+        states, categories, education, tags: packed bitmask vocabularies
+    """
+
+    def __init__(self, schemes):
+        self.compiled = [get_compiled_scheme(scheme) for scheme in schemes]
+        compiled = self.compiled
+
+        self.min_age = np.array(
+            [c.min_age if c.min_age is not None else np.nan for c in compiled], dtype=np.float64)
+        self.max_age = np.array(
+            [c.max_age if c.max_age is not None else np.nan for c in compiled], dtype=np.float64)
+
+        self.has_state_rule = np.array([c.states.active for c in compiled], dtype=np.int8)
+        self.has_category_rule = np.array([c.categories.active for c in compiled], dtype=np.int8)
+        self.has_education_rule = np.array([c.education.active for c in compiled], dtype=np.int8)
+        self.requires_disability = np.array([c.requires_disability for c in compiled], dtype=np.int8)
+        self.student_rule = np.array(
+            [1 if c.student_required is True else -1 if c.student_required is False else 0
+             for c in compiled],
+            dtype=np.int8
+        )
+        self.has_tags = np.array([bool(c.tags) for c in compiled], dtype=np.int8)
+
+        self.states = _Vocabulary([c.states.values for c in compiled], STATE)
+        self.categories = _Vocabulary([c.categories.values for c in compiled], CATEGORY)
+        self.education = _Vocabulary([c.education.values for c in compiled], EDUCATION)
+        self.tags = _Vocabulary([c.tags for c in compiled], None)
+        self._tag_memo = {}
+
+        # Distinct age bounds: two ages between the same bounds get the same verdicts
+        self._min_bounds = np.unique(self.min_age[~np.isnan(self.min_age)])
+        self._max_bounds = np.unique(self.max_age[~np.isnan(self.max_age)])
+        # profile signature -> eligible scheme indices (see eligible_indices)
+        self._eligible_memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.compiled)
+
+    def _tag_matches(self, attributes):
+        """Boolean column: True where a scheme has no tags or one of its tags matches."""
+        key = tuple(attributes)
+        bits = self._tag_memo.get(key)
+        if bits is None:
+            profile_tags = TAG_INDEX.tags_for_attributes(attributes)
+            matches = np.zeros(self.tags.bits.shape[1] * 8, dtype=bool)
+            for i, tag in enumerate(self.tags.values):
+                matches[i] = tag in profile_tags
+            bits = np.packbits(matches)
+            if len(self._tag_memo) >= _MAX_MATCH_MEMO:
+                self._tag_memo.clear()
+            self._tag_memo[key] = bits
+        return (self.has_tags == 0) | (self.tags.bits & bits).any(axis=1)
+
+    def evaluate(self, user_profile, facts=None):
+        """
+        Evaluate one profile against every scheme.
+
+        Args:
+            user_profile: Dictionary containing user profile information
+            facts: ProfileFacts of the profile, if already built
+
+        Returns:
+            tuple: (eligible: bool ndarray, codes: int32 ndarray of REASON_* bits, facts)
+        """
+        n = len(self.compiled)
+        if not user_profile:
+            return np.zeros(n, dtype=bool), np.full(n, REASON_NO_PROFILE, dtype=np.int32), None
+
+        facts = facts or ProfileFacts(user_profile)
+        if facts.invalid_age:
+            return np.zeros(n, dtype=bool), np.full(n, REASON_INVALID_AGE, dtype=np.int32), facts
+
+        codes = np.zeros(n, dtype=np.int32)
+
+        if facts.age is not None:
+            codes |= np.where(self.min_age > facts.age, REASON_MIN_AGE, 0).astype(np.int32)
+            codes |= np.where(self.max_age < facts.age, REASON_MAX_AGE, 0).astype(np.int32)
+
+        if facts.state:
+            failed = (self.has_state_rule == 1) & ~self.states.matches(facts.state_norm)
+            codes |= np.where(failed, REASON_STATE, 0).astype(np.int32)
+
+        if facts.category:
+            failed = (self.has_category_rule == 1) & ~self.categories.matches(facts.category_norm)
+            codes |= np.where(failed, REASON_CATEGORY, 0).astype(np.int32)
+
+        if not facts.has_disability:
+            codes |= np.where(self.requires_disability == 1, REASON_DISABILITY, 0).astype(np.int32)
+
+        if facts.student == 'yes':
+            codes |= np.where(self.student_rule == -1, REASON_NOT_STUDENT, 0).astype(np.int32)
+        else:
+            codes |= np.where(self.student_rule == 1, REASON_STUDENT_ONLY, 0).astype(np.int32)
+
+        if facts.education:
+            failed = (self.has_education_rule == 1) & ~self.education.matches(facts.education_norm)
+            codes |= np.where(failed, REASON_EDUCATION, 0).astype(np.int32)
+
+        # Tags may waive every reason except the critical ones
+        critical = _critical_codes(facts)
+        eligible = (codes == 0) | (((codes & critical) == 0) & self._tag_matches(facts.attributes))
+        return eligible, codes, facts
+
+    def signature(self, facts):
+        """
+        Hashable summary of everything evaluate() reads from a profile. Ages are
+        reduced to their position among the catalog's age bounds; the fixed age
+        bands used for tags are already in the attributes.
+        """
+        if facts.invalid_age:
+            return ('invalid age',)
+        age_key = None
+        if facts.age is not None:
+            age_key = (int(np.searchsorted(self._min_bounds, facts.age, side='right')),
+                       int(np.searchsorted(self._max_bounds, facts.age, side='left')))
+        return (age_key, facts.state_norm, facts.category_norm, facts.education_norm,
+                facts.has_disability, facts.student == 'yes', frozenset(facts.attributes))
+
+    def eligible_indices(self, user_profile):
+        """
+        Indices of the schemes a profile is eligible for, and whether each
+        one needed its tags, memoized by profile signature.
+
+        Returns:
+            tuple: ((index, via_tags), ...) in catalog order
+        """
+        if not user_profile:
+            return ()
+        facts = ProfileFacts(user_profile)
+        key = self.signature(facts)
+        with self._memo_lock:
+            result = self._eligible_memo.get(key)
+            if result is not None:
+                self._eligible_memo.move_to_end(key)
+        if result is not None:
+            metrics.incr('eligibility_memo.hits')
+            return result
+
+        metrics.incr('eligibility_memo.misses')
+        eligible, codes, _ = self.evaluate(user_profile, facts)
+        # An eligible scheme with reason bits set can only have been waived by its tags
+        result = tuple((int(i), bool(codes[i])) for i in np.flatnonzero(eligible))
+        with self._memo_lock:
+            self._eligible_memo[key] = result
+            while len(self._eligible_memo) > Config.ELIGIBILITY_MEMO_SIZE:
+                self._eligible_memo.popitem(last=False)
+        return result
+
+    def explain(self, index, code, facts):
+        """Rebuild the check_eligibility reason string for one scheme's result."""
+        if code & REASON_NO_PROFILE:
+            return "Profile not completed"
+        if code & REASON_INVALID_AGE:
+            return "Invalid age"
+        if code == 0:
+            return "Eligible"
+
+        reasons = _reason_texts(code, facts, self.compiled[index])
+        if self._tag_matches(facts.attributes)[index]:
+            critical = _critical_codes(facts)
+            if not code & critical:
+                return "Eligible based on profile and scheme tags"
+            reasons = _reason_texts(code & critical, facts, self.compiled[index])
+        return "; ".join(reasons)
+
+
+def _reason_texts(code, facts, compiled):
+    """Reason strings for the set bits of a code, in check_eligibility order."""
+    reasons = []
+    if code & REASON_MIN_AGE:
+        reasons.append(f"Minimum age required: {compiled.min_age}")
+    if code & REASON_MAX_AGE:
+        reasons.append(f"Maximum age allowed: {compiled.max_age}")
+    if code & REASON_STATE:
+        reasons.append(f"Not available in {facts.state}")
+    if code & REASON_CATEGORY:
+        reasons.append(f"Category {facts.category} not eligible")
+    if code & REASON_DISABILITY:
+        reasons.append("Requires disability")
+    if code & REASON_STUDENT_ONLY:
+        reasons.append("Only for students")
+    if code & REASON_NOT_STUDENT:
+        reasons.append("Not for students")
+    if code & REASON_EDUCATION:
+        reasons.append(f"Education level {facts.education} not eligible")
+    return reasons
+
+
+def _critical_codes(facts):
+    """
+    Reason bits that tags cannot waive. check_eligibility keeps any reason whose
+    text mentions 'age' or 'only for students', so profile-dependent texts are
+    checked the same way.
+    """
+    critical = REASON_MIN_AGE | REASON_MAX_AGE | REASON_STUDENT_ONLY
+    if facts.state and 'age' in f"Not available in {facts.state}".lower():
+        critical |= REASON_STATE
+    if facts.category and 'age' in f"Category {facts.category} not eligible".lower():
+        critical |= REASON_CATEGORY
+    if facts.education and 'age' in f"Education level {facts.education} not eligible".lower():
+        critical |= REASON_EDUCATION
+    return critical
+
+
+# ─── Engine Cache ─────────────────────────────────────────────────────────────
+
+_engine = None
+_engine_key = None
+
+
+def get_engine(schemes):
+    """
+    Return a CatalogEngine for the given schemes, reusing the last one while
+    every scheme still maps to the same CompiledScheme object.
+    """
+    global _engine, _engine_key
+    key = tuple(get_compiled_scheme(scheme) for scheme in schemes)
+    engine = _engine
+    if engine is None or _engine_key != key:
+        engine = CatalogEngine(schemes)
+        _engine, _engine_key = engine, key
+    return engine
+
+
+def evaluate_catalog(user_profile, schemes):
+    """
+    Evaluate a profile against a list of schemes.
+
+    Returns:
+        tuple: (eligible mask, reason codes), aligned with schemes
+    """
+    eligible, codes, facts = get_engine(schemes).evaluate(user_profile)
+    return eligible, codes
+
+
+def filter_eligible_schemes(user_profile, schemes):
+    """
+    Drop-in replacement for eligibility.filter_eligible_schemes.
+
+    Results are memoized per engine (so per catalog version) by profile
+    signature, so profiles that differ only in ways the rules ignore share
+    one evaluation.
+
+    Returns:
+        list: (scheme, reason) tuples for the schemes the user is eligible for
+    """
+    return [
+        (schemes[i], "Eligible based on profile and scheme tags" if via_tags else "Eligible")
+        for i, via_tags in get_engine(schemes).eligible_indices(user_profile)
+    ]
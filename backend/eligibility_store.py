@@ -0,0 +1,183 @@
+"""
+Materialized per-user eligible scheme lists.
+
+Each user gets one document in user_eligibility, keyed by the user's _id:
+
+    {'_id': ObjectId, 'schemes': [{'scheme_id': str, 'reason': str}, ...],
+     'computed_at': float, 'catalog_digest': str}
+
+The list is recomputed when the profile changes and patched in place by the
+scheme fan-out when a scheme is created, edited or deleted. The fan-out
+re-reads the profiles it patches from Mongo; the reverse index's per-worker
+snapshot only tells it whose lists to look at.
+
+catalog_digest is the digest of the catalog the list was computed against.
+Both paths first bring this worker's catalog up to the shared version in
+Mongo, so a scheme written in another worker is never missed, and a list whose
+digest differs from the current catalog (or older than ELIGIBILITY_MAX_AGE) is
+recomputed on read. That also catches catalog writes made outside the app,
+once the snapshot's CATALOG_TTL runs out.
+"""
+import time
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import Config
+from models import users_collection, user_eligibility_collection, find_user_by_id
+from catalog import get_current_catalog
+from eligibility import CompiledScheme, ProfileFacts, evaluate_eligibility
+from eligibility_engine import filter_eligible_schemes
+from user_index import register_fanout_handler
+import metrics
+
+# Users per update_many when a scheme change is fanned out
+FANOUT_CHUNK_SIZE = 1000
+
+TAG_REASON = "Eligible based on profile and scheme tags"
+
+# Seconds of clock difference between app servers allowed for when comparing
+# a list's computed_at with the time the user snapshot was loaded
+CLOCK_SKEW = 60
+
+
+def refresh_user_eligibility(user_id, profile, snapshot=None):
+    """
+    Recompute and store a user's eligible schemes against the current catalog.
+
+    Args:
+        snapshot: CatalogSnapshot already checked against the shared version
+                  (default: get_current_catalog())
+
+    Returns:
+        list: (scheme, reason) tuples, in catalog order
+    """
+    if snapshot is None:
+        snapshot = get_current_catalog()
+    eligible = filter_eligible_schemes(profile or {}, list(snapshot.schemes))
+    user_eligibility_collection.replace_one(
+        {'_id': ObjectId(user_id)},
+        {
+            'schemes': [{'scheme_id': scheme['_id'], 'reason': reason} for scheme, reason in eligible],
+            'computed_at': time.time(),
+            'catalog_digest': snapshot.digest,
+        },
+        upsert=True,
+    )
+    metrics.incr('user_eligibility.recomputes')
+    return eligible
+
+
+def get_user_eligible_schemes(user_id):
+    """
+    A user's eligible schemes from the materialized list, computing it from the
+    stored profile first if it is missing, too old or computed against another
+    catalog.
+
+    Returns:
+        list or None: (scheme, reason) tuples, or None if the user does not exist
+    """
+    snapshot = get_current_catalog()
+    stored = user_eligibility_collection.find_one({'_id': ObjectId(user_id)})
+    if (stored is None
+            or stored.get('catalog_digest') != snapshot.digest
+            or time.time() - stored.get('computed_at', 0) > Config.ELIGIBILITY_MAX_AGE):
+        metrics.incr('user_eligibility.misses')
+        user = find_user_by_id(user_id)
+        if not user:
+            return None
+        return refresh_user_eligibility(user_id, user.get('profile', {}), snapshot)
+
+    metrics.incr('user_eligibility.hits')
+    by_id = snapshot.by_id
+    # Entries for schemes deleted since the last fan-out are skipped
+    return [
+        (by_id[entry['scheme_id']], entry['reason'])
+        for entry in stored['schemes']
+        if entry['scheme_id'] in by_id
+    ]
+
+
+def forget_user_eligibility(user_id):
+    user_eligibility_collection.delete_one({'_id': ObjectId(user_id)})
+
+
+def _chunks(items):
+    for start in range(0, len(items), FANOUT_CHUNK_SIZE):
+        yield items[start:start + FANOUT_CHUNK_SIZE]
+
+
+def _current_reason(profile, compiled):
+    """The reason a profile qualifies for a compiled scheme, or None if it does not."""
+    if not profile:
+        return None
+    try:
+        is_eligible, reason = evaluate_eligibility(ProfileFacts(profile), compiled)
+    except TypeError:
+        return None
+    return reason if is_eligible else None
+
+
+def _apply_scheme_change(scheme_id, scheme, result):
+    """
+    Fan-out handler: bring every stored list in line with one scheme.
+
+    The reverse index's snapshot can be USER_SNAPSHOT_TTL old and misses
+    profile edits and signups made in other workers, so its result only picks
+    the users to look at: those it finds eligible, those whose list holds the
+    scheme, and those whose list was computed after the snapshot was loaded.
+    Their profiles are re-read from Mongo and checked against the scheme
+    before any list is changed. Users without a stored list are skipped;
+    theirs is computed on first read.
+    """
+    # Current entry for this scheme in every list that has one
+    current = {
+        str(doc['_id']): doc['schemes'][0]['reason']
+        for doc in user_eligibility_collection.find(
+            {'schemes.scheme_id': scheme_id},
+            {'schemes': {'$elemMatch': {'scheme_id': scheme_id}}},
+        )
+    }
+
+    eligible = {}
+    if scheme is not None and result is not None:
+        candidates = set(current) | set(result['user_ids'])
+        candidates.update(
+            str(doc['_id']) for doc in user_eligibility_collection.find(
+                {'computed_at': {'$gte': result['snapshot_loaded_at'] - CLOCK_SKEW}}, {'_id': 1},
+            )
+        )
+        compiled = CompiledScheme(scheme)
+        for chunk in _chunks([ObjectId(user_id) for user_id in candidates]):
+            for user in users_collection.find({'_id': {'$in': chunk}}, {'profile': 1}):
+                reason = _current_reason(user.get('profile'), compiled)
+                if reason is not None:
+                    eligible[str(user['_id'])] = reason
+        metrics.incr('user_eligibility.fanout_rechecks', len(candidates))
+
+    dropped = [ObjectId(user_id) for user_id in current.keys() - eligible.keys()]
+    for chunk in _chunks(dropped):
+        user_eligibility_collection.update_many(
+            {'_id': {'$in': chunk}},
+            {'$pull': {'schemes': {'scheme_id': scheme_id}}},
+        )
+
+    for reason in ("Eligible", TAG_REASON):
+        added = [ObjectId(user_id) for user_id, r in eligible.items()
+                 if r == reason and user_id not in current]
+        for chunk in _chunks(added):
+            user_eligibility_collection.update_many(
+                {'_id': {'$in': chunk}, 'schemes.scheme_id': {'$ne': scheme_id}},
+                {'$push': {'schemes': {'scheme_id': scheme_id, 'reason': reason}}},
+            )
+
+    changed = [
+        UpdateOne({'_id': ObjectId(user_id), 'schemes.scheme_id': scheme_id},
+                  {'$set': {'schemes.$.reason': reason}})
+        for user_id, reason in eligible.items()
+        if user_id in current and current[user_id] != reason
+    ]
+    for chunk in _chunks(changed):
+        user_eligibility_collection.bulk_write(chunk, ordered=False)
+    metrics.incr('user_eligibility.fanouts')
+
+
+register_fanout_handler(_apply_scheme_change)
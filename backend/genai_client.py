@@ -0,0 +1,59 @@
+"""
+Shared Gemini client.
+
+genai.Client owns an httpx connection pool, so building one per chat message
+paid for a new connection and TLS handshake every turn. Each worker now
+builds one client on first use and every request thread shares it (httpx
+clients are thread-safe). Requests time out after GEMINI_TIMEOUT seconds, and
+at most GEMINI_MAX_CONNECTIONS connections are kept open. GEMINI_BASE_URL
+points the client at another endpoint, such as benchmarks/fake_gemini.py.
+
+gemini_breaker stops calls for a while once Gemini keeps failing or
+answering slowly; callers check it before each call and report back after.
+"""
+import threading
+import httpx
+from google import genai
+from google.genai import types
+from config import Config
+from circuit_breaker import CircuitBreaker
+import metrics
+
+_client = None
+_client_lock = threading.Lock()
+
+gemini_breaker = CircuitBreaker(
+    'gemini',
+    failures=Config.GEMINI_BREAKER_FAILURES,
+    slow_seconds=Config.GEMINI_SLOW_CALL,
+    cooldown=Config.GEMINI_BREAKER_COOLDOWN,
+)
+
+
+def _build_client():
+    return genai.Client(
+        api_key=Config.GEMINI_API_KEY,
+        http_options=types.HttpOptions(
+            base_url=Config.GEMINI_BASE_URL or None,
+            timeout=int(Config.GEMINI_TIMEOUT * 1000),  # milliseconds
+            client_args={
+                'limits': httpx.Limits(
+                    max_connections=Config.GEMINI_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.GEMINI_MAX_CONNECTIONS,
+                ),
+            },
+        ),
+    )
+
+
+def get_client():
+    """The worker's Gemini client, built on first use."""
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+                metrics.incr('genai.clients_created')
+            client = _client
+    return client
@@ -0,0 +1,43 @@
+"""
+Conditional GET helpers.
+
+ETags are strong validators derived from content digests (see
+CatalogSnapshot.digest), so every worker hands out the same tag for the same
+data. A matching If-None-Match gets a bodyless 304 before the response body
+is built.
+"""
+import hashlib
+from flask import Response, jsonify, request
+from config import Config
+
+
+def make_etag(*parts):
+    """Strong ETag value from digests and other stable strings."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={Config.HTTP_CACHE_MAX_AGE}, must-revalidate'
+    return response
+
+
+def not_modified(etag):
+    """A 304 response if the client already holds this ETag, else None."""
+    if request.if_none_match.contains_weak(etag):
+        return _cache_headers(Response(status=304), etag)
+    return None
+
+
+def cached_json(build_payload, etag):
+    """
+    Respond with JSON tagged with etag, or 304 if the client's copy is current.
+
+    Args:
+        build_payload: Callable returning the response data; skipped on a 304
+        etag: Value from make_etag
+    """
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    return _cache_headers(jsonify(build_payload()), etag)
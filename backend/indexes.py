@@ -0,0 +1,168 @@
+"""
+MongoDB index management.
+
+ensure_indexes() runs at startup and is idempotent: create_index is a no-op
+for an index that already exists with the same options. Run this file
+directly to create the indexes, or with --explain to print the query plan of
+every query shape the backend issues and flag collection scans:
+
+    python indexes.py
+    python indexes.py --explain
+"""
+import argparse
+import sys
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+from config import Config
+from models import (
+    users_collection,
+    schemes_collection,
+    site_settings_collection,
+    user_eligibility_collection,
+    role_revocations_collection,
+    refresh_tokens_collection,
+    chat_sessions_collection,
+)
+
+# (collection, keys, options)
+INDEXES = [
+    (users_collection, [('phone', ASCENDING)], {'unique': True, 'name': 'phone_unique'}),
+    # Users who signed up without an email have no email field at all
+    (users_collection, [('email', ASCENDING)], {'unique': True, 'sparse': True, 'name': 'email_unique'}),
+    (site_settings_collection, [('type', ASCENDING)], {'unique': True, 'name': 'type_unique'}),
+    (schemes_collection, [('category', ASCENDING)], {'name': 'category'}),
+    (schemes_collection, [('tags', ASCENDING)], {'name': 'tags'}),
+    (schemes_collection, [('states', ASCENDING)], {'name': 'states'}),
+    # Scheme fan-out looks up every stored list that holds a scheme
+    (user_eligibility_collection, [('schemes.scheme_id', ASCENDING)], {'name': 'scheme_id'}),
+    # ...and every list computed after its user snapshot was loaded
+    (user_eligibility_collection, [('computed_at', ASCENDING)], {'name': 'computed_at'}),
+    # A revocation only matters while tokens issued before it can still be used
+    (role_revocations_collection, [('revoked_at', ASCENDING)],
+     {'expireAfterSeconds': Config.JWT_ACCESS_TOKEN_MINUTES * 60, 'name': 'revoked_at_ttl'}),
+    (refresh_tokens_collection, [('expires_at', ASCENDING)], {'expireAfterSeconds': 0, 'name': 'expires_at_ttl'}),
+    (refresh_tokens_collection, [('family_id', ASCENDING)], {'name': 'family_id'}),
+    (refresh_tokens_collection, [('user_id', ASCENDING)], {'name': 'user_id'}),
+    (chat_sessions_collection, [('updated_at', ASCENDING)],
+     {'expireAfterSeconds': Config.CHAT_SESSION_TTL_HOURS * 3600, 'name': 'updated_at_ttl'}),
+]
+
+
+def _drop_null_emails():
+    """
+    Older signups stored email: null, which a sparse unique index still
+    indexes. Clear those once, before the email index is first built.
+    """
+    if 'email_unique' not in users_collection.index_information():
+        users_collection.update_many({'email': {'$in': [None, '']}}, {'$unset': {'email': ''}})
+
+
+def ensure_indexes():
+    """
+    Create every index in INDEXES. Failures are printed, not raised, so the
+    API still starts when Mongo is unreachable or existing data violates a
+    unique index.
+
+    Returns:
+        bool: True if every index is in place
+    """
+    ok = True
+    try:
+        _drop_null_emails()
+    except PyMongoError as e:
+        print(f"Index setup skipped: {e}")
+        return False
+
+    for collection, keys, options in INDEXES:
+        try:
+            collection.create_index(keys, **options)
+        except OperationFailure as e:
+            # Usually duplicate values left over from before the unique index
+            print(f"Could not create index {options['name']} on {collection.name}: {e}")
+            ok = False
+        except PyMongoError as e:
+            print(f"Index setup skipped: {e}")
+            return False
+    return ok
+
+
+# ─── Query Plan Audit ─────────────────────────────────────────────────────────
+
+# (description, collection, filter, sort, full_read) for every query shape the
+# backend issues; full_read marks reads that scan the collection on purpose
+QUERY_SHAPES = [
+    ('find_user_by_phone', users_collection, {'phone': '0000000000'}, None, False),
+    ('find_user_by_email', users_collection, {'email': 'nobody@example.com'}, None, False),
+    ('find_user_by_id', users_collection, {'_id': ObjectId()}, None, False),
+    ('user listing page', users_collection, {'_id': {'$gt': ObjectId()}}, [('_id', ASCENDING)], False),
+    ('user snapshot load', users_collection, {}, None, True),
+    ('marquee settings', site_settings_collection, {'type': 'marquee'}, None, False),
+    ('catalog load', schemes_collection, {}, None, True),
+    ('scheme by id', schemes_collection, {'_id': ObjectId()}, None, False),
+    ('recent schemes', schemes_collection, {}, [('_id', DESCENDING)], False),
+    ('scheme listing page', schemes_collection, {'_id': {'$gt': ObjectId()}}, [('_id', ASCENDING)], False),
+    ('schemes by category', schemes_collection, {'category': 'Education'}, None, False),
+    ('schemes by tag', schemes_collection, {'tags': 'education'}, None, False),
+    ('schemes by state', schemes_collection, {'states': 'Maharashtra'}, None, False),
+    ('eligible list by user', user_eligibility_collection, {'_id': ObjectId()}, None, False),
+    ('eligible lists by scheme', user_eligibility_collection, {'schemes.scheme_id': 'x'}, None, False),
+    ('recently computed lists', user_eligibility_collection, {'computed_at': {'$gte': 0}}, None, False),
+    ('refresh token', refresh_tokens_collection, {'_id': 'x', 'used_at': None}, None, False),
+    ('refresh token family', refresh_tokens_collection, {'family_id': 'x'}, None, False),
+    ('refresh tokens by user', refresh_tokens_collection, {'user_id': ObjectId()}, None, False),
+]
+
+
+def _stages(plan):
+    """Yield every stage name in a (possibly nested or sharded) winning plan."""
+    if isinstance(plan, list):
+        for child in plan:
+            yield from _stages(child)
+        return
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan['stage']
+    for key in ('inputStage', 'inputStages', 'queryPlan', 'shards'):
+        yield from _stages(plan.get(key))
+
+
+def explain_query_shapes():
+    """
+    Print the winning plan of every query shape.
+
+    Returns:
+        int: Number of unexpected collection scans
+    """
+    scans = 0
+    for description, collection, query, sort, full_read in QUERY_SHAPES:
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(_stages(plan))
+        flag = ''
+        if 'COLLSCAN' in stages:
+            if full_read:
+                flag = '  (full read, expected)'
+            else:
+                flag = '  <-- COLLSCAN'
+                scans += 1
+        print(f"{collection.name:18} {description:26} {' > '.join(stages) or '?'}{flag}")
+    return scans
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create MongoDB indexes and audit query plans')
+    parser.add_argument('--explain', action='store_true',
+                        help='print query plans and exit non-zero on unexpected collection scans')
+    args = parser.parse_args()
+
+    if not ensure_indexes():
+        sys.exit(1)
+    if args.explain:
+        unexpected = explain_query_shapes()
+        print(f"\n{unexpected} unexpected collection scan(s)")
+        sys.exit(1 if unexpected else 0)
+    print("Indexes are in place")
@@ -0,0 +1,274 @@
+"""
+Answers for common chat messages without calling the model.
+
+Three kinds of message map straight onto a chat tool:
+
+    list        "show all schemes", "what schemes are available"
+    category    "agriculture schemes", "schemes for housing"
+    eligibility "I am 22, SC, from Maharashtra", "female student from Delhi aged 19"
+
+route() recognises them with keyword sets, an age pattern and the alias
+tables in normalization.py (exact aliases only, no fuzzy guesses). A message
+is routed only when every word is either a recognised value or known filler,
+so anything with extra content ("not a student", "how do I apply") still goes
+to the model. render() turns the tool's result into the reply text; it also
+renders text search results, which the chat uses when the model is unavailable.
+"""
+import re
+from normalization import (
+    CATEGORY, STATE, CATEGORY_ALIASES, STATE_ALIASES, alias_key, exact_alias,
+)
+
+LIST_ALL = 'get_all_schemes'
+BY_CATEGORY = 'search_schemes_by_category'
+BY_ELIGIBILITY = 'search_schemes_by_eligibility'
+BY_TEXT = 'search_schemes_by_text'
+
+# Words that carry no meaning of their own in these requests
+FILLER = frozenset("""
+a about all am an and any are available can could do every exist exists find for from
+give hello hey hi i im in is list me my of offered on options please programs provided
+related schemes scheme see show tell the there to under what which yojana yojanas you
+""".split())
+
+# Extra filler in eligibility messages
+PROFILE_FILLER = frozenset("""
+age aged belong belonging born caste category currently eligible gender get have live
+living m old qualify resident stay state studying years year yrs yr y o
+""".split())
+
+GENDER_WORDS = {
+    'male': 'male', 'man': 'male', 'boy': 'male', 'men': 'male',
+    'female': 'female', 'woman': 'female', 'girl': 'female', 'women': 'female', 'lady': 'female',
+}
+STUDENT_WORDS = frozenset(['student', 'students', 'studying'])
+DISABILITY_WORDS = frozenset(['disabled', 'disability', 'handicapped', 'pwd', 'divyang'])
+
+# Aliases that are ordinary English words; never read as a category
+AMBIGUOUS_CATEGORY_ALIASES = frozenset(['open', 'ur'])
+
+# The chat tool's category enum
+TOOL_CATEGORIES = {'SC': 'SC', 'ST': 'ST', 'OBC': 'OBC', 'GEN': 'General', 'EWS': 'EWS'}
+
+AGE_PATTERNS = [
+    re.compile(r'\b(?:age|aged|i am|i m|im)\s+(\d{1,3})\b'),
+    re.compile(r'\b(\d{1,3})\s+(?:years?|yrs?|yr|y o)\b'),
+]
+
+# Abbreviations like 'UP' or 'AS' that are only read as a state when written in capitals
+SHORT_STATE_ALIASES = frozenset(
+    alias_key(name) for code, names in STATE_ALIASES.items() for name in [code, *names]
+    if name.isupper()
+)
+
+_LONGEST_ALIAS = max(
+    len(alias_key(name).split())
+    for aliases in (STATE_ALIASES, CATEGORY_ALIASES) for names in aliases.values() for name in names
+)
+
+_category_names = (None, {})
+
+
+def _tokens(message):
+    """(lowercase tokens, original-case tokens) split the way alias_key splits."""
+    raw = str(message).replace('&', ' and ').replace('.', '')
+    original = [t for t in re.split(r'[^0-9A-Za-zऀ-ॿ]+', raw) if t]
+    return [t.lower() for t in original], original
+
+
+def _catalog_categories(snapshot):
+    """Category words (filler dropped) -> category name, for the categories in the catalog."""
+    global _category_names
+    cached_snapshot, names = _category_names
+    if cached_snapshot is not snapshot:
+        names = {}
+        for scheme in snapshot.schemes:
+            category = scheme.get('category')
+            if category:
+                key = ' '.join(t for t in alias_key(category).split() if t not in FILLER)
+                names.setdefault(key, category)
+        _category_names = (snapshot, names)
+    return names
+
+
+def _find_aliases(kind, tokens, original, used):
+    """Longest exact alias matches of one kind; marks their tokens as used."""
+    codes = []
+    for size in range(_LONGEST_ALIAS, 0, -1):
+        for start in range(len(tokens) - size + 1):
+            span = range(start, start + size)
+            if any(i in used for i in span):
+                continue
+            text = ' '.join(tokens[start:start + size])
+            code = exact_alias(kind, text)
+            if code is None:
+                continue
+            if kind == CATEGORY and text in AMBIGUOUS_CATEGORY_ALIASES:
+                continue
+            if kind == STATE and text in SHORT_STATE_ALIASES and not original[start].isupper():
+                continue
+            codes.append(code)
+            used.update(span)
+    return codes
+
+
+def _route_eligibility(tokens, original):
+    used = set()
+    args = {}
+
+    # At most one number, read as the age ("I am 22", "22 years", or bare)
+    numbers = [i for i, t in enumerate(tokens) if t.isdigit()]
+    if len(numbers) > 1:
+        return None
+    if numbers:
+        age = int(tokens[numbers[0]])
+        normalized = ' '.join(tokens)
+        if not 0 < age <= 120 or not (any(p.search(normalized) for p in AGE_PATTERNS) or len(tokens) > 2):
+            return None
+        args['age'] = age
+        used.update(numbers)
+
+    states = set(_find_aliases(STATE, tokens, original, used))
+    categories = set(_find_aliases(CATEGORY, tokens, original, used))
+    if len(states) > 1 or len(categories) > 1:
+        return None
+    if states:
+        args['state'] = STATE_ALIASES[states.pop()][0]
+    if categories:
+        args['category'] = TOOL_CATEGORIES[categories.pop()]
+
+    genders = set()
+    for i, token in enumerate(tokens):
+        if i in used:
+            continue
+        if token in GENDER_WORDS:
+            genders.add(GENDER_WORDS[token])
+        elif token in STUDENT_WORDS:
+            args['is_student'] = True
+        elif token in DISABILITY_WORDS:
+            args['has_disability'] = True
+        elif token not in FILLER and token not in PROFILE_FILLER:
+            return None
+    if len(genders) > 1:
+        return None
+    if genders:
+        args['gender'] = genders.pop()
+
+    # One detail alone is too little to go on
+    return args if len(args) >= 2 else None
+
+
+def route(message, snapshot):
+    """
+    Classify a chat message.
+
+    Args:
+        message: The user's message
+        snapshot: Catalog snapshot (for the category names)
+
+    Returns:
+        tuple or None: (tool name, args) when the message clearly asks for one
+                       tool, else None
+    """
+    tokens, original = _tokens(message)
+    if not tokens or len(tokens) > 25:
+        return None
+
+    content = [t for t in tokens if t not in FILLER]
+    if not content:
+        # "what schemes are available", "show me all schemes"
+        if {'scheme', 'schemes', 'yojana', 'yojanas'} & set(tokens):
+            return LIST_ALL, {}
+        return None
+
+    categories = _catalog_categories(snapshot)
+    key = ' '.join(content)
+    for candidate in (key, key[:-1] if key.endswith('s') else None):
+        if candidate in categories:
+            return BY_CATEGORY, {'category': categories[candidate]}
+
+    args = _route_eligibility(tokens, original)
+    if args is not None:
+        return BY_ELIGIBILITY, args
+    return None
+
+
+# ─── Replies ──────────────────────────────────────────────────────────────────
+
+def _scheme_lines(result):
+    lines = []
+    for scheme in result['schemes']:
+        line = f"• **{scheme['name']}**"
+        if scheme['benefits']:
+            line += f" — {scheme['benefits']}"
+        if scheme['official_link']:
+            line += f"\n  {scheme['official_link']}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def _count(result, noun):
+    """'1 Housing scheme', '3 Housing schemes' or 'the top 8 of 20 Housing schemes'."""
+    shown, total = len(result['schemes']), result['total_matches']
+    if shown < total:
+        return f"the top {shown} of {total} {noun}s"
+    return f"{total} {noun}" + ('' if total == 1 else 's')
+
+
+def _describe_profile(args):
+    parts = []
+    if 'age' in args:
+        parts.append(f"age {args['age']}")
+    if 'gender' in args:
+        parts.append(args['gender'])
+    if 'category' in args:
+        parts.append(f"{args['category']} category")
+    if 'state' in args:
+        parts.append(f"from {args['state']}")
+    if args.get('is_student'):
+        parts.append('student')
+    if args.get('has_disability'):
+        parts.append('with a disability')
+    return ', '.join(parts)
+
+
+def render(tool, args, result):
+    """Reply text for a routed message, from its tool result."""
+    if tool == LIST_ALL:
+        categories = '\n'.join(f"• **{name}**: {count}" for name, count in result['categories'].items())
+        return (
+            f"InfoMitra currently lists {result['total_matches']} schemes:\n{categories}\n\n"
+            f"Newest schemes:\n{_scheme_lines(result)}\n\n"
+            "Tell me your age, state and category and I can find the ones you may qualify for."
+        )
+
+    if tool == BY_CATEGORY:
+        if not result['schemes']:
+            return f"I couldn't find any {args['category']} schemes right now."
+        return (
+            f"I found {_count(result, args['category'] + ' scheme')}:\n{_scheme_lines(result)}\n\n"
+            "Ask me about any of them for eligibility, documents and how to apply."
+        )
+
+    if tool == BY_TEXT:
+        if not result['schemes']:
+            return (
+                "I couldn't find schemes matching your message. Try naming a category, "
+                "or tell me your age, state and category."
+            )
+        return (
+            f"I found {_count(result, 'scheme')} matching your message:\n{_scheme_lines(result)}\n\n"
+            "Please check each scheme's official link for the full details."
+        )
+
+    profile = _describe_profile(args)
+    if not result['schemes']:
+        return (
+            f"I couldn't find schemes matching your details ({profile}). "
+            "Complete your profile on InfoMitra for personalized recommendations."
+        )
+    return (
+        f"Based on your details ({profile}), I found {_count(result, 'scheme')} you may be eligible for:\n"
+        f"{_scheme_lines(result)}\n\n"
+        "Please check each scheme's official link for the full criteria, or ask me about any of them."
+    )
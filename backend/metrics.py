@@ -0,0 +1,44 @@
+"""
+In-process counters and timings.
+
+Caches and hot paths record hits, misses and durations here; the admin
+metrics endpoint returns a snapshot of everything recorded by this worker.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+
+
+def incr(name, amount=1):
+    """Add to a named counter."""
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    """Record one duration (in seconds) under a name."""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        ms = seconds * 1000
+        timing['count'] += 1
+        timing['total_ms'] += ms
+        timing['max_ms'] = max(timing['max_ms'], ms)
+
+
+def get_counter(name):
+    return _counters.get(name, 0)
+
+
+def get_metrics():
+    """Snapshot of all counters and timings (timings include the mean)."""
+    with _lock:
+        timings = {
+            name: dict(t, avg_ms=t['total_ms'] / t['count'] if t['count'] else 0.0)
+            for name, t in _timings.items()
+        }
+        return {'counters': dict(_counters), 'timings': timings}
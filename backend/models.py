@@ -1,5 +1,7 @@
+import time
 from pymongo import MongoClient
 from config import Config
+import metrics
 
 client = MongoClient(Config.MONGO_URI)
 db = client.get_database("infomitra")
@@ -7,16 +9,23 @@ db = client.get_database("infomitra")
 users_collection = db.users
 schemes_collection = db.schemes
 site_settings_collection = db.site_settings
+user_eligibility_collection = db.user_eligibility
+role_revocations_collection = db.role_revocations
+refresh_tokens_collection = db.refresh_tokens
+chat_sessions_collection = db.chat_sessions
 
 def create_user(email, phone, password_hash, profile=None, role='user'):
+    """Insert a user. Raises DuplicateKeyError if the phone or email is taken."""
     user = {
-        'email': email,
         'phone': phone,
         'password_hash': password_hash,
         'profile': profile or {},
         'role': role,
         'onboarded': False
     }
+    # Left out rather than null so the sparse unique email index ignores it
+    if email:
+        user['email'] = email
     result = users_collection.insert_one(user)
     return result.inserted_id
 
@@ -37,25 +46,104 @@ def update_user_profile(user_id, profile):
         {'$set': {'profile': profile, 'onboarded': True}}
     )
 
+def update_password_hash(user_id, new_hash, old_hash):
+    """Replace a password hash, unless it changed since old_hash was read."""
+    from bson import ObjectId
+    users_collection.update_one(
+        {'_id': ObjectId(user_id), 'password_hash': old_hash},
+        {'$set': {'password_hash': new_hash}}
+    )
+
 def create_scheme(scheme_data):
     result = schemes_collection.insert_one(scheme_data)
     return result.inserted_id
 
-def get_all_schemes():
-    schemes = list(schemes_collection.find())
-    for scheme in schemes:
-        scheme['_id'] = str(scheme['_id'])
-    return schemes
+def get_all_schemes(fields=None, lang=None):
+    """
+    All schemes from the cached catalog snapshot (shared dicts: do not mutate).
+    fields/lang narrow every scheme the way build_scheme_projection describes.
+    """
+    from catalog import get_catalog
+    return list(get_catalog().projected(build_scheme_projection(fields, lang)))
+
+# Public scheme fields; localized ones hold one value per language code
+SCHEME_FIELDS = (
+    'scheme_name', 'category', 'tags', 'objective', 'eligibility', 'benefits',
+    'documents', 'apply_process', 'official_link', 'min_age', 'max_age', 'states',
+    'eligible_categories', 'disability_supported', 'student_required', 'education_required',
+)
+LOCALIZED_SCHEME_FIELDS = ('scheme_name', 'objective', 'eligibility', 'benefits',
+                           'documents', 'apply_process')
+SUPPORTED_LANGUAGES = ('en', 'hi', 'mr')
+# The frontend shows English when a translation is missing
+FALLBACK_LANGUAGE = 'en'
+
+def build_scheme_projection(fields=None, lang=None):
+    """
+    Mongo projection for a subset of scheme fields and/or a single language.
+
+    _id is always included. With lang, localized fields keep only that
+    language plus the English fallback. Returns None when nothing is narrowed.
+    """
+    if not fields and not lang:
+        return None
+    projection = {'_id': 1}
+    for field in fields or SCHEME_FIELDS:
+        if lang and field in LOCALIZED_SCHEME_FIELDS:
+            for code in dict.fromkeys((lang, FALLBACK_LANGUAGE)):
+                projection[f'{field}.{code}'] = 1
+        else:
+            projection[field] = 1
+    return projection
+
+def project_scheme(scheme, projection):
+    """Apply a build_scheme_projection result to a scheme dict, matching what Mongo returns."""
+    if projection is None:
+        return scheme
+    projected = {}
+    for path in projection:
+        field, _, key = path.partition('.')
+        if field not in scheme:
+            continue
+        value = scheme[field]
+        if not key:
+            projected[field] = value
+        elif isinstance(value, dict):
+            # Like Mongo: a missing language leaves an empty sub-document,
+            # a non-document value drops the field
+            localized = projected.setdefault(field, {})
+            if key in value:
+                localized[key] = value[key]
+    return projected
 
 def get_scheme_by_id(scheme_id):
+    """
+    A scheme from the catalog snapshot, or from Mongo if the snapshot does not
+    have it (a scheme created in another worker since this one's last load).
+    """
     from bson import ObjectId
+    from catalog import get_catalog
+    scheme = get_catalog().by_id.get(scheme_id)
+    if scheme is not None or not ObjectId.is_valid(scheme_id):
+        return scheme
+
+    metrics.incr('catalog.by_id_fallbacks')
     scheme = schemes_collection.find_one({'_id': ObjectId(scheme_id)})
     if scheme:
         scheme['_id'] = str(scheme['_id'])
     return scheme
 
 
+# (loaded_at, settings) for the cached marquee settings
+_marquee_cache = None
+
 def get_marquee_settings():
+    """Marquee settings, cached for MARQUEE_SETTINGS_TTL seconds (shared dict: do not mutate)."""
+    global _marquee_cache
+    cached = _marquee_cache
+    if cached is not None and time.monotonic() - cached[0] < Config.MARQUEE_SETTINGS_TTL:
+        return cached[1]
+    
     settings = site_settings_collection.find_one({'type': 'marquee'})
     if settings:
         settings['_id'] = str(settings['_id'])
@@ -67,10 +155,12 @@ def get_marquee_settings():
             'show_new_schemes': True,
             'is_active': True
         }
+    _marquee_cache = (time.monotonic(), settings)
     return settings
 
 
 def update_marquee_settings(data):
+    global _marquee_cache
     result = site_settings_collection.update_one(
         {'type': 'marquee'},
         {'$set': {
@@ -81,12 +171,11 @@ def update_marquee_settings(data):
         }},
         upsert=True
     )
+    _marquee_cache = None
     return result.modified_count or result.upserted_id
 
 
 def get_recent_schemes(limit=5):
     """Get the most recently added schemes (by _id descending)."""
-    schemes = list(schemes_collection.find().sort('_id', -1).limit(limit))
-    for scheme in schemes:
-        scheme['_id'] = str(scheme['_id'])
-    return schemes
+    from catalog import get_catalog
+    return list(get_catalog().recent[:limit])
@@ -0,0 +1,202 @@
+"""
+Canonical code tables for states, social categories and education levels.
+
+Free text is resolved to a canonical code once: first through the alias tables,
+then (for spellings we have never seen) through a SequenceMatcher search over
+the aliases. Resolutions are kept in a bounded LRU memo, so eligibility checks
+compare codes instead of running fuzzy matching for every scheme.
+"""
+import re
+from functools import lru_cache
+from difflib import SequenceMatcher
+
+STATE = 'state'
+CATEGORY = 'category'
+EDUCATION = 'education'
+
+# Same thresholds the pairwise fuzzy matching has always used
+MATCH_THRESHOLDS = {
+    STATE: 0.8,
+    CATEGORY: 0.85,
+    EDUCATION: 0.8,
+}
+
+# Upper bound on memoized free-text resolutions and fallback comparisons
+RESOLVE_CACHE_SIZE = 4096
+
+STATE_ALIASES = {
+    # States
+    'AP': ['Andhra Pradesh', 'AP', 'Andhra'],
+    'AR': ['Arunachal Pradesh', 'AR', 'Arunachal'],
+    'AS': ['Assam', 'AS'],
+    'BR': ['Bihar', 'BR'],
+    'CG': ['Chhattisgarh', 'Chattisgarh', 'Chhatisgarh', 'CG', 'CT'],
+    'GA': ['Goa', 'GA'],
+    'GJ': ['Gujarat', 'Gujrat', 'GJ'],
+    'HR': ['Haryana', 'HR'],
+    'HP': ['Himachal Pradesh', 'HP', 'Himachal'],
+    'JH': ['Jharkhand', 'JH'],
+    'KA': ['Karnataka', 'KA', 'Karnatak'],
+    'KL': ['Kerala', 'KL', 'Keralam'],
+    'MP': ['Madhya Pradesh', 'MP'],
+    'MH': ['Maharashtra', 'Maharastra', 'MH'],
+    'MN': ['Manipur', 'MN'],
+    'ML': ['Meghalaya', 'ML'],
+    'MZ': ['Mizoram', 'MZ'],
+    'NL': ['Nagaland', 'NL'],
+    'OD': ['Odisha', 'Orissa', 'OD'],
+    'PB': ['Punjab', 'PB'],
+    'RJ': ['Rajasthan', 'RJ'],
+    'SK': ['Sikkim', 'SK'],
+    'TN': ['Tamil Nadu', 'Tamilnadu', 'TN'],
+    'TS': ['Telangana', 'TS', 'TG'],
+    'TR': ['Tripura', 'TR'],
+    'UP': ['Uttar Pradesh', 'UP'],
+    'UK': ['Uttarakhand', 'Uttaranchal', 'UK', 'UA'],
+    'WB': ['West Bengal', 'WB', 'Bengal'],
+    # Union territories
+    'AN': ['Andaman and Nicobar Islands', 'Andaman and Nicobar', 'Andaman & Nicobar', 'AN'],
+    'CH': ['Chandigarh', 'CH'],
+    'DH': ['Dadra and Nagar Haveli and Daman and Diu', 'Dadra and Nagar Haveli',
+           'Daman and Diu', 'DNH', 'DD'],
+    'DL': ['Delhi', 'New Delhi', 'NCT of Delhi', 'National Capital Territory of Delhi', 'DL'],
+    'JK': ['Jammu and Kashmir', 'Jammu & Kashmir', 'J&K', 'JK'],
+    'LA': ['Ladakh', 'LA'],
+    'LD': ['Lakshadweep', 'LD'],
+    'PY': ['Puducherry', 'Pondicherry', 'PY'],
+}
+
+CATEGORY_ALIASES = {
+    'SC': ['SC', 'S.C.', 'Scheduled Caste', 'Scheduled Castes', 'Schedule Caste'],
+    'ST': ['ST', 'S.T.', 'Scheduled Tribe', 'Scheduled Tribes', 'Schedule Tribe'],
+    'OBC': ['OBC', 'O.B.C.', 'Other Backward Class', 'Other Backward Classes',
+            'OBC-NCL', 'OBC Non Creamy Layer', 'Backward Class'],
+    'GEN': ['General', 'Gen', 'Open', 'Unreserved', 'UR', 'General Category'],
+    'EWS': ['EWS', 'Economically Weaker Section', 'Economically Weaker Sections'],
+}
+
+# Ordered from lowest to highest level
+EDUCATION_LADDER = [
+    ('BELOW_10', ['Below 10th', 'Below 10', 'Primary', 'Below Matric']),
+    ('9', ['9th', '9th Standard', 'Class 9', 'IX']),
+    ('10', ['10th', '10th Pass', '10th Standard', 'Class 10', 'SSC', 'Matric',
+            'Matriculation', 'Secondary', 'X']),
+    ('11', ['11th', '11th Standard', 'Class 11', 'XI']),
+    ('12', ['12th', '12th Pass', '12th Standard', 'Class 12', 'HSC', 'Intermediate',
+            'Higher Secondary', 'PUC', 'XII']),
+    ('DIPLOMA', ['Diploma', 'Polytechnic', 'ITI']),
+    ('GRADUATE', ['Graduate', 'Graduation', 'Undergraduate', 'UG', 'Bachelor',
+                  "Bachelor's", 'Bachelors', 'Degree']),
+    ('POST_GRADUATE', ['Post-Graduate', 'Post Graduate', 'Postgraduate', 'PG', 'Master',
+                       "Master's", 'Masters']),
+    ('MPHIL', ['M.Phil', 'MPhil']),
+    ('PHD', ['Ph.D', 'PhD', 'Doctorate']),
+]
+EDUCATION_ALIASES = dict(EDUCATION_LADDER)
+
+
+def normalize_text(value):
+    """Lowercase and strip a value the same way fuzzy_match does."""
+    return str(value).lower().strip()
+
+
+def fuzzy_match(str1, str2, threshold=0.75):
+    """
+    Compare two strings and return True if similarity is above threshold.
+    Uses SequenceMatcher for fuzzy string matching.
+    
+    Args:
+        str1: First string to compare
+        str2: Second string to compare
+        threshold: Similarity threshold (0.0 to 1.0), default 0.75
+    
+    Returns:
+        bool: True if strings are similar enough
+    """
+    if not str1 or not str2:
+        return False
+    
+    # Convert to lowercase for case-insensitive comparison
+    return fuzzy_match_normalized(normalize_text(str1), normalize_text(str2), threshold)
+
+
+def fuzzy_match_normalized(str1_lower, str2_lower, threshold=0.75):
+    """
+    Same as fuzzy_match, but for strings that already went through normalize_text.
+    """
+    # Exact match
+    if str1_lower == str2_lower:
+        return True
+    
+    # Check if one string contains the other (only for short strings or very similar lengths)
+    # This prevents "Graduate" from matching "Post-Graduate"
+    len_diff = abs(len(str1_lower) - len(str2_lower))
+    if len_diff <= 3:  # Allow small length differences for substring matching
+        if str1_lower in str2_lower or str2_lower in str1_lower:
+            return True
+    
+    # Calculate similarity ratio
+    similarity = SequenceMatcher(None, str1_lower, str2_lower).ratio()
+    return similarity >= threshold
+
+
+def alias_key(text):
+    """
+    Collapse a string into the form used for alias lookups:
+    lowercase, '&' spelled out, dots dropped, other punctuation as single spaces.
+    """
+    text = str(text).lower().replace('&', ' and ').replace('.', '')
+    return ' '.join(re.split(r'[^0-9a-zऀ-ॿ]+', text)).strip()
+
+
+def _build_index(aliases):
+    index = {}
+    for code, names in aliases.items():
+        index[alias_key(code)] = code
+        for name in names:
+            index[alias_key(name)] = code
+    return index
+
+
+_ALIAS_INDEX = {
+    STATE: _build_index(STATE_ALIASES),
+    CATEGORY: _build_index(CATEGORY_ALIASES),
+    EDUCATION: _build_index(EDUCATION_ALIASES),
+}
+
+
+def exact_alias(kind, text):
+    """Canonical code for text that is exactly one of the aliases (no fuzzy matching)."""
+    return _ALIAS_INDEX[kind].get(alias_key(text))
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def resolve(kind, text):
+    """
+    Resolve free text to a canonical code.
+
+    Args:
+        kind: STATE, CATEGORY or EDUCATION
+        text: The raw or normalized value
+
+    Returns:
+        str or None: The canonical code, or None if the text is not recognised
+    """
+    if not text:
+        return None
+    index = _ALIAS_INDEX[kind]
+    key = alias_key(text)
+    code = index.get(key)
+    if code is not None or len(key) <= 3:
+        # Short strings are abbreviations; guessing them fuzzily does more harm than good
+        return code
+
+    # Unseen spelling: take the closest alias if it clears the usual threshold
+    best_code, best_ratio = None, MATCH_THRESHOLDS[kind]
+    for alias, alias_code in index.items():
+        if len(alias) <= 3:
+            continue
+        ratio = SequenceMatcher(None, key, alias).ratio()
+        if ratio >= best_ratio:
+            best_code, best_ratio = alias_code, ratio
+    return best_code
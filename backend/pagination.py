@@ -0,0 +1,132 @@
+"""
+Keyset pagination and streaming for collection listings.
+
+Pages are read in _id order with {'_id': {'$gt': <last id>}}, so every page is
+one index range scan no matter how deep the client goes. The next_cursor token
+is the last _id of the page, base64url encoded. Streaming mode writes a JSON
+array or NDJSON straight from the Mongo cursor, one batch in memory at a time.
+
+Listings without any of the query parameters keep returning a plain array.
+"""
+import base64
+import binascii
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, current_app, jsonify, request, stream_with_context
+from config import Config
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def encode_cursor(object_id):
+    return base64.urlsafe_b64encode(ObjectId(object_id).binary).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """ObjectId from a next_cursor token; raises ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return ObjectId(raw)
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def _page_size():
+    limit = request.args.get('limit')
+    if limit is None:
+        return Config.PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, Config.MAX_PAGE_SIZE))
+
+
+def _serialize(document):
+    document['_id'] = str(document['_id'])
+    return document
+
+
+def fetch_page(collection, query=None, projection=None, after=None, page_size=None):
+    """
+    Read one page in _id order.
+
+    Args:
+        collection: Mongo collection
+        query: Filter document (None for everything)
+        projection: Mongo projection, pushed down to the server
+        after: ObjectId to start after (None for the first page)
+        page_size: Number of documents per page
+
+    Returns:
+        tuple: (items, next_cursor) - next_cursor is None on the last page
+    """
+    page_size = page_size or Config.PAGE_SIZE
+    query = dict(query or {})
+    if after is not None:
+        query['_id'] = {'$gt': after}
+    # One extra document tells us whether another page exists
+    documents = list(
+        collection.find(query, projection).sort('_id', 1).limit(page_size + 1)
+    )
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_cursor = encode_cursor(documents[-1]['_id'])
+    return [_serialize(document) for document in documents], next_cursor
+
+
+def stream_documents(collection, query=None, projection=None, after=None, fmt='json'):
+    """Response that streams every matching document as a JSON array or NDJSON."""
+    query = dict(query or {})
+    if after is not None:
+        query['_id'] = {'$gt': after}
+    cursor = collection.find(query, projection).sort('_id', 1).batch_size(Config.STREAM_BATCH_SIZE)
+    dumps = current_app.json.dumps
+
+    def generate():
+        try:
+            if fmt == 'ndjson':
+                for document in cursor:
+                    yield dumps(_serialize(document)) + '\n'
+                return
+            yield '['
+            for i, document in enumerate(cursor):
+                yield (',' if i else '') + dumps(_serialize(document))
+            yield ']'
+        finally:
+            cursor.close()
+
+    return Response(stream_with_context(generate()), mimetype=STREAM_FORMATS[fmt])
+
+
+def paged_listing(collection, query=None, projection=None):
+    """
+    Serve a listing in paged or streaming mode if the request asks for either.
+
+    Query parameters: limit (page size), cursor (next_cursor from the previous
+    page), stream ('json' or 'ndjson').
+
+    Returns:
+        The response to send, or None when the caller should use its unpaged listing
+    """
+    args = request.args
+    if 'stream' not in args and 'cursor' not in args and 'limit' not in args:
+        return None
+
+    try:
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+        fmt = args.get('stream')
+        if fmt is not None:
+            if fmt not in STREAM_FORMATS:
+                raise ValueError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+            return stream_documents(collection, query, projection, after, fmt)
+        page_size = _page_size()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    items, next_cursor = fetch_page(collection, query, projection, after, page_size)
+    return jsonify({'items': items, 'next_cursor': next_cursor}), 200
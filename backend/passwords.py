@@ -0,0 +1,104 @@
+"""
+Password hashing on a bounded worker pool.
+
+bcrypt is deliberately slow. Running it on request threads lets a login surge
+pin every CPU and queue all other requests behind it. Hashes and checks run
+on a fixed pool of PASSWORD_HASH_WORKERS threads instead (bcrypt releases the
+GIL). At most PASSWORD_HASH_QUEUE further jobs may wait; past that,
+PasswordHasherBusy is raised and the caller answers 503.
+
+New hashes use BCRYPT_ROUNDS. A hash made with another cost is rehashed in
+the background after the next successful login.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import bcrypt
+from config import Config
+import metrics
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+
+_workers = Config.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+_executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='bcrypt')
+# Running plus waiting jobs
+_slots = threading.BoundedSemaphore(_workers + Config.PASSWORD_HASH_QUEUE)
+
+
+def _submit(fn, *args):
+    if not _slots.acquire(blocking=False):
+        metrics.incr('passwords.rejected')
+        raise PasswordHasherBusy()
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def _run(name, fn, *args):
+    """Run fn on the pool and wait for it, timing the whole wait."""
+    start = time.perf_counter()
+    future = _submit(fn, *args)
+    try:
+        return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        metrics.incr('passwords.timeouts')
+        raise PasswordHasherBusy()
+    finally:
+        metrics.observe(name, time.perf_counter() - start)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password):
+    """bcrypt hash of a password at the configured cost."""
+    return _run('passwords.hash', _hash, password, Config.BCRYPT_ROUNDS)
+
+
+def check_password(password, password_hash):
+    """True if the password matches the stored hash."""
+    return _run('passwords.check', _check, password, password_hash)
+
+
+def hash_cost(password_hash):
+    """Cost factor of a '$2b$12$...' hash (None if it cannot be read)."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != Config.BCRYPT_ROUNDS
+
+
+def schedule_rehash(password, old_hash, save):
+    """
+    Rehash at the configured cost in the background, then call save(new_hash, old_hash).
+    Skipped silently when the pool is busy; the next login tries again.
+    """
+    def rehash():
+        try:
+            save(_hash(password, Config.BCRYPT_ROUNDS), old_hash)
+            metrics.incr('passwords.rehashed')
+        except Exception as e:
+            print(f"Password rehash failed: {e}")
+
+    try:
+        _submit(rehash)
+    except PasswordHasherBusy:
+        pass
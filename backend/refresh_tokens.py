@@ -0,0 +1,99 @@
+"""
+Rotating refresh tokens.
+
+Login and signup hand out an opaque refresh token next to the short-lived
+access token. Only its SHA-256 is stored. Each use of a refresh token
+returns a new one from the same family and marks the old one used. If a used
+token is presented again, the token was copied, so the whole family is
+revoked. Expired tokens are removed by a TTL index on expires_at.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import Config
+from models import refresh_tokens_collection
+import metrics
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(user_id, family_id=None):
+    """
+    Create and store a refresh token.
+
+    Args:
+        user_id: The token's user
+        family_id: Family to continue when rotating (None starts a new login session)
+
+    Returns:
+        str: The token to give to the client (never stored in clear)
+    """
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    refresh_tokens_collection.insert_one({
+        '_id': _digest(token),
+        'user_id': ObjectId(user_id),
+        'family_id': family_id or secrets.token_hex(12),
+        'created_at': now,
+        'expires_at': now + timedelta(days=Config.REFRESH_TOKEN_DAYS),
+        'used_at': None,
+    })
+    return token
+
+
+def rotate_refresh_token(token):
+    """
+    Spend a refresh token and issue its successor.
+
+    Returns:
+        tuple or None: (user_id, new_token), or None if the token is unknown,
+                       expired or already used (which revokes its family)
+    """
+    if not token or not isinstance(token, str):
+        return None
+    digest = _digest(token)
+    now = datetime.now(timezone.utc)
+    # Atomic, so two concurrent refreshes cannot both succeed
+    record = refresh_tokens_collection.find_one_and_update(
+        {'_id': digest, 'used_at': None},
+        {'$set': {'used_at': now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if record is None:
+        reused = refresh_tokens_collection.find_one({'_id': digest})
+        if reused is not None:
+            metrics.incr('refresh_tokens.reuse_detected')
+            revoke_family(reused['family_id'])
+        return None
+
+    expires_at = record['expires_at']
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at <= now:
+        return None
+
+    metrics.incr('refresh_tokens.rotated')
+    user_id = str(record['user_id'])
+    return user_id, issue_refresh_token(user_id, record['family_id'])
+
+
+def revoke_family(family_id):
+    refresh_tokens_collection.delete_many({'family_id': family_id})
+
+
+def revoke_refresh_token(token):
+    """Log out the session a refresh token belongs to."""
+    if not token or not isinstance(token, str):
+        return
+    record = refresh_tokens_collection.find_one({'_id': _digest(token)}, {'family_id': 1})
+    if record is not None:
+        revoke_family(record['family_id'])
+
+
+def revoke_user_refresh_tokens(user_id):
+    """Log a user out everywhere."""
+    refresh_tokens_collection.delete_many({'user_id': ObjectId(user_id)})
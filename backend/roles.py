@@ -0,0 +1,120 @@
+"""
+Role claims and the admin guard.
+
+Access tokens carry the user's role as a 'role' claim, so checking for an
+admin needs no database lookup. A token stays valid until it expires, so
+demoting or deleting an admin records a revocation (kept for one access-token
+lifetime by a TTL index). Each worker caches the revoked user ids and reloads
+them at most every ROLE_REVOCATION_TTL seconds. A failed load is retried on
+the next check, and until one load has worked admin claims are checked
+against the user's role in the database instead of being trusted.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
+from pymongo.errors import PyMongoError
+from config import Config
+from models import find_user_by_id, role_revocations_collection
+import metrics
+
+ADMIN = 'admin'
+
+_revoked = frozenset()
+_revoked_loaded_at = None
+_reload_lock = threading.Lock()
+
+
+def create_user_token(user_id, role):
+    """Access token for a user, with the role embedded as a claim."""
+    return create_access_token(identity=str(user_id), additional_claims={'role': role or 'user'})
+
+
+def _revoked_user_ids():
+    """
+    Cached set of users whose admin tokens must no longer be trusted, or None
+    if it has never been loaded.
+    """
+    global _revoked, _revoked_loaded_at
+    loaded_at = _revoked_loaded_at
+    if loaded_at is not None and time.monotonic() - loaded_at < Config.ROLE_REVOCATION_TTL:
+        return _revoked
+
+    # One thread reloads; the others keep using the previous set meanwhile
+    if _reload_lock.acquire(blocking=loaded_at is None):
+        try:
+            # Another thread may have loaded it while this one waited
+            if _revoked_loaded_at is loaded_at:
+                _revoked = frozenset(doc['_id'] for doc in role_revocations_collection.find({}, {'_id': 1}))
+                _revoked_loaded_at = time.monotonic()
+                metrics.incr('roles.revocation_reloads')
+        except PyMongoError as e:
+            # Left stale so the next check retries
+            metrics.incr('roles.revocation_load_failures')
+            print(f"Could not load role revocations: {e}")
+        finally:
+            _reload_lock.release()
+    return _revoked if _revoked_loaded_at is not None else None
+
+
+def revoke_admin_role(user_id):
+    """Stop trusting admin claims in tokens already issued to this user."""
+    global _revoked
+    user_id = str(user_id)
+    role_revocations_collection.update_one(
+        {'_id': user_id},
+        {'$set': {'revoked_at': datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    # Effective in this worker right away, in the others after their next reload
+    _revoked = _revoked | {user_id}
+
+
+def restore_admin_role(user_id):
+    global _revoked
+    user_id = str(user_id)
+    role_revocations_collection.delete_one({'_id': user_id})
+    _revoked = _revoked - {user_id}
+
+
+def _stored_role(user_id):
+    user = find_user_by_id(user_id)
+    return user.get('role') if user else None
+
+
+def is_admin():
+    """
+    Whether the current request's user is an admin. Must run after the JWT has
+    been verified. Tokens issued before role claims existed fall back to a
+    database lookup, as do admin claims while the revocations cannot be loaded.
+    """
+    user_id = get_jwt_identity()
+    role = get_jwt().get('role')
+    if role is None:
+        metrics.incr('roles.legacy_token_lookups')
+        return _stored_role(user_id) == ADMIN
+    if role != ADMIN:
+        return False
+    revoked = _revoked_user_ids()
+    if revoked is None:
+        metrics.incr('roles.unloaded_revocation_lookups')
+        return _stored_role(user_id) == ADMIN
+    return user_id not in revoked
+
+
+def admin_required(fn):
+    """Route decorator: a valid JWT whose user is an admin, else 401/403 (503 if that cannot be checked)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        try:
+            admin = is_admin()
+        except PyMongoError as e:
+            print(f"Could not check admin role: {e}")
+            return jsonify({'error': 'Server is busy, please try again in a moment'}), 503, {'Retry-After': '1'}
+        if not admin:
+            return jsonify({'error': 'Unauthorized'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
@@ -1,50 +1,102 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import get_all_schemes, get_scheme_by_id, find_user_by_id, create_scheme, get_marquee_settings, get_recent_schemes
-from eligibility import check_eligibility
+from models import (
+    create_scheme, get_scheme_by_id, get_marquee_settings,
+    build_scheme_projection, project_scheme, SCHEME_FIELDS, SUPPORTED_LANGUAGES,
+    schemes_collection,
+)
+from pagination import paged_listing
+from catalog import bump_catalog_revision, get_catalog
+from http_cache import make_etag, cached_json
+from eligibility_store import get_user_eligible_schemes
+from user_index import schedule_scheme_fanout
 
 schemes_bp = Blueprint('schemes', __name__)
 
+def parse_projection_args():
+    """
+    Read ?fields= (comma separated) and ?lang= from the query string.
+
+    Returns:
+        tuple: (fields, lang, error) - fields is a sorted tuple or None, lang a
+               language code or None; error is a message for a 400 response
+    """
+    fields = None
+    raw_fields = request.args.get('fields')
+    if raw_fields is not None:
+        names = {name.strip() for name in raw_fields.split(',') if name.strip()}
+        names.discard('_id')  # always returned
+        unknown = sorted(names.difference(SCHEME_FIELDS))
+        if unknown:
+            return None, None, f"Unknown field(s): {', '.join(unknown)}"
+        fields = tuple(sorted(names)) or ('_id',)
+
+    lang = request.args.get('lang')
+    if lang is not None:
+        lang = lang.strip().lower()
+        if lang not in SUPPORTED_LANGUAGES:
+            return None, None, f"Unsupported language: {lang}"
+
+    return fields, lang, None
+
 @schemes_bp.route('/', methods=['GET'])
 def get_schemes():
-    schemes = get_all_schemes()
-    return jsonify(schemes), 200
+    fields, lang, error = parse_projection_args()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Pages and streams read straight from Mongo with the projection pushed down
+    page = paged_listing(schemes_collection, projection=build_scheme_projection(fields, lang))
+    if page is not None:
+        return page
+    
+    snapshot = get_catalog()
+    projection = build_scheme_projection(fields, lang)
+    return cached_json(
+        lambda: list(snapshot.projected(projection)),
+        make_etag(snapshot.digest, fields, lang),
+    )
 
 @schemes_bp.route('/eligible', methods=['GET'])
 @jwt_required()
 def get_eligible_schemes():
+    fields, lang, error = parse_projection_args()
+    if error:
+        return jsonify({'error': error}), 400
+
     user_id = get_jwt_identity()
-    user = find_user_by_id(user_id)
+    eligible = get_user_eligible_schemes(user_id)
     
-    if not user:
+    if eligible is None:
         return jsonify({'error': 'User not found'}), 404
     
-    user_profile = user.get('profile', {})
-    all_schemes = get_all_schemes()
-    
-    eligible_schemes = []
-    for scheme in all_schemes:
-        is_eligible, reason = check_eligibility(user_profile, scheme)
-        if is_eligible:
-            eligible_schemes.append(scheme)
+    # Eligibility needs the full scheme; narrow only what is sent back
+    projection = build_scheme_projection(fields, lang)
+    eligible_schemes = [project_scheme(scheme, projection) for scheme, reason in eligible]
     
     return jsonify(eligible_schemes), 200
 
 @schemes_bp.route('/<scheme_id>', methods=['GET'])
 def get_scheme(scheme_id):
-    scheme = get_scheme_by_id(scheme_id)
+    snapshot = get_catalog()
+    digest = snapshot.scheme_digest(scheme_id)
     
-    if not scheme:
-        return jsonify({'error': 'Scheme not found'}), 404
+    if digest is None:
+        # Possibly created in another worker since this one loaded the catalog;
+        # served without an ETag until the snapshot catches up
+        scheme = get_scheme_by_id(scheme_id)
+        if not scheme:
+            return jsonify({'error': 'Scheme not found'}), 404
+        return jsonify(scheme), 200
     
-    return jsonify(scheme), 200
+    return cached_json(lambda: snapshot.by_id[scheme_id], make_etag(digest))
 
 @schemes_bp.route('/marquee-data', methods=['GET'])
 def get_marquee_data():
     settings = get_marquee_settings()
     
     if not settings.get('is_active', True):
-        return jsonify({'is_active': False}), 200
+        return cached_json(lambda: {'is_active': False}, make_etag('inactive'))
     
     result = {
         'is_active': True,
@@ -53,15 +105,22 @@ def get_marquee_data():
         'schemes': []
     }
     
+    snapshot = get_catalog()
     if settings.get('show_new_schemes', True):
-        recent = get_recent_schemes(5)
-        result['schemes'] = recent
+        result['schemes'] = list(snapshot.recent[:5])
     
-    return jsonify(result), 200
+    # The tag covers the settings and the content of every scheme shown
+    etag = make_etag(
+        result['custom_message'], result['show_new_schemes'],
+        *(snapshot.scheme_digest(scheme['_id']) for scheme in result['schemes'])
+    )
+    return cached_json(lambda: result, etag)
 
 
 @schemes_bp.route('/', methods=['POST'])
 def create_new_scheme():
     data = request.json
     scheme_id = create_scheme(data)
+    bump_catalog_revision(scheme_id)
+    schedule_scheme_fanout(scheme_id, data)
     return jsonify({'message': 'Scheme created', 'id': str(scheme_id)}), 201
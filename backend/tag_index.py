@@ -0,0 +1,121 @@
+"""
+Tag vocabulary index used for tag-based eligibility matching.
+
+Every scheme tag is matched once against the attribute strings a profile can
+produce (get_user_attributes): exact and substring matches, fuzzy neighbours
+and a small synonym table. The result is kept as attribute -> set of tags, so
+checking a profile against a scheme's tags is a set intersection.
+"""
+import threading
+from normalization import alias_key, fuzzy_match
+
+TAG_MATCH_THRESHOLD = 0.7
+
+# Attribute strings get_user_attributes adds regardless of free-text profile fields
+FIXED_ATTRIBUTES = (
+    'student', 'education', 'higher education', 'school',
+    'disability', 'disabled', 'handicapped', 'pwd',
+    'women', 'woman', 'girl', 'female', 'men', 'man', 'boy', 'male',
+    'child', 'minor', 'youth', 'young', 'senior', 'elderly', 'pension',
+)
+
+# Terms in one group match each other even when they share no letters
+SYNONYM_GROUPS = [
+    ['disability', 'disabled', 'handicapped', 'pwd', 'divyang', 'differently abled',
+     'persons with disabilities', 'specially abled'],
+    ['women', 'woman', 'female', 'girl', 'girls', 'mahila', 'ladies'],
+    ['men', 'man', 'male', 'boy', 'boys'],
+    ['senior', 'senior citizen', 'senior citizens', 'elderly', 'old age', 'aged'],
+    ['child', 'children', 'kids', 'minor'],
+    ['youth', 'young', 'yuva'],
+    ['student', 'students', 'vidyarthi'],
+    ['rural', 'village', 'gramin'],
+    ['urban', 'city', 'town'],
+    ['sc', 'scheduled caste', 'scheduled castes', 'dalit'],
+    ['st', 'scheduled tribe', 'scheduled tribes', 'tribal', 'adivasi'],
+    ['obc', 'other backward class', 'other backward classes', 'backward class'],
+]
+_SYNONYM_GROUP = {
+    alias_key(term): group for group, terms in enumerate(SYNONYM_GROUPS) for term in terms
+}
+
+# Free-text attributes (category, education, area) memoized beyond the fixed set
+MAX_DYNAMIC_ATTRIBUTES = 4096
+
+
+def tag_matches_attribute(tag, attr):
+    """
+    Decide whether a lowercased tag matches one user attribute.
+
+    Args:
+        tag: Tag after normalize_text
+        attr: Attribute string from get_user_attributes
+
+    Returns:
+        bool: True on a fuzzy match, a substring match either way, or a shared synonym group
+    """
+    if fuzzy_match(tag, attr, threshold=TAG_MATCH_THRESHOLD):
+        return True
+    # Also check if tag contains attribute or vice versa
+    if tag in attr or attr in tag:
+        return True
+    group = _SYNONYM_GROUP.get(alias_key(tag))
+    return group is not None and group == _SYNONYM_GROUP.get(alias_key(attr))
+
+
+class TagIndex:
+    """
+    Attribute -> matching tags lookup over every tag seen in the catalog.
+
+    Tags are added when schemes are compiled; each new tag is matched against
+    every known attribute right away. Attributes outside FIXED_ATTRIBUTES are
+    matched against the whole vocabulary the first time a profile uses them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tags = set()
+        self._attr_tags = {attr: frozenset() for attr in FIXED_ATTRIBUTES}
+        self.version = 0
+
+    def __len__(self):
+        return len(self._tags)
+
+    def add_tags(self, tags):
+        """Register normalized tags, computing their attribute neighbours once."""
+        new_tags = [tag for tag in tags if tag not in self._tags]
+        if not new_tags:
+            return
+        with self._lock:
+            new_tags = [tag for tag in set(new_tags) if tag not in self._tags]
+            if not new_tags:
+                return
+            for attr, matched in list(self._attr_tags.items()):
+                extra = [tag for tag in new_tags if tag_matches_attribute(tag, attr)]
+                if extra:
+                    self._attr_tags[attr] = matched.union(extra)
+            self._tags.update(new_tags)
+            self.version += 1
+
+    def tags_for_attribute(self, attr):
+        """Frozenset of vocabulary tags that match one attribute."""
+        matched = self._attr_tags.get(attr)
+        if matched is not None:
+            return matched
+
+        with self._lock:
+            matched = frozenset(tag for tag in self._tags if tag_matches_attribute(tag, attr))
+            if len(self._attr_tags) < len(FIXED_ATTRIBUTES) + MAX_DYNAMIC_ATTRIBUTES:
+                self._attr_tags[attr] = matched
+        return matched
+
+    def tags_for_attributes(self, attributes):
+        """Union of vocabulary tags matching any of the attributes."""
+        matched = set()
+        for attr in attributes:
+            matched |= self.tags_for_attribute(attr)
+        return frozenset(matched)
+
+
+# Shared index for the whole process
+TAG_INDEX = TagIndex()
@@ -0,0 +1,65 @@
+"""
+Test setup: an in-memory MongoDB (mongomock), the Flask test client and, for
+chat tests, benchmarks/fake_gemini.py standing in for the Gemini API.
+
+Collections are emptied before every test, and the catalog snapshot is
+marked stale so each test reads its own schemes.
+"""
+import os
+import sys
+
+import mongomock
+import pymongo
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, 'benchmarks'))
+
+# Before anything imports config or models
+os.environ['GEMINI_API_KEY'] = ''
+os.environ['JWT_SECRET'] = 'test-secret-key-that-is-long-enough-for-hs256'
+pymongo.MongoClient = mongomock.MongoClient
+
+import genai_client  # noqa: E402
+import models  # noqa: E402
+from catalog import bump_catalog_revision  # noqa: E402
+from config import Config  # noqa: E402
+from fake_gemini import FakeGemini  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    for name in models.db.list_collection_names():
+        models.db[name].delete_many({})
+    bump_catalog_revision()
+    yield
+
+
+@pytest.fixture
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """
+    A FakeGemini server the chat is pointed at, with a fresh Gemini client and
+    a closed circuit. Tests change its script, latency or error_rate as needed.
+    """
+    fake = FakeGemini(seed=1).start()
+    monkeypatch.setattr(Config, 'GEMINI_API_KEY', 'test')
+    monkeypatch.setattr(Config, 'GEMINI_BASE_URL', fake.url)
+    monkeypatch.setattr(genai_client, '_client', None)
+    breaker = genai_client.gemini_breaker
+    for name, value in [('_state', 'closed'), ('_bad_calls', 0), ('_opened_at', 0.0), ('_trial_started', None)]:
+        monkeypatch.setattr(breaker, name, value)
+    yield fake
+    fake.stop()
@@ -0,0 +1,123 @@
+"""
+/chat/message and /chat/stream against benchmarks/fake_gemini.py: the model
+loop, the local fallback and the Gemini circuit breaker.
+"""
+import json
+
+import pytest
+
+from chat import LOCAL_REPLY_NOTE
+from config import Config
+from genai_client import gemini_breaker
+from models import schemes_collection
+
+# Not something the intent router answers, so every message reaches the model
+MESSAGE = 'Is there any scholarship for farmers who want to study further?'
+
+
+@pytest.fixture(autouse=True)
+def schemes(monkeypatch):
+    monkeypatch.setattr(Config, 'CHAT_CACHE_TTL', 0)
+    schemes_collection.insert_many([
+        {'scheme_name': {'en': 'Farmer Scholarship'}, 'category': 'Education', 'tags': ['farmer', 'scholarship'],
+         'benefits': {'en': 'Fees paid'}, 'description': {'en': 'Scholarship for children of farmers'}},
+        {'scheme_name': {'en': 'Crop Insurance'}, 'category': 'Agriculture', 'tags': ['farmer'],
+         'benefits': {'en': 'Insurance'}, 'description': {'en': 'Insurance for farmers against crop loss'}},
+    ])
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """The Gemini breaker, opening after two bad calls and staying open for the test."""
+    monkeypatch.setattr(gemini_breaker, 'failures', 2)
+    monkeypatch.setattr(gemini_breaker, 'cooldown', 60)
+    return gemini_breaker
+
+
+def send(client, message=MESSAGE):
+    response = client.post('/chat/message', json={'message': message})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def stream(client, message=MESSAGE):
+    """The events of one /chat/stream response, as (event, data) tuples."""
+    response = client.post('/chat/stream', json={'message': message})
+    assert response.status_code == 200
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_model_answers_through_tool_loop(client, fake_gemini, breaker):
+    body = send(client)
+    assert 'Farmer Scholarship' in body['response']
+    assert body['usage']['model_calls'] == 2
+    assert 'local_reply' not in body['usage']
+    assert [entry['round'] for entry in fake_gemini.stats] == [0, 1]
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_message_falls_back_and_opens_circuit(client, fake_gemini, breaker):
+    fake_gemini.error_rate = 1.0
+
+    first = send(client)
+    assert first['usage']['local_reply'] == 'model_error'
+    assert first['response'].startswith(LOCAL_REPLY_NOTE)
+    assert 'Farmer Scholarship' in first['response']
+    assert breaker.stats()['state'] == 'closed'
+
+    assert send(client)['usage']['local_reply'] == 'model_error'
+    stats = breaker.stats()
+    assert stats['state'] == 'open'
+    assert stats['bad_calls_in_a_row'] == 2
+
+    # While open, messages are answered without calling the model at all
+    calls = len(fake_gemini.stats)
+    third = send(client)
+    assert third['usage']['local_reply'] == 'circuit_open'
+    assert 'Farmer Scholarship' in third['response']
+    assert len(fake_gemini.stats) == calls
+    assert breaker.stats()['rejected'] == stats['rejected'] + 1
+
+
+def test_stream_falls_back_and_opens_circuit(client, fake_gemini, breaker):
+    fake_gemini.error_rate = 1.0
+    for expected in ['model_error', 'model_error', 'circuit_open']:
+        events = stream(client)
+        assert events[0][0] == 'session'
+        event, done = events[-1]
+        assert event == 'done'
+        assert done['usage']['local_reply'] == expected
+        assert done['response'].startswith(LOCAL_REPLY_NOTE)
+        # The reply also arrives as text, after the tool event that clears partial text
+        names = [name for name, _ in events]
+        assert names.index('tool') < names.index('delta')
+    assert breaker.stats()['state'] == 'open'
+
+
+def test_circuit_closes_after_good_trial(client, fake_gemini, breaker, monkeypatch):
+    fake_gemini.error_rate = 1.0
+    send(client)
+    send(client)
+    assert breaker.stats()['state'] == 'open'
+
+    fake_gemini.error_rate = 0.0
+    monkeypatch.setattr(breaker, 'cooldown', 0)
+    body = send(client)
+    assert 'local_reply' not in body['usage']
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_slow_stream_is_judged_by_its_first_chunk(client, fake_gemini, breaker, monkeypatch):
+    # Each model call's first chunk comes at once, the whole stream takes longer
+    monkeypatch.setattr(breaker, 'slow_seconds', 0.3)
+    fake_gemini.chunk_delay = 100
+    for _ in range(3):
+        _, done = stream(client)[-1]
+        assert 'local_reply' not in done['usage']
+    assert max(entry['response_bytes'] for entry in fake_gemini.stats) > 0
+    assert breaker.stats()['state'] == 'closed'
+    assert breaker.stats()['bad_calls_in_a_row'] == 0
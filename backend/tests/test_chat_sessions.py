@@ -0,0 +1,109 @@
+"""Chat session compaction (chat_sessions.py) and the savings reported per turn."""
+import threading
+import time
+
+import pytest
+
+import chat_sessions
+from chat_sessions import append_turns, compact_session, create_session, load_session
+from config import Config
+
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    monkeypatch.setattr(Config, 'CHAT_HISTORY_TOKEN_BUDGET', 50)
+    monkeypatch.setattr(Config, 'CHAT_KEEP_RECENT_TURNS', 2)
+
+
+class SummarizerCalls:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = self.running = self.most_running = 0
+        self.started, self.release = threading.Event(), threading.Event()
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    """A summarizer that blocks until released and records how many calls overlap."""
+    state = SummarizerCalls()
+
+    def summarize(summary, turns):
+        with state.lock:
+            state.calls += 1
+            state.running += 1
+            state.most_running = max(state.most_running, state.running)
+        state.started.set()
+        state.release.wait(5)
+        with state.lock:
+            state.running -= 1
+        return f"summary of {len(turns)} turns"
+
+    monkeypatch.setattr(chat_sessions, '_summarizer', summarize)
+    return state
+
+
+def wait_for_compactions():
+    for _ in range(500):
+        if not chat_sessions._compacting:
+            return
+        time.sleep(0.01)
+    raise AssertionError('compaction did not finish')
+
+
+def long_text(i):
+    return f"message {i} " + 'word ' * 20
+
+
+def test_one_compaction_per_session_at_a_time(small_budget, summarizer):
+    session = create_session()
+    for i in range(6):
+        append_turns(session, long_text(i), long_text(i))
+    assert summarizer.started.wait(5)
+    summarizer.release.set()
+    wait_for_compactions()
+    assert summarizer.most_running == 1
+    assert summarizer.calls == 1
+
+
+def test_turns_added_during_compaction_are_kept(small_budget, summarizer):
+    session = create_session([{'role': 'user', 'text': long_text(i)} for i in range(4)])
+    append_turns(session, long_text(4), long_text(5))
+    assert summarizer.started.wait(5)
+    # Added while the summary is being written
+    append_turns(session, 'late question', 'late answer')
+    summarizer.release.set()
+    wait_for_compactions()
+
+    stored = load_session(session['_id'])
+    assert stored['summary'] == 'summary of 4 turns'
+    assert [t['text'] for t in stored['turns']] == [long_text(4), long_text(5), 'late question', 'late answer']
+    assert stored['compactions'] == 1
+
+
+def test_compaction_gives_up_when_summarized_turns_changed(small_budget, monkeypatch):
+    monkeypatch.setattr(chat_sessions, '_summarizer', None)
+    session = create_session([{'role': 'user', 'text': long_text(i)} for i in range(4)])
+    # Another compaction already replaced the turns this one would summarize
+    chat_sessions.chat_sessions_collection.update_one(
+        {'_id': session['_id']}, {'$set': {'summary': 'other', 'turns': []}, '$inc': {'version': 1}})
+    assert not compact_session(session)
+    assert load_session(session['_id'])['summary'] == 'other'
+
+
+def test_usage_reports_compaction_savings(client, fake_gemini, small_budget, monkeypatch):
+    monkeypatch.setattr(chat_sessions, '_summarizer', lambda summary, turns: 'short summary')
+    fake_gemini.script = [{'text': 'A fairly long answer from the model ' * 5}]
+    session_id = None
+    for i in range(4):
+        body = client.post('/chat/message', json={
+            'message': f'Tell me more about scheme number {i} please', 'session_id': session_id,
+        }).get_json()
+        session_id = body['session_id']
+        wait_for_compactions()
+
+    usage = body['usage']
+    assert usage['compactions'] >= 1
+    assert usage['history_tokens'] < usage['uncompacted_history_tokens']
+    assert usage['history_bytes'] < usage['uncompacted_history_bytes']
+    assert usage['compaction_saved_tokens'] == usage['uncompacted_history_tokens'] - usage['history_tokens']
+    assert usage['compaction_saved_bytes'] == usage['uncompacted_history_bytes'] - usage['history_bytes']
@@ -0,0 +1,120 @@
+"""CircuitBreaker state machine (closed -> open -> half-open), on a controlled clock."""
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker('test', failures=3, slow_seconds=2.0, cooldown=10.0)
+
+
+def test_opens_after_failures_in_a_row(breaker):
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(0.1, ok=False)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    breaker.record(0.1, ok=False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['bad_calls_in_a_row'] == 3
+
+
+def test_good_call_resets_the_count(breaker):
+    for ok in [False, False, True, False, False]:
+        assert breaker.allow()
+        breaker.record(0.1, ok=ok)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['bad_calls_in_a_row'] == 2
+
+
+def test_slow_calls_count_as_bad(breaker):
+    for elapsed in [2.5, 3.0, 2.1]:
+        assert breaker.allow()
+        breaker.record(elapsed)
+    assert breaker.state == OPEN
+
+
+def test_half_open_after_cooldown_allows_one_trial(breaker, clock):
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(0.1, ok=False)
+    clock.now += 9.9
+    assert not breaker.allow()
+    assert breaker.stats()['retry_in_seconds'] == pytest.approx(0.1)
+
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial at a time
+    assert not breaker.allow()
+
+
+def test_good_trial_closes(breaker, clock):
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(0.1, ok=False)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(0.5)
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_bad_trial_reopens_for_another_cooldown(breaker, clock):
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(0.1, ok=False)
+    clock.now += 10
+    assert breaker.allow()
+    clock.now += 1
+    breaker.record(1.0, ok=False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    clock.now += 9.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+
+
+def test_lost_trial_is_given_up_after_a_cooldown(breaker, clock):
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(0.1, ok=False)
+    clock.now += 10
+    assert breaker.allow()
+    # The trial never reports back
+    clock.now += 5
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.allow()
+
+
+def test_stats_count_openings_and_rejections(breaker):
+    before = breaker.stats()
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(0.1, ok=False)
+    breaker.allow()
+    breaker.allow()
+    after = breaker.stats()
+    assert after['state'] == OPEN
+    assert after['opened'] == before['opened'] + 1
+    assert after['rejected'] == before['rejected'] + 2
@@ -0,0 +1,170 @@
+"""
+The fast eligibility paths (compiled rules, the NumPy catalog engine and its
+memo of results by profile signature) must give the same verdicts and
+reasons as check_eligibility, which compiles the scheme afresh on every call.
+"""
+import random
+
+import pytest
+
+import eligibility
+import eligibility_engine
+import metrics
+from config import Config
+from eligibility import check_eligibility, invalidate_compiled_catalog
+
+STATES = ['Maharashtra', 'maharashtra ', 'Maharastra', 'Delhi', 'Karnataka', 'Goa', 'Village', 'MH', '', None,
+          'Tamil Nadu']
+CATEGORIES = ['SC', 'ST', 'OBC', 'General', 'sc', 'Gen', None, '', 'obc ']
+EDUCATION = ['Graduate', 'Post-Graduate', '12th', '10th', 'Ph.D', 'PhD', '9th', None, '', 'Diploma']
+TAGS = ['scholarship', 'sc', 'women', 'farmer', 'urban', 'youth', '', 'senior citizens', 'education', 'Disabled']
+
+
+def random_profile(rng):
+    profile = {}
+    if rng.random() < 0.9:
+        profile['age'] = rng.choice([5, 15, 17, 18, 22, 30, 35, 40, 60, 65, '22', 'abc', 0, None, '', 45.5])
+    for key, values in [
+        ('state', STATES), ('category', CATEGORIES), ('education', EDUCATION),
+        ('gender', ['male', 'female', 'Male', 'other', '']), ('student', ['yes', 'no', None]),
+        ('disability', ['yes', 'no', None]), ('area', ['Urban', 'Rural', None, 'rural ']),
+    ]:
+        if rng.random() < 0.85:
+            profile[key] = rng.choice(values)
+    return profile
+
+
+def random_scheme(rng, i):
+    return {
+        '_id': 'scheme%d' % i,
+        'min_age': rng.choice([None, 0, 16, 18, 21]),
+        'max_age': rng.choice([None, 30, 35, 60]),
+        'states': rng.sample(STATES[:8] + ['', None], rng.randint(0, 3)),
+        'eligible_categories': rng.sample(CATEGORIES[:6], rng.randint(0, 2)),
+        'education_required': rng.sample(EDUCATION[:7], rng.randint(0, 3)),
+        'disability_supported': rng.choice([[], ['Physical']]),
+        'student_required': rng.choice([True, False, None]),
+        'tags': rng.sample(TAGS, rng.randint(0, 3)),
+    }
+
+
+def outcome(fn, *args):
+    """A call's result, or the type of the exception it raised."""
+    try:
+        return fn(*args)
+    except Exception as e:
+        return type(e)
+
+
+def expected_eligible(profile, schemes):
+    """(scheme _id, reason) for every scheme check_eligibility passes, or the exception type."""
+    expected = []
+    for scheme in schemes:
+        result = outcome(check_eligibility, profile, scheme)
+        if isinstance(result, type):
+            return result
+        if result[0]:
+            expected.append((scheme['_id'], result[1]))
+    return expected
+
+
+def as_ids(result):
+    return result if isinstance(result, type) else [(scheme['_id'], reason) for scheme, reason in result]
+
+
+@pytest.fixture
+def catalog():
+    rng = random.Random(1)
+    invalidate_compiled_catalog()
+    return [random_scheme(rng, i) for i in range(150)]
+
+
+def test_compiled_catalog_matches_check_eligibility(catalog):
+    rng = random.Random(2)
+    for _ in range(400):
+        profile = random_profile(rng)
+        assert as_ids(outcome(eligibility.filter_eligible_schemes, profile, catalog)) == \
+            expected_eligible(profile, catalog), profile
+
+
+def test_compiled_scheme_follows_scheme_edits(catalog):
+    rng = random.Random(3)
+    profiles = [random_profile(rng) for _ in range(100)]
+    for profile in profiles:
+        outcome(eligibility.filter_eligible_schemes, profile, catalog)
+
+    # An edited scheme arrives as a new dict with the same _id and is recompiled
+    edited = [dict(random_scheme(rng, i), _id=scheme['_id']) if i % 3 == 0 else scheme
+              for i, scheme in enumerate(catalog)]
+    for profile in profiles:
+        assert as_ids(outcome(eligibility.filter_eligible_schemes, profile, edited)) == \
+            expected_eligible(profile, edited), profile
+
+
+def test_empty_profile_is_never_eligible(catalog):
+    assert eligibility.filter_eligible_schemes({}, catalog) == []
+    assert check_eligibility({}, catalog[0]) == (False, "Profile not completed")
+
+
+def test_engine_matches_check_eligibility(catalog):
+    rng = random.Random(4)
+    for _ in range(400):
+        profile = random_profile(rng)
+        expected = expected_eligible(profile, catalog)
+        # Profiles check_eligibility raises on are not compared
+        if isinstance(expected, type):
+            continue
+        assert as_ids(eligibility_engine.filter_eligible_schemes(profile, catalog)) == expected, profile
+
+
+def test_engine_explains_every_verdict(catalog):
+    rng = random.Random(5)
+    engine = eligibility_engine.get_engine(catalog)
+    for _ in range(150):
+        profile = random_profile(rng)
+        if isinstance(expected_eligible(profile, catalog), type):
+            continue
+        eligible, codes, facts = engine.evaluate(profile)
+        for i, scheme in enumerate(catalog):
+            assert (bool(eligible[i]), engine.explain(i, int(codes[i]), facts)) == \
+                check_eligibility(profile, scheme), (profile, scheme)
+
+
+def test_memoized_results_match_check_eligibility(catalog):
+    rng = random.Random(6)
+    # Few distinct profiles, each seen many times with fields the rules ignore changed
+    pool = [random_profile(rng) for _ in range(40)]
+    hits = metrics.get_counter('eligibility_memo.hits')
+    for i in range(600):
+        profile = dict(rng.choice(pool), name='user %d' % i, phone_number=str(i))
+        expected = expected_eligible(profile, catalog)
+        if isinstance(expected, type):
+            continue
+        assert as_ids(eligibility_engine.filter_eligible_schemes(profile, catalog)) == expected, profile
+    assert metrics.get_counter('eligibility_memo.hits') > hits
+
+
+def test_profiles_sharing_a_signature_share_a_verdict(catalog):
+    engine = eligibility_engine.get_engine(catalog)
+    rng = random.Random(7)
+    for _ in range(300):
+        profile = random_profile(rng)
+        if not isinstance(profile.get('age'), int) or isinstance(expected_eligible(profile, catalog), type):
+            continue
+        older = dict(profile, age=profile['age'] + 1)
+        if isinstance(expected_eligible(older, catalog), type):
+            continue
+        same_signature = engine.signature(eligibility.ProfileFacts(profile)) == \
+            engine.signature(eligibility.ProfileFacts(older))
+        if same_signature:
+            assert engine.eligible_indices(profile) == engine.eligible_indices(older), (profile, older)
+        assert as_ids(eligibility_engine.filter_eligible_schemes(older, catalog)) == \
+            expected_eligible(older, catalog), older
+
+
+def test_memo_is_bounded(catalog, monkeypatch):
+    monkeypatch.setattr(Config, 'ELIGIBILITY_MEMO_SIZE', 10)
+    engine = eligibility_engine.get_engine(catalog)
+    for age in range(18, 80):
+        engine.eligible_indices({'age': age, 'state': 'Goa', 'category': 'SC', 'gender': 'female'})
+    assert len(engine._eligible_memo) <= 10
@@ -0,0 +1,168 @@
+"""
+Materialized eligible-scheme lists (eligibility_store.py): the scheme fan-out
+and the catalog checks on read must leave every stored list equal to what
+filter_eligible_schemes gives against the current catalog.
+"""
+import itertools
+
+import pytest
+from bson import ObjectId
+
+import catalog
+import user_index
+from config import Config
+from eligibility_engine import filter_eligible_schemes
+from eligibility_store import get_user_eligible_schemes, refresh_user_eligibility
+from models import create_user, schemes_collection, site_settings_collection, \
+    user_eligibility_collection, users_collection
+
+PROFILES = [
+    {'age': 21, 'state': 'Maharashtra', 'category': 'SC', 'education': 'Graduate', 'student': 'yes'},
+    {'age': 45, 'state': 'Delhi', 'category': 'General', 'education': '12th', 'student': 'no'},
+    {'age': 17, 'state': 'Karnataka', 'category': 'OBC', 'education': '10th', 'student': 'yes'},
+    {'age': 66, 'state': 'Goa', 'category': 'ST', 'gender': 'female', 'area': 'Rural'},
+    {'age': 30, 'state': 'maharashtra ', 'category': 'sc', 'disability': 'yes'},
+    {'age': 25, 'state': 'Tamil Nadu', 'category': 'OBC', 'education': 'Post-Graduate', 'gender': 'female'},
+    {},
+]
+
+SCHEMES = [
+    {'scheme_name': {'en': 'Scholarship'}, 'min_age': 16, 'max_age': 30,
+     'states': ['Maharashtra', 'Delhi'], 'eligible_categories': ['SC', 'ST'], 'tags': ['scholarship', 'sc']},
+    {'scheme_name': {'en': 'Pension'}, 'min_age': 60, 'tags': ['senior citizens']},
+    {'scheme_name': {'en': 'Women'}, 'states': [], 'tags': ['women'], 'eligible_categories': ['OBC', 'ST']},
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_snapshot(monkeypatch):
+    monkeypatch.setattr(user_index, '_current', (None, {}))
+
+
+@pytest.fixture
+def users():
+    schemes_collection.insert_many([dict(scheme) for scheme in SCHEMES])
+    catalog.bump_catalog_revision()
+    user_ids = [str(create_user(None, '90000000%02d' % i, 'hash', profile=dict(profile)))
+                for i, profile in enumerate(PROFILES)]
+    for user_id, profile in zip(user_ids, PROFILES):
+        refresh_user_eligibility(user_id, profile)
+    return user_ids
+
+
+def expected(user_id):
+    """scheme_id -> reason that filter_eligible_schemes gives now."""
+    profile = users_collection.find_one({'_id': ObjectId(user_id)})['profile']
+    schemes = list(catalog.get_current_catalog().schemes)
+    return {scheme['_id']: reason for scheme, reason in filter_eligible_schemes(profile, schemes)}
+
+
+def stored(user_id):
+    doc = user_eligibility_collection.find_one({'_id': ObjectId(user_id)})
+    return {entry['scheme_id']: entry['reason'] for entry in doc['schemes']}
+
+
+def write_scheme(scheme_id, scheme):
+    """What the admin routes do after a scheme write, with the fan-out run inline."""
+    catalog.bump_catalog_revision(scheme_id)
+    user_index._run_fanout(str(scheme_id), scheme)
+
+
+def assert_lists_current(user_ids):
+    for user_id in user_ids:
+        assert stored(user_id) == expected(user_id), user_id
+
+
+def test_fanout_adds_created_scheme(users):
+    scheme = {'scheme_name': {'en': 'Youth'}, 'min_age': 18, 'max_age': 35, 'tags': ['youth']}
+    scheme_id = schemes_collection.insert_one(scheme).inserted_id
+    write_scheme(scheme_id, scheme)
+    assert any(str(scheme_id) in stored(user_id) for user_id in users)
+    assert_lists_current(users)
+
+
+@pytest.mark.parametrize('changes', [
+    {'min_age': 40},                                  # drops the young, adds the old
+    {'states': ['Goa', 'Karnataka'], 'eligible_categories': []},
+    {'states': ['Delhi'], 'tags': ['education']},     # turns some 'Eligible' into tag matches
+    {'min_age': None, 'max_age': None, 'states': [], 'eligible_categories': [], 'tags': []},
+])
+def test_fanout_follows_scheme_edits(users, changes):
+    scheme = schemes_collection.find_one({'scheme_name.en': 'Scholarship'})
+    scheme.update(changes)
+    schemes_collection.replace_one({'_id': scheme['_id']}, scheme)
+    write_scheme(scheme['_id'], scheme)
+    assert_lists_current(users)
+
+
+def test_fanout_removes_deleted_scheme(users):
+    scheme = schemes_collection.find_one({'scheme_name.en': 'Women'})
+    assert any(str(scheme['_id']) in stored(user_id) for user_id in users)
+    schemes_collection.delete_one({'_id': scheme['_id']})
+    write_scheme(scheme['_id'], None)
+    assert all(str(scheme['_id']) not in stored(user_id) for user_id in users)
+    assert_lists_current(users)
+
+
+def test_fanout_uses_profiles_changed_after_the_user_snapshot(users):
+    user_index.get_user_snapshot()
+    # Another worker changes two profiles and recomputes their lists; this
+    # worker's user snapshot and overlay know nothing of it
+    aged, moved = users[0], users[3]
+    for user_id, profile in [(aged, dict(PROFILES[0], age=62)), (moved, dict(PROFILES[3], state='Delhi'))]:
+        users_collection.update_one({'_id': ObjectId(user_id)}, {'$set': {'profile': profile}})
+        refresh_user_eligibility(user_id, profile)
+
+    scheme = {'scheme_name': {'en': 'Delhi seniors'}, 'min_age': 60, 'states': ['Delhi']}
+    scheme_id = schemes_collection.insert_one(scheme).inserted_id
+    write_scheme(scheme_id, scheme)
+    assert str(scheme_id) in stored(aged) and str(scheme_id) in stored(moved)
+
+    # The snapshot still has users[0] at 21, eligible for the scholarship
+    scholarship = schemes_collection.find_one({'scheme_name.en': 'Scholarship'})
+    scholarship['tags'] = []
+    schemes_collection.replace_one({'_id': scholarship['_id']}, scholarship)
+    write_scheme(scholarship['_id'], scholarship)
+    assert str(scholarship['_id']) not in stored(aged)
+    assert_lists_current(users)
+
+
+def test_fanout_sequences_keep_lists_current(users):
+    steps = itertools.cycle([{'min_age': 18}, {'tags': ['women', 'sc']}, {'states': ['Goa']}, {'max_age': 20}])
+    for _, changes in zip(range(8), steps):
+        for scheme in list(schemes_collection.find()):
+            scheme.update(changes)
+            schemes_collection.replace_one({'_id': scheme['_id']}, scheme)
+            write_scheme(scheme['_id'], scheme)
+    assert_lists_current(users)
+
+
+def test_read_recomputes_after_scheme_written_by_another_worker(users):
+    user_id = users[0]
+    assert len(get_user_eligible_schemes(user_id)) == len(expected(user_id))
+    catalog.get_catalog()
+
+    # Another worker's write: the scheme and the shared version change, this
+    # worker's revision does not
+    scheme = {'scheme_name': {'en': 'Everyone'}}
+    scheme_id = str(schemes_collection.insert_one(scheme).inserted_id)
+    site_settings_collection.update_one({'type': 'catalog_version'}, {'$inc': {'version': 1}}, upsert=True)
+
+    ids = [s['_id'] for s, _ in get_user_eligible_schemes(user_id)]
+    assert scheme_id in ids
+    assert stored(user_id) == expected(user_id)
+
+    # A profile saved here straight after also sees it
+    refresh_user_eligibility(users[1], PROFILES[1])
+    assert scheme_id in stored(users[1])
+
+
+def test_read_recomputes_after_write_outside_the_app(users, monkeypatch):
+    user_id = users[0]
+    get_user_eligible_schemes(user_id)
+    scheme = {'scheme_name': {'en': 'Everyone'}}
+    scheme_id = str(schemes_collection.insert_one(scheme).inserted_id)
+    # No version bump at all: found once the catalog snapshot expires
+    monkeypatch.setattr(Config, 'CATALOG_TTL', 0)
+    assert scheme_id in [s['_id'] for s, _ in get_user_eligible_schemes(user_id)]
+    assert stored(user_id) == expected(user_id)
@@ -0,0 +1,94 @@
+"""The chat intent router (intent_router.route) and where the chat uses it."""
+from types import SimpleNamespace
+
+import pytest
+
+from intent_router import BY_CATEGORY, BY_ELIGIBILITY, LIST_ALL, route
+from models import schemes_collection
+
+SNAPSHOT = SimpleNamespace(schemes=(
+    {'category': 'Agriculture'}, {'category': 'Housing & Urban'}, {'category': 'Education'},
+))
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('show all schemes', (LIST_ALL, {})),
+    ('what schemes are available', (LIST_ALL, {})),
+    ('agriculture schemes', (BY_CATEGORY, {'category': 'Agriculture'})),
+    ('schemes for housing and urban', (BY_CATEGORY, {'category': 'Housing & Urban'})),
+    ('Education', (BY_CATEGORY, {'category': 'Education'})),
+    ('I am 22, SC, from Maharashtra',
+     (BY_ELIGIBILITY, {'age': 22, 'state': 'Maharashtra', 'category': 'SC'})),
+    ('female student from Delhi aged 19',
+     (BY_ELIGIBILITY, {'age': 19, 'state': 'Delhi', 'is_student': True, 'gender': 'female'})),
+    ('I am 22 general category from Goa', (BY_ELIGIBILITY, {'age': 22, 'state': 'Goa', 'category': 'General'})),
+    ('aged 30 OBC', (BY_ELIGIBILITY, {'age': 30, 'category': 'OBC'})),
+    ('SC Goa', (BY_ELIGIBILITY, {'state': 'Goa', 'category': 'SC'})),
+])
+def test_routed_messages(message, expected):
+    assert route(message, SNAPSHOT) == expected
+
+
+@pytest.mark.parametrize('message, expected', [
+    # 'open' and 'ur' are aliases of General but also ordinary words
+    ('open category 22 from Goa', None),
+    ('I am 22 UR from Goa', None),
+    ('ur 22 Goa', None),
+    ('I am 22 General from Goa', (BY_ELIGIBILITY, {'age': 22, 'state': 'Goa', 'category': 'General'})),
+])
+def test_ambiguous_category_aliases(message, expected):
+    assert route(message, SNAPSHOT) == expected
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('I am 22 from UP', (BY_ELIGIBILITY, {'age': 22, 'state': 'Uttar Pradesh'})),
+    ('I am 22 from AS', (BY_ELIGIBILITY, {'age': 22, 'state': 'Assam'})),
+    ('i am 22 from up', None),
+    ('22 as a student from Delhi', None),
+])
+def test_state_abbreviations_only_in_capitals(message, expected):
+    assert route(message, SNAPSHOT) == expected
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('22 Goa SC', (BY_ELIGIBILITY, {'age': 22, 'state': 'Goa', 'category': 'SC'})),
+    # A bare number in a two-word message is not taken for an age
+    ('22 Goa', None),
+    # More than one number, or one that cannot be an age
+    ('I am 22 and 23', None),
+    ('I am 22 from Goa 2024', None),
+    ('I am 200 years from Goa', None),
+    ('I am 0 from Goa SC', None),
+    # An age alone is too little to go on
+    ('22 years old', None),
+])
+def test_single_number_age_rule(message, expected):
+    assert route(message, SNAPSHOT) == expected
+
+
+@pytest.mark.parametrize('message', [
+    '', 'hello', 'how do I apply', 'Goa', 'SC',
+    'not a student from Delhi aged 19',
+    'I am 22 from Goa and Delhi',
+    'male female 22 Goa',
+    'what documents do I need for agriculture schemes',
+    ' '.join(['scheme'] * 30),
+])
+def test_fall_through(message):
+    assert route(message, SNAPSHOT) is None
+
+
+def test_follow_up_messages_go_to_the_model(client, fake_gemini):
+    schemes_collection.insert_one({'scheme_name': {'en': 'Scholarship'}, 'category': 'Education',
+                                   'states': ['Maharashtra'], 'eligible_categories': ['SC']})
+    opening = client.post('/chat/message', json={'message': 'I am 22 SC from Goa'}).get_json()
+    assert opening['usage']['routed'] == BY_ELIGIBILITY
+    assert not fake_gemini.stats
+
+    # The model asked for details; the reply only makes sense with the earlier turns
+    follow_up = client.post('/chat/message', json={
+        'message': 'SC from Maharashtra', 'session_id': opening['session_id'],
+    }).get_json()
+    assert 'routed' not in follow_up['usage']
+    assert follow_up['usage']['model_calls'] >= 1
+    assert fake_gemini.stats
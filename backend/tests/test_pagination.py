@@ -0,0 +1,111 @@
+"""Keyset pagination and streaming of GET /schemes/."""
+import json
+
+import pytest
+
+from config import Config
+from models import schemes_collection
+from pagination import decode_cursor, encode_cursor
+
+
+def add_schemes(count, start=0):
+    if not count:
+        return
+    schemes_collection.insert_many([
+        {'scheme_name': {'en': 'Scheme %d' % i}, 'category': 'Education'}
+        for i in range(start, start + count)
+    ])
+
+
+def all_ids():
+    return [str(doc['_id']) for doc in schemes_collection.find({}, {'_id': 1}).sort('_id', 1)]
+
+
+def walk(client, limit):
+    """Follow next_cursor from the first page to the last; returns the pages' items."""
+    pages = []
+    cursor = None
+    while True:
+        url = '/schemes/?limit=%d' % limit + ('&cursor=' + cursor if cursor else '')
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append(body['items'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+        assert len(pages) < 100, 'pagination does not terminate'
+
+
+@pytest.mark.parametrize('count, limit', [(0, 5), (1, 5), (4, 5), (5, 5), (6, 5), (10, 5), (7, 1)])
+def test_pages_cover_every_scheme_once(client, count, limit):
+    add_schemes(count)
+    pages = walk(client, limit)
+    ids = [item['_id'] for page in pages for item in page]
+    assert ids == all_ids()
+    # Only the last page may be short, and an exact multiple ends without an empty page
+    assert all(len(page) == limit for page in pages[:-1])
+    assert len(pages) == max(1, -(-count // limit))
+
+
+def test_cursor_after_last_scheme_gives_empty_page(client):
+    add_schemes(3)
+    last = all_ids()[-1]
+    body = client.get('/schemes/?limit=2&cursor=' + encode_cursor(last)).get_json()
+    assert body == {'items': [], 'next_cursor': None}
+
+
+def test_schemes_added_between_pages_are_not_repeated(client):
+    add_schemes(6)
+    first = client.get('/schemes/?limit=4').get_json()
+    add_schemes(3, start=6)
+    second = client.get('/schemes/?limit=4&cursor=' + first['next_cursor']).get_json()
+    seen = [item['_id'] for item in first['items'] + second['items']]
+    assert len(seen) == len(set(seen))
+    assert seen == all_ids()[:len(seen)]
+
+
+def test_limit_is_clamped(client, monkeypatch):
+    monkeypatch.setattr(Config, 'MAX_PAGE_SIZE', 3)
+    add_schemes(5)
+    assert len(client.get('/schemes/?limit=0').get_json()['items']) == 1
+    assert len(client.get('/schemes/?limit=100').get_json()['items']) == 3
+
+
+@pytest.mark.parametrize('query', ['limit=abc', 'cursor=not-a-cursor', 'cursor=AAAA', 'stream=xml'])
+def test_bad_parameters_are_rejected(client, query):
+    add_schemes(2)
+    response = client.get('/schemes/?' + query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_cursor_round_trip():
+    add_schemes(1)
+    scheme_id = all_ids()[0]
+    assert str(decode_cursor(encode_cursor(scheme_id))) == scheme_id
+    with pytest.raises(ValueError):
+        decode_cursor('!!')
+
+
+def test_stream_formats(client):
+    add_schemes(7)
+    as_json = client.get('/schemes/?stream=json')
+    assert as_json.mimetype == 'application/json'
+    assert [doc['_id'] for doc in json.loads(as_json.get_data(as_text=True))] == all_ids()
+
+    as_ndjson = client.get('/schemes/?stream=ndjson')
+    assert as_ndjson.mimetype == 'application/x-ndjson'
+    lines = as_ndjson.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['_id'] for line in lines] == all_ids()
+
+    # A cursor also works as the starting point of a stream
+    start = all_ids()[2]
+    rest = client.get('/schemes/?stream=json&cursor=' + encode_cursor(start))
+    assert [doc['_id'] for doc in json.loads(rest.get_data(as_text=True))] == all_ids()[3:]
+
+
+def test_plain_listing_without_parameters(client):
+    add_schemes(3)
+    body = client.get('/schemes/').get_json()
+    assert isinstance(body, list) and len(body) == 3
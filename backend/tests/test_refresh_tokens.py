@@ -0,0 +1,104 @@
+"""Rotating refresh tokens and reuse detection (refresh_tokens.py, /auth/refresh)."""
+from datetime import datetime, timedelta, timezone
+
+import metrics
+from models import refresh_tokens_collection
+from refresh_tokens import issue_refresh_token, rotate_refresh_token, revoke_user_refresh_tokens
+
+
+def signup(client, phone='9876543210'):
+    response = client.post('/auth/signup', json={'phone': phone, 'password': 'secret123'})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def refresh(client, token):
+    return client.post('/auth/refresh', json={'refresh_token': token})
+
+
+def test_refresh_rotates_the_token(client):
+    user = signup(client)
+    response = refresh(client, user['refresh_token'])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['user_id'] == user['user_id']
+    assert body['access_token']
+    assert body['refresh_token'] != user['refresh_token']
+
+    # The new token works once more, and only the clear token's digest is stored
+    assert refresh(client, body['refresh_token']).status_code == 200
+    assert refresh_tokens_collection.find_one({'_id': body['refresh_token']}) is None
+
+
+def test_new_access_token_is_accepted(client):
+    user = signup(client)
+    body = refresh(client, user['refresh_token']).get_json()
+    response = client.get('/auth/profile', headers={'Authorization': 'Bearer ' + body['access_token']})
+    assert response.status_code == 200
+    assert response.get_json()['phone'] == '9876543210'
+
+
+def test_reused_token_revokes_the_family(client):
+    user = signup(client)
+    first = user['refresh_token']
+    second = refresh(client, first).get_json()['refresh_token']
+    third = refresh(client, second).get_json()['refresh_token']
+
+    detected = metrics.get_counter('refresh_tokens.reuse_detected')
+    # Presenting an already used token means it was copied
+    assert refresh(client, first).status_code == 401
+    assert metrics.get_counter('refresh_tokens.reuse_detected') == detected + 1
+    # ... so the token the legitimate holder has now is dead too
+    assert refresh(client, third).status_code == 401
+    assert refresh_tokens_collection.count_documents({}) == 0
+
+
+def test_reuse_leaves_other_sessions_alone(client):
+    user = signup(client)
+    other = client.post('/auth/login', json={'phone': '9876543210', 'password': 'secret123'}).get_json()
+    assert refresh(client, user['refresh_token']).status_code == 200
+    assert refresh(client, user['refresh_token']).status_code == 401
+    assert refresh(client, other['refresh_token']).status_code == 200
+
+
+def test_rotation_succeeds_once(client):
+    user_id = signup(client)['user_id']
+    token = issue_refresh_token(user_id)
+    rotated = rotate_refresh_token(token)
+    assert rotated is not None and rotated[0] == user_id
+    assert rotate_refresh_token(token) is None
+
+
+def test_expired_token_is_refused(client):
+    user_id = signup(client)['user_id']
+    token = issue_refresh_token(user_id)
+    refresh_tokens_collection.update_many(
+        {'user_id': {'$exists': True}},
+        {'$set': {'expires_at': datetime.now(timezone.utc) - timedelta(seconds=1)}},
+    )
+    assert refresh(client, token).status_code == 401
+
+
+def test_unknown_and_malformed_tokens_are_refused(client):
+    signup(client)
+    assert refresh(client, 'not-a-token').status_code == 401
+    assert refresh(client, None).status_code == 401
+    assert refresh(client, 12345).status_code == 401
+    assert client.post('/auth/refresh', json={}).status_code == 401
+    # Unknown tokens are not taken for reuse
+    assert refresh_tokens_collection.count_documents({}) == 1
+
+
+def test_logout_revokes_the_session(client):
+    user = signup(client)
+    next_token = refresh(client, user['refresh_token']).get_json()['refresh_token']
+    assert client.post('/auth/logout', json={'refresh_token': next_token}).status_code == 200
+    assert refresh(client, next_token).status_code == 401
+
+
+def test_revoke_user_refresh_tokens_logs_out_everywhere(client):
+    user = signup(client)
+    other = client.post('/auth/login', json={'phone': '9876543210', 'password': 'secret123'}).get_json()
+    revoke_user_refresh_tokens(user['user_id'])
+    assert refresh(client, user['refresh_token']).status_code == 401
+    assert refresh(client, other['refresh_token']).status_code == 401
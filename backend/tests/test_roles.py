@@ -0,0 +1,162 @@
+"""Role claims, the admin guard and revocation of admin tokens (roles.py)."""
+import time
+
+import pytest
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+from pymongo.errors import ServerSelectionTimeoutError
+
+import roles
+from config import Config
+from models import create_user, role_revocations_collection, users_collection
+
+
+@pytest.fixture(autouse=True)
+def fresh_revocations(monkeypatch):
+    """Each test starts with this worker's revocation cache empty and unloaded."""
+    monkeypatch.setattr(roles, '_revoked', frozenset())
+    monkeypatch.setattr(roles, '_revoked_loaded_at', None)
+
+
+def make_user(app, phone, role='user'):
+    user_id = str(create_user(None, phone, 'not-a-real-hash', role=role))
+    with app.app_context():
+        token = roles.create_user_token(user_id, role)
+    return user_id, {'Authorization': 'Bearer ' + token}
+
+
+def is_admin(client, headers):
+    response = client.get('/admin/check', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['is_admin']
+
+
+def test_role_claim_decides_admin_access(app, client):
+    _, admin = make_user(app, '9000000001', role='admin')
+    _, user = make_user(app, '9000000002')
+    assert is_admin(client, admin)
+    assert not is_admin(client, user)
+    assert client.get('/admin/users', headers=admin).status_code == 200
+    assert client.get('/admin/users', headers=user).status_code == 403
+    assert client.get('/admin/users').status_code == 401
+
+
+def test_token_without_role_claim_looks_up_the_user(app, client):
+    admin_id, _ = make_user(app, '9000000001', role='admin')
+    user_id, _ = make_user(app, '9000000002')
+    with app.app_context():
+        legacy_admin = {'Authorization': 'Bearer ' + create_access_token(identity=admin_id)}
+        legacy_user = {'Authorization': 'Bearer ' + create_access_token(identity=user_id)}
+    assert is_admin(client, legacy_admin)
+    assert not is_admin(client, legacy_user)
+
+
+def test_demotion_revokes_existing_admin_token(app, client):
+    _, boss = make_user(app, '9000000001', role='admin')
+    demoted_id, demoted = make_user(app, '9000000002', role='admin')
+    assert is_admin(client, demoted)
+
+    response = client.put(f'/admin/users/{demoted_id}/role', json={'role': 'user'}, headers=boss)
+    assert response.status_code == 200
+    # The old token still says admin but is refused at once in this worker
+    assert not is_admin(client, demoted)
+    assert client.get('/admin/users', headers=demoted).status_code == 403
+    assert role_revocations_collection.find_one({'_id': demoted_id}) is not None
+    assert is_admin(client, boss)
+
+
+def test_promotion_restores_admin_token(app, client):
+    _, boss = make_user(app, '9000000001', role='admin')
+    user_id, token = make_user(app, '9000000002', role='admin')
+    client.put(f'/admin/users/{user_id}/role', json={'role': 'user'}, headers=boss)
+    assert not is_admin(client, token)
+
+    response = client.put(f'/admin/users/{user_id}/role', json={'role': 'admin'}, headers=boss)
+    assert response.status_code == 200
+    assert is_admin(client, token)
+    assert role_revocations_collection.find_one({'_id': user_id}) is None
+
+
+def test_role_update_validates_input(app, client):
+    _, boss = make_user(app, '9000000001', role='admin')
+    user_id, _ = make_user(app, '9000000002')
+    assert client.put(f'/admin/users/{user_id}/role', json={'role': 'root'}, headers=boss).status_code == 400
+    missing = '0' * 24
+    assert client.put(f'/admin/users/{missing}/role', json={'role': 'user'}, headers=boss).status_code == 404
+    assert role_revocations_collection.count_documents({}) == 0
+
+
+def test_deleted_admin_token_is_refused(app, client):
+    _, boss = make_user(app, '9000000001', role='admin')
+    deleted_id, deleted = make_user(app, '9000000002', role='admin')
+    assert client.delete(f'/admin/users/{deleted_id}', headers=boss).status_code == 200
+    assert client.get('/admin/users', headers=deleted).status_code == 403
+
+
+def test_other_workers_see_revocation_after_reload(app, client, monkeypatch):
+    user_id, token = make_user(app, '9000000001', role='admin')
+    assert is_admin(client, token)
+
+    # Another worker demotes the user: only the shared collection changes here
+    role_revocations_collection.insert_one({'_id': user_id})
+    assert is_admin(client, token), 'cached revocations are reused until ROLE_REVOCATION_TTL'
+
+    monkeypatch.setattr(roles, '_revoked_loaded_at', time.monotonic() - Config.ROLE_REVOCATION_TTL - 1)
+    assert not is_admin(client, token)
+
+    # ... and a restore made elsewhere reaches this worker the same way
+    role_revocations_collection.delete_one({'_id': user_id})
+    monkeypatch.setattr(Config, 'ROLE_REVOCATION_TTL', 0)
+    assert is_admin(client, token)
+
+
+class Unreachable:
+    """Stands in for a collection while Mongo is unreachable."""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ServerSelectionTimeoutError('Mongo is unreachable')
+        return fail
+
+
+def test_unloaded_revocations_fall_back_to_stored_role(app, client, monkeypatch):
+    _, admin = make_user(app, '9000000001', role='admin')
+    demoted_id, demoted = make_user(app, '9000000002', role='admin')
+    users_collection.update_one({'_id': ObjectId(demoted_id)}, {'$set': {'role': 'user'}})
+    role_revocations_collection.insert_one({'_id': demoted_id})
+
+    monkeypatch.setattr(roles, 'role_revocations_collection', Unreachable())
+    # The demoted admin's claim is not trusted on an empty set
+    assert client.get('/admin/users', headers=demoted).status_code == 403
+    assert client.get('/admin/users', headers=admin).status_code == 200
+    assert roles._revoked_loaded_at is None
+
+    # The next check retries the load instead of waiting for ROLE_REVOCATION_TTL
+    monkeypatch.setattr(roles, 'role_revocations_collection', role_revocations_collection)
+    assert client.get('/admin/users', headers=demoted).status_code == 403
+    assert roles._revoked == frozenset([demoted_id])
+
+
+def test_failed_reload_keeps_previous_set_and_retries(app, client, monkeypatch):
+    demoted_id, demoted = make_user(app, '9000000001', role='admin')
+    role_revocations_collection.insert_one({'_id': demoted_id})
+    assert not is_admin(client, demoted)
+
+    stale = time.monotonic() - Config.ROLE_REVOCATION_TTL - 1
+    monkeypatch.setattr(roles, '_revoked_loaded_at', stale)
+    monkeypatch.setattr(roles, 'role_revocations_collection', Unreachable())
+    assert not is_admin(client, demoted)
+    assert roles._revoked_loaded_at == stale
+
+    monkeypatch.setattr(roles, 'role_revocations_collection', role_revocations_collection)
+    role_revocations_collection.delete_one({'_id': demoted_id})
+    assert is_admin(client, demoted)
+    assert roles._revoked_loaded_at > stale
+
+
+def test_admin_check_is_refused_while_mongo_is_down(app, client, monkeypatch):
+    _, admin = make_user(app, '9000000001', role='admin')
+    monkeypatch.setattr(roles, 'role_revocations_collection', Unreachable())
+    monkeypatch.setattr(roles, 'find_user_by_id', Unreachable().find_one)
+    response = client.get('/admin/users', headers=admin)
+    assert response.status_code == 503
@@ -0,0 +1,128 @@
+"""The reverse eligibility index (user_index.py): counts, limits and snapshot rebuilds."""
+import threading
+import time
+
+import pytest
+
+import user_index
+from config import Config
+from eligibility import check_eligibility
+from models import create_user, users_collection
+
+SCHEME = {'_id': 'scheme', 'min_age': 18, 'max_age': 40, 'states': ['Maharashtra', 'Goa'], 'tags': ['women']}
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_snapshot(monkeypatch):
+    monkeypatch.setattr(user_index, '_current', (None, {}))
+    monkeypatch.setattr(user_index, '_pending', None)
+
+
+@pytest.fixture
+def users():
+    profiles = []
+    for i in range(60):
+        profiles.append({
+            'age': 10 + i,
+            'state': ['Maharashtra', 'Goa', 'Delhi'][i % 3],
+            'gender': 'female' if i % 4 == 0 else 'male',
+        })
+    return {str(create_user(None, '90000%05d' % i, 'hash', profile=p)): p for i, p in enumerate(profiles)}
+
+
+def expected_ids(users):
+    return {user_id for user_id, profile in users.items() if check_eligibility(profile, SCHEME)[0]}
+
+
+def wait_for_rebuild():
+    for _ in range(500):
+        if user_index._pending is None:
+            return
+        time.sleep(0.01)
+    raise AssertionError('rebuild did not finish')
+
+
+def test_counts_and_ids_match_check_eligibility(users):
+    result = user_index.eligible_users_for_scheme(SCHEME)
+    assert set(result['user_ids']) == expected_ids(users)
+    assert result['eligible_count'] == len(expected_ids(users))
+    assert result['via_tags_count'] == sum(
+        1 for p in users.values() if check_eligibility(p, SCHEME) == (True, "Eligible based on profile and scheme tags"))
+    assert result['total_users'] == len(users)
+
+
+@pytest.mark.parametrize('limit', [0, 1, 5, 1000])
+def test_limit_only_caps_the_ids(users, limit):
+    user_index.note_user_changed(next(iter(users)), {'age': 25, 'state': 'Goa'})
+    full = user_index.eligible_users_for_scheme(SCHEME)
+    limited = user_index.eligible_users_for_scheme(SCHEME, limit=limit)
+    assert len(limited['user_ids']) == min(limit, full['eligible_count'])
+    assert set(limited['user_ids']) <= set(full['user_ids'])
+    for key in ('eligible_count', 'via_tags_count', 'total_users'):
+        assert limited[key] == full[key]
+
+
+def test_overlay_changes_are_counted(users):
+    before = user_index.eligible_users_for_scheme(SCHEME)
+    ineligible = next(u for u in users if u not in expected_ids(users))
+    eligible = next(iter(expected_ids(users)))
+    user_index.note_user_changed(ineligible, {'age': 30, 'state': 'Goa'})
+    user_index.note_user_changed(eligible, None)
+    after = user_index.eligible_users_for_scheme(SCHEME)
+    assert ineligible in after['user_ids'] and eligible not in after['user_ids']
+    assert after['eligible_count'] == before['eligible_count']
+    assert after['total_users'] == before['total_users'] - 1
+
+
+def test_expired_snapshot_is_rebuilt_in_the_background(users, monkeypatch):
+    first = user_index.get_user_snapshot()
+    load_started, release = threading.Event(), threading.Event()
+    load_profiles = user_index._load_profiles
+
+    def slow_load():
+        load_started.set()
+        release.wait(5)
+        return load_profiles()
+
+    monkeypatch.setattr(user_index, '_load_profiles', slow_load)
+    monkeypatch.setattr(Config, 'USER_SNAPSHOT_TTL', 0)
+
+    # The expired snapshot is still served while the new one loads
+    assert user_index.get_user_snapshot() is first
+    assert load_started.wait(5)
+    assert user_index.get_user_snapshot() is first
+
+    # A user who signs up during the load is found both before and after the swap
+    newcomer = str(create_user(None, '9111111111', 'hash', profile={'age': 30, 'state': 'Goa'}))
+    user_index.note_user_changed(newcomer, {'age': 30, 'state': 'Goa'})
+    assert newcomer in user_index.eligible_users_for_scheme(SCHEME)['user_ids']
+
+    monkeypatch.setattr(Config, 'USER_SNAPSHOT_TTL', 300)
+    release.set()
+    wait_for_rebuild()
+    snapshot, overlay = user_index._current
+    assert snapshot is not first
+    assert len(snapshot) == users_collection.count_documents({})
+    assert newcomer in overlay
+    assert newcomer in user_index.eligible_users_for_scheme(SCHEME)['user_ids']
+    assert user_index._pending is None
+
+
+def test_only_one_rebuild_runs_at_a_time(users, monkeypatch):
+    user_index.get_user_snapshot()
+    release = threading.Event()
+    loads = []
+    load_profiles = user_index._load_profiles
+
+    def slow_load():
+        loads.append(1)
+        release.wait(5)
+        return load_profiles()
+
+    monkeypatch.setattr(user_index, '_load_profiles', slow_load)
+    monkeypatch.setattr(Config, 'USER_SNAPSHOT_TTL', 0)
+    for _ in range(20):
+        user_index.get_user_snapshot()
+    release.set()
+    wait_for_rebuild()
+    assert len(loads) == 1
@@ -0,0 +1,232 @@
+"""
+Free-text search over scheme text for the chatbot.
+
+A BM25 index over each scheme's name, objective, eligibility, benefits and
+tags, in every language the scheme has. Postings are kept per term and turned
+into NumPy arrays on first use, so a query scores every scheme with a few
+vector operations. Query words are also matched through the tag synonym
+groups ('mahila' finds 'women').
+
+The index follows the catalog snapshot: snapshots reuse the dicts of
+unchanged schemes, so after a write only the schemes whose dict changed are
+re-indexed, and deleted ones are removed.
+"""
+import math
+import re
+import threading
+import numpy as np
+from catalog import get_catalog
+from tag_index import SYNONYM_GROUPS
+from normalization import alias_key
+import metrics
+
+# Field -> weight (how many times its words count)
+FIELD_WEIGHTS = {
+    'scheme_name': 3,
+    'tags': 2,
+    'objective': 1,
+    'eligibility': 1,
+    'benefits': 1,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Query words found only through a synonym count this much
+SYNONYM_WEIGHT = 0.5
+
+# Latin letters and digits, or Devanagari including its vowel signs
+TOKEN_RE = re.compile(r'[a-z0-9]+|[ऀ-ॣ०-ॿ]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do for from get give has have help how i in is it me my
+of on or our scheme schemes so that the their there this to under want what which who
+will with you your
+""".split())
+
+_SYNONYMS = {}
+for _group in SYNONYM_GROUPS:
+    _words = [_term for _term in _group if ' ' not in _term]
+    for _term in _words:
+        _SYNONYMS[alias_key(_term)] = [alias_key(_other) for _other in _words if _other != _term]
+
+
+def _stem(token):
+    # Plural 's' only; the same rule runs on schemes and queries
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss') and token.isascii():
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Index terms of a piece of text."""
+    return [
+        _stem(token) for token in TOKEN_RE.findall(str(text).lower())
+        if token not in STOPWORDS and (len(token) > 1 or not token.isascii())
+    ]
+
+
+def _scheme_terms(scheme):
+    """term -> weighted frequency for one scheme, over every language."""
+    counts = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = scheme.get(field)
+        if isinstance(value, dict):
+            texts = value.values()
+        elif isinstance(value, (list, tuple)):
+            texts = value
+        else:
+            texts = [value] if value else []
+        for text in texts:
+            for term in tokenize(text):
+                counts[term] = counts.get(term, 0) + weight
+    return counts
+
+
+class TextIndex:
+    """
+    BM25 index with one slot per scheme. Slots of deleted schemes are reused.
+
+    Postings are term -> {slot: frequency}; _arrays caches each term's
+    postings as (slots, frequencies) arrays until the term changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._slots = {}             # scheme _id -> slot
+        self._schemes = []           # slot -> indexed scheme dict (None if free)
+        self._terms = []             # slot -> that scheme's term counts
+        self._free = []
+        self._lengths = np.zeros(0, dtype=np.float64)
+        self._total_length = 0.0
+        self._postings = {}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    # ── Maintenance ──────────────────────────────────────────────────────────
+
+    def _remove(self, scheme_id):
+        slot = self._slots.pop(scheme_id)
+        for term in self._terms[slot]:
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_length -= self._lengths[slot]
+        self._lengths[slot] = 0
+        self._schemes[slot] = None
+        self._terms[slot] = {}
+        self._free.append(slot)
+
+    def _add(self, scheme):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._schemes)
+            self._schemes.append(None)
+            self._terms.append({})
+            if slot >= len(self._lengths):
+                self._lengths = np.concatenate([self._lengths, np.zeros(max(slot, 16))])
+        terms = _scheme_terms(scheme)
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[slot] = count
+            self._arrays.pop(term, None)
+        self._slots[scheme['_id']] = slot
+        self._schemes[slot] = scheme
+        self._terms[slot] = terms
+        self._lengths[slot] = sum(terms.values())
+        self._total_length += self._lengths[slot]
+
+    def sync(self, snapshot):
+        """Bring the index up to date with a catalog snapshot."""
+        if snapshot is self._snapshot:
+            return
+        changed = 0
+        for scheme_id in [i for i in self._slots if i not in snapshot.by_id]:
+            self._remove(scheme_id)
+            changed += 1
+        for scheme in snapshot.schemes:
+            slot = self._slots.get(scheme['_id'])
+            if slot is not None and self._schemes[slot] is scheme:
+                continue
+            if slot is not None:
+                self._remove(scheme['_id'])
+            self._add(scheme)
+            changed += 1
+        self._snapshot = snapshot
+        metrics.incr('text_index.reindexed_schemes', changed)
+
+    # ── Search ───────────────────────────────────────────────────────────────
+
+    def _postings_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = self._arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+        return arrays
+
+    def _query_weights(self, query):
+        weights = {}
+        for term in tokenize(query):
+            weights[term] = 1.0
+            for synonym in _SYNONYMS.get(term, ()):
+                weights.setdefault(_stem(synonym), SYNONYM_WEIGHT)
+        return weights
+
+    def search(self, query, limit):
+        """
+        Best matching schemes for a free-text query.
+
+        Returns:
+            tuple: (number of matching schemes, up to `limit` (score, scheme) pairs, best first)
+        """
+        weights = self._query_weights(query)
+        count = len(self._slots)
+        if not weights or not count:
+            return 0, []
+
+        scores = np.zeros(len(self._lengths))
+        average_length = self._total_length / count or 1.0
+        length_norm = K1 * (1 - B + B * self._lengths / average_length)
+        for term, weight in weights.items():
+            if term not in self._postings:
+                continue
+            slots, frequencies = self._postings_arrays(term)
+            idf = math.log(1 + (count - len(slots) + 0.5) / (len(slots) + 0.5))
+            scores[slots] += weight * idf * frequencies * (K1 + 1) / (frequencies + length_norm[slots])
+
+        matched = np.flatnonzero(scores > 0)
+        total = len(matched)
+        if total > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        best = matched[np.argsort(-scores[matched], kind='stable')]
+        return total, [(float(scores[slot]), self._schemes[slot]) for slot in best]
+
+
+_index = TextIndex()
+
+
+def search_schemes_by_text(query, limit=10, snapshot=None):
+    """
+    Search the current catalog by free text.
+
+    Args:
+        query: Words in English, Hindi or Marathi
+        limit: Most results to return
+        snapshot: Catalog snapshot to search (default: the current one)
+
+    Returns:
+        tuple: (number of matching schemes, (score, scheme) pairs, best first)
+    """
+    snapshot = snapshot or get_catalog()
+    with _index._lock:
+        _index.sync(snapshot)
+        return _index.search(query, limit)
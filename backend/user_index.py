@@ -0,0 +1,379 @@
+"""
+Reverse eligibility index: which users qualify for a scheme.
+
+User profiles are snapshotted into compact NumPy columns (age, state/category/
+education codes, student and disability bits, tag attribute codes). A scheme is
+compiled once and every per-value check is done on the small set of distinct
+codes, so matching it against the whole user base is a few array operations.
+Profiles changed after the snapshot was taken are kept in a small overlay and
+checked one by one until the next rebuild. Rebuilds after the first run on a
+background thread while the old snapshot and its overlay keep being served.
+"""
+import threading
+import time
+import numpy as np
+from bson import ObjectId
+from config import Config
+from models import users_collection
+from eligibility import (
+    CompiledScheme,
+    ProfileFacts,
+    evaluate_eligibility,
+)
+from tag_index import TAG_INDEX
+import metrics
+
+# Overlay size that triggers a full snapshot rebuild
+MAX_OVERLAY_SIZE = 5000
+
+
+class _Codes:
+    """Maps distinct values to small integer codes (-1 means missing)."""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self._index.get(value)
+        if code is None:
+            code = len(self.values)
+            self._index[value] = code
+            self.values.append(value)
+        return code
+
+
+class UserSnapshot:
+    """
+    Column-oriented snapshot of all user profiles.
+
+    Columns (one row per user):
+        ids: S12 raw ObjectId bytes
+        evaluable: bool, False for empty profiles or profiles check_eligibility rejects
+        has_age, age: bool / int32
+        state, category, education: int32 codes into the matching vocabulary
+        student, disability: int8 bits
+        attributes: int32 code into the distinct tag-attribute tuples, each of which
+            is a packed bitmask row over the distinct attribute strings
+    """
+
+    def __init__(self, profiles, loaded_at=None):
+        states, categories, education, attributes = _Codes(), _Codes(), _Codes(), _Codes()
+        n = len(profiles)
+        self.ids = np.empty(n, dtype='S12')
+        self.evaluable = np.zeros(n, dtype=bool)
+        self.has_age = np.zeros(n, dtype=bool)
+        self.age = np.zeros(n, dtype=np.int32)
+        self.state = np.full(n, -1, dtype=np.int32)
+        self.category = np.full(n, -1, dtype=np.int32)
+        self.education = np.full(n, -1, dtype=np.int32)
+        self.student = np.zeros(n, dtype=np.int8)
+        self.disability = np.zeros(n, dtype=np.int8)
+        self.attributes = np.zeros(n, dtype=np.int32)
+
+        for row, (user_id, profile) in enumerate(profiles):
+            self.ids[row] = ObjectId(user_id).binary
+            facts = _profile_facts(profile)
+            if facts is None:
+                continue
+            self.evaluable[row] = True
+            if facts.age is not None:
+                self.has_age[row] = True
+                self.age[row] = facts.age
+            if facts.state:
+                self.state[row] = states.code((facts.state_norm, str(facts.state).lower()))
+            if facts.category:
+                self.category[row] = categories.code((facts.category_norm, str(facts.category).lower()))
+            if facts.education:
+                self.education[row] = education.code((facts.education_norm, str(facts.education).lower()))
+            self.student[row] = facts.student == 'yes'
+            self.disability[row] = facts.has_disability
+            self.attributes[row] = attributes.code(tuple(facts.attributes))
+
+        self.state_values = states.values
+        self.category_values = categories.values
+        self.education_values = education.values
+        # Each distinct attribute tuple becomes a bitmask over the distinct attribute strings
+        names = _Codes()
+        membership = [[names.code(attr) for attr in attrs] for attrs in attributes.values]
+        self.attribute_names = names.values
+        tuple_bits = np.zeros((len(membership), max(len(names.values), 1)), dtype=bool)
+        for row, codes in enumerate(membership):
+            tuple_bits[row, codes] = True
+        self.attribute_bits = np.packbits(tuple_bits, axis=1)
+        self.created_at = time.monotonic()
+        # Wall-clock time the profiles were read; later changes are not in the snapshot
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def evaluate(self, compiled):
+        """
+        Match every snapshotted user against a compiled scheme.
+
+        Returns:
+            tuple: (eligible, via_tags) boolean arrays, one entry per user
+        """
+        failed = np.zeros(len(self), dtype=bool)
+        critical = np.zeros(len(self), dtype=bool)
+
+        if compiled.min_age is not None:
+            too_young = self.has_age & (self.age < compiled.min_age)
+            failed |= too_young
+            critical |= too_young
+        if compiled.max_age is not None:
+            too_old = self.has_age & (self.age > compiled.max_age)
+            failed |= too_old
+            critical |= too_old
+
+        if compiled.states.active:
+            self._apply_list_rule(
+                self.state, self.state_values, compiled.states,
+                "not available in {}", failed, critical)
+        if compiled.categories.active:
+            self._apply_list_rule(
+                self.category, self.category_values, compiled.categories,
+                "category {} not eligible", failed, critical)
+
+        if compiled.requires_disability:
+            failed |= self.disability == 0
+
+        if compiled.student_required is True:
+            only_students = self.student == 0
+            failed |= only_students
+            critical |= only_students
+        elif compiled.student_required is False:
+            failed |= self.student == 1
+
+        if compiled.education.active:
+            self._apply_list_rule(
+                self.education, self.education_values, compiled.education,
+                "education level {} not eligible", failed, critical)
+
+        if compiled.tags:
+            hits = np.zeros(self.attribute_bits.shape[1] * 8, dtype=bool)
+            for i, attr in enumerate(self.attribute_names):
+                hits[i] = not TAG_INDEX.tags_for_attribute(attr).isdisjoint(compiled.tags)
+            tuple_ok = (self.attribute_bits & np.packbits(hits)).any(axis=1)
+            tags_match = tuple_ok[self.attributes] if len(tuple_ok) else np.zeros(len(self), dtype=bool)
+        else:
+            tags_match = np.ones(len(self), dtype=bool)
+
+        via_tags = self.evaluable & failed & ~critical & tags_match
+        eligible = (self.evaluable & ~failed) | via_tags
+        return eligible, via_tags
+
+    @staticmethod
+    def _apply_list_rule(codes, values, rule, reason, failed, critical):
+        """Fail users whose value the scheme's ListRule does not allow (per distinct code)."""
+        if not values:
+            return
+        ok = np.array([rule.allows(norm) for norm, _ in values], dtype=bool)
+        # check_eligibility treats any reason mentioning 'age' as critical
+        is_critical = np.array(['age' in reason.format(raw) for _, raw in values], dtype=bool)
+        present = codes >= 0
+        mismatch = np.zeros(len(codes), dtype=bool)
+        mismatch[present] = ~ok[codes[present]]
+        failed |= mismatch
+        critical[present] |= mismatch[present] & is_critical[codes[present]]
+
+
+def _hex_id(raw):
+    """Hex user id from an S12 cell (NumPy drops trailing NUL bytes on read)."""
+    return raw.ljust(12, b'\0').hex()
+
+
+def _profile_facts(profile):
+    """ProfileFacts for a profile, or None if check_eligibility can never pass it."""
+    if not profile:
+        return None
+    try:
+        facts = ProfileFacts(profile)
+    except TypeError:
+        return None
+    if facts.invalid_age:
+        return None
+    return facts
+
+
+# ─── Snapshot Management ──────────────────────────────────────────────────────
+
+# (snapshot, overlay), swapped as one so a snapshot is never paired with
+# another snapshot's overlay. The overlay maps user ids to profiles changed
+# since the snapshot was loaded (None for deleted users).
+_current = (None, {})
+# Overlay for the snapshot being built, or None when no rebuild is running
+_pending = None
+_build_lock = threading.Lock()
+_first_build_lock = threading.Lock()
+
+
+def _load_profiles():
+    cursor = users_collection.find({}, {'profile': 1}).batch_size(5000)
+    return [(user['_id'], user.get('profile') or {}) for user in cursor]
+
+
+def _start_rebuild():
+    """Claim the rebuild. Returns False if one is already running."""
+    global _pending
+    with _build_lock:
+        if _pending is not None:
+            return False
+        # Changes from now on go into the new snapshot's overlay as well,
+        # since its load may or may not see them
+        _pending = {}
+        return True
+
+
+def _rebuild():
+    """Load a new snapshot and swap it in; call after _start_rebuild()."""
+    global _current, _pending
+    try:
+        loaded_at = time.time()
+        start = time.perf_counter()
+        snapshot = UserSnapshot(_load_profiles(), loaded_at)
+        metrics.observe('user_index.snapshot_build', time.perf_counter() - start)
+        with _build_lock:
+            _current = (snapshot, _pending)
+    finally:
+        with _build_lock:
+            _pending = None
+
+
+def _rebuild_in_background():
+    try:
+        _rebuild()
+    except Exception as e:
+        print(f"User snapshot rebuild failed: {e}")
+
+
+def _current_state():
+    """
+    The current (snapshot, overlay). Only the first snapshot is built on the
+    calling thread; once it expires or the overlay grows too big, a rebuild
+    starts in the background and the old one is served until it is done.
+    """
+    snapshot, overlay = _current
+    if snapshot is None:
+        with _first_build_lock:
+            if _current[0] is None and _start_rebuild():
+                _rebuild()
+        return _current
+
+    if ((time.monotonic() - snapshot.created_at >= Config.USER_SNAPSHOT_TTL
+            or len(overlay) >= MAX_OVERLAY_SIZE) and _start_rebuild()):
+        metrics.incr('user_index.background_rebuilds')
+        threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    return snapshot, overlay
+
+
+def get_user_snapshot():
+    """Return the current snapshot (see _current_state)."""
+    return _current_state()[0]
+
+
+def note_user_changed(user_id, profile=None):
+    """
+    Record a profile update (or a deletion when profile is None) made after
+    the snapshot was taken.
+    """
+    user_id = str(user_id)
+    with _build_lock:
+        _current[1][user_id] = profile
+        if _pending is not None:
+            _pending[user_id] = profile
+
+
+def eligible_users_for_scheme(scheme, limit=None):
+    """
+    Find every user who qualifies for a scheme.
+
+    Args:
+        scheme: Scheme dictionary
+        limit: Most user ids to return (None for all); the counts cover everyone
+
+    Returns:
+        dict: user_ids (list of str), eligible_count, via_tags_count (users
+              eligible only through tags), total_users and snapshot_loaded_at
+              (wall-clock time the profiles were read)
+    """
+    compiled = CompiledScheme(scheme)
+    snapshot, overlay = _current_state()
+    with _build_lock:
+        overlay = dict(overlay)
+
+    eligible, via_tags = snapshot.evaluate(compiled)
+    total_users = len(snapshot)
+    if overlay:
+        overridden = np.isin(snapshot.ids, [ObjectId(uid).binary for uid in overlay])
+        eligible &= ~overridden
+        via_tags &= ~overridden
+        total_users = int((~overridden).sum()) + sum(1 for p in overlay.values() if p is not None)
+
+    eligible_count = int(eligible.sum())
+    via_tags_count = int(via_tags.sum())
+    rows = np.flatnonzero(eligible)
+    if limit is not None:
+        rows = rows[:max(limit, 0)]
+    # Only the ids returned are converted to hex strings
+    user_ids = [_hex_id(raw) for raw in snapshot.ids[rows]]
+
+    for user_id, profile in overlay.items():
+        facts = _profile_facts(profile) if profile is not None else None
+        if facts is None:
+            continue
+        is_eligible, reason = evaluate_eligibility(facts, compiled)
+        if is_eligible:
+            eligible_count += 1
+            if reason != "Eligible":
+                via_tags_count += 1
+            if limit is None or len(user_ids) < limit:
+                user_ids.append(user_id)
+
+    return {
+        'user_ids': user_ids,
+        'eligible_count': eligible_count,
+        'via_tags_count': via_tags_count,
+        'total_users': total_users,
+        'snapshot_loaded_at': snapshot.loaded_at,
+    }
+
+
+# ─── Background Fan-out ───────────────────────────────────────────────────────
+
+_fanout_handlers = []
+
+
+def register_fanout_handler(handler):
+    """
+    Register a callable run after a scheme write as handler(scheme_id, scheme, result),
+    where result is the eligible_users_for_scheme dict (None when the scheme was deleted).
+    """
+    _fanout_handlers.append(handler)
+    return handler
+
+
+def _run_fanout(scheme_id, scheme):
+    try:
+        start = time.perf_counter()
+        result = eligible_users_for_scheme(scheme) if scheme is not None else None
+        if result is not None:
+            metrics.observe('user_index.scheme_match', time.perf_counter() - start)
+            metrics.incr('user_index.eligible_users_found', result['eligible_count'])
+        metrics.incr('user_index.fanouts')
+        for handler in _fanout_handlers:
+            handler(scheme_id, scheme, result)
+    except Exception as e:
+        print(f"Scheme fan-out error for {scheme_id}: {e}")
+
+
+def schedule_scheme_fanout(scheme_id, scheme):
+    """Match a created or updated scheme against all users on a background thread."""
+    thread = threading.Thread(
+        target=_run_fanout, args=(str(scheme_id), scheme), daemon=True
+    )
+    thread.start()
+    return thread
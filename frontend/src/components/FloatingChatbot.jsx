@@ -142,7 +142,7 @@ function BotAvatar({ size = 26 }) {
 
 /* ─── Main Component ─────────────────────────────────────────────────────────── */
 export default function FloatingChatbot() {
-  const { t } = useTranslation()
+  const { t, i18n } = useTranslation()
 
   const QUICK_PROMPTS = [
     t('chatbotShowAll'),
@@ -156,6 +156,8 @@ export default function FloatingChatbot() {
   const [messages, setMessages]   = useState(() => [{ role: 'model', text: t('chatbotWelcome') }])
   const [input, setInput]         = useState('')
   const [isLoading, setIsLoading] = useState(false)
+  const [sessionId, setSessionId] = useState(null)
+  const [toolStatus, setToolStatus] = useState(null)
 
   const messagesEndRef = useRef(null)
   const textareaRef    = useRef(null)
@@ -183,6 +185,58 @@ export default function FloatingChatbot() {
     }
   }, [isOpen])
 
+  /* ── Stream a reply from /chat/stream (Server-Sent Events over POST) ── */
+  const streamReply = async (payload) => {
+    const res = await fetch(`${API_URL}/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(payload),
+    })
+    if (!res.ok || !res.body) {
+      const body = await res.json().catch(() => ({}))
+      throw new Error(body.error || t('chatbotError'))
+    }
+
+    // Placeholder bubble that fills in as deltas arrive
+    setMessages(prev => [...prev, { role: 'model', text: '' }])
+    const setReply = (update) => setMessages(prev => {
+      const next = [...prev]
+      next[next.length - 1] = { ...next[next.length - 1], ...update(next[next.length - 1]) }
+      return next
+    })
+
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    for (;;) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      const frames = buffer.split('\n\n')
+      buffer = frames.pop()
+      for (const frame of frames) {
+        const event = frame.match(/^event: (.*)$/m)?.[1]
+        const dataLine = frame.match(/^data: (.*)$/m)?.[1]
+        if (!event || !dataLine) continue
+        const data = JSON.parse(dataLine)
+        if (event === 'session') {
+          setSessionId(data.session_id)
+        } else if (event === 'tool') {
+          // Text before a tool call is not part of the answer
+          setReply(() => ({ text: '' }))
+          setToolStatus(data.status)
+        } else if (event === 'delta') {
+          setToolStatus(null)
+          setReply(m => ({ text: m.text + data.text }))
+        } else if (event === 'done') {
+          setReply(() => ({ text: data.response }))
+        } else if (event === 'error') {
+          setReply(() => ({ text: `⚠️ ${data.error}` }))
+        }
+      }
+    }
+  }
+
   /* ── Send message ── */
   const sendMessage = async (text) => {
     const userText = (text || input).trim()
@@ -197,24 +251,32 @@ export default function FloatingChatbot() {
     setMessages(newMessages)
     setIsLoading(true)
 
-    try {
-      // Build history: skip the initial welcome, exclude the just-added user msg
-      const history = newMessages.slice(1, -1).map(m => ({
+    // The server keeps the conversation; history only seeds a new session
+    // (skip the initial welcome, exclude the just-added user msg)
+    const payload = { message: userText, lang: i18n.language }
+    if (sessionId) {
+      payload.session_id = sessionId
+    } else {
+      payload.history = newMessages.slice(1, -1).map(m => ({
         role: m.role === 'model' ? 'model' : 'user',
         text: m.text,
       }))
+    }
 
-      const res = await axios.post(`${API_URL}/chat/message`, {
-        message: userText,
-        history,
-      })
-
-      setMessages(prev => [...prev, { role: 'model', text: res.data.response }])
+    try {
+      if (window.ReadableStream && window.TextDecoder) {
+        await streamReply(payload)
+      } else {
+        const res = await axios.post(`${API_URL}/chat/message`, payload)
+        if (res.data.session_id) setSessionId(res.data.session_id)
+        setMessages(prev => [...prev, { role: 'model', text: res.data.response }])
+      }
     } catch (err) {
-      const errMsg = err.response?.data?.error || t('chatbotError')
+      const errMsg = err.response?.data?.error || err.message || t('chatbotError')
       setMessages(prev => [...prev, { role: 'model', text: `⚠️ ${errMsg}` }])
     } finally {
       setIsLoading(false)
+      setToolStatus(null)
     }
   }
 
@@ -318,7 +380,7 @@ export default function FloatingChatbot() {
               gap: '10px',
             }}
           >
-            {messages.map((msg, idx) => (
+            {messages.filter(msg => msg.text).map((msg, idx) => (
               <div
                 key={idx}
                 className="im-msg"
@@ -354,8 +416,8 @@ export default function FloatingChatbot() {
               </div>
             ))}
 
-            {/* Typing indicator */}
-            {isLoading && (
+            {/* Typing indicator (until streamed text starts arriving) */}
+            {isLoading && (messages[messages.length - 1].role === 'user' || !messages[messages.length - 1].text) && (
               <div className="im-msg" style={{ display: 'flex', alignItems: 'flex-end', gap: '7px' }}>
                 <BotAvatar size={26} />
                 <div style={{
@@ -368,6 +430,9 @@ export default function FloatingChatbot() {
                   <div className="im-dot1" style={{ width: '7px', height: '7px', borderRadius: '50%', background: '#f59e0b' }} />
                   <div className="im-dot2" style={{ width: '7px', height: '7px', borderRadius: '50%', background: '#f59e0b' }} />
                   <div className="im-dot3" style={{ width: '7px', height: '7px', borderRadius: '50%', background: '#f59e0b' }} />
+                  {toolStatus && (
+                    <span style={{ marginLeft: '6px', fontSize: '12px', color: '#9ca3af' }}>{toolStatus}</span>
+                  )}
                 </div>
               </div>
             )}
@@ -4,12 +4,70 @@ import { API_URL } from '../config'
 
 export const AuthContext = createContext()
 
+// One refresh at a time, across every open tab: refresh tokens rotate, so a
+// second refresh with the same token would be treated as token theft and log
+// the user out everywhere. refreshPromise covers requests within this tab and
+// a Web Lock (where the browser has them) covers the other tabs.
+let refreshPromise = null
+
+const withRefreshLock = (callback) =>
+  navigator.locks ? navigator.locks.request('infomitra-token-refresh', callback) : callback()
+
+const refreshTokens = (failedToken) => {
+  if (!refreshPromise) {
+    refreshPromise = withRefreshLock(async () => {
+      // Tokens are shared through localStorage: if another tab refreshed since
+      // the request failed, use its tokens instead of spending ours again
+      const current = localStorage.getItem('token')
+      if (current && current !== failedToken) {
+        return { access_token: current, refresh_token: localStorage.getItem('refreshToken') }
+      }
+      const response = await axios.post(
+        `${API_URL}/auth/refresh`,
+        { refresh_token: localStorage.getItem('refreshToken') },
+        { skipAuthRefresh: true }
+      )
+      // Stored before the lock is released, so the next tab sees them
+      localStorage.setItem('token', response.data.access_token)
+      localStorage.setItem('refreshToken', response.data.refresh_token)
+      return response.data
+    }).finally(() => { refreshPromise = null })
+  }
+  return refreshPromise
+}
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null)
   const [token, setToken] = useState(localStorage.getItem('token'))
   const [loading, setLoading] = useState(true)
   const [isOnboarded, setIsOnboarded] = useState(false)
 
+  useEffect(() => {
+    // Expired access token: get a new one with the refresh token and replay the request
+    const interceptor = axios.interceptors.response.use(null, async (error) => {
+      const request = error.config
+      if (
+        error.response?.status !== 401 ||
+        !request || request.skipAuthRefresh || request._retried ||
+        /\/auth\/(login|signup)$/.test(request.url || '') ||
+        !localStorage.getItem('refreshToken')
+      ) {
+        return Promise.reject(error)
+      }
+      request._retried = true
+      const failedToken = String(request.headers?.['Authorization'] || '').replace(/^Bearer /, '')
+      try {
+        const data = await refreshTokens(failedToken)
+        login(data.access_token, data.refresh_token)
+        request.headers['Authorization'] = `Bearer ${data.access_token}`
+        return axios(request)
+      } catch (refreshError) {
+        return Promise.reject(error)
+      }
+    })
+    return () => axios.interceptors.response.eject(interceptor)
+  }, [])
+
   useEffect(() => {
     if (token) {
       axios.defaults.headers.common['Authorization'] = `Bearer ${token}`
@@ -32,13 +90,22 @@ export const AuthProvider = ({ children }) => {
     }
   }
 
-  const login = (newToken) => {
+  const login = (newToken, newRefreshToken) => {
     localStorage.setItem('token', newToken)
+    if (newRefreshToken) {
+      localStorage.setItem('refreshToken', newRefreshToken)
+    }
     setToken(newToken)
     axios.defaults.headers.common['Authorization'] = `Bearer ${newToken}`
   }
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refreshToken')
+    if (refreshToken) {
+      axios.post(`${API_URL}/auth/logout`, { refresh_token: refreshToken }, { skipAuthRefresh: true })
+        .catch(() => {})
+      localStorage.removeItem('refreshToken')
+    }
     localStorage.removeItem('token')
     setToken(null)
     setUser(null)
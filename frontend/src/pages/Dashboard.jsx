@@ -18,9 +18,12 @@ const Dashboard = () => {
 
   useEffect(() => {
     checkAdmin()
-    fetchRecentSchemes()
   }, [])
 
+  useEffect(() => {
+    fetchRecentSchemes()
+  }, [i18n.language])
+
   const checkAdmin = async () => {
     try {
       const response = await axios.get(`${API_URL}/admin/check`)
@@ -33,7 +36,9 @@ const Dashboard = () => {
   const fetchRecentSchemes = async () => {
     setLoading(true)
     try {
-      const response = await axios.get(`${API_URL}/schemes/`)
+      const response = await axios.get(`${API_URL}/schemes/`, {
+        params: { lang: i18n.language, fields: 'scheme_name,category,objective' }
+      })
       const sortedSchemes = response.data.slice(0, 6)
       setRecentSchemes(sortedSchemes)
     } catch (error) {
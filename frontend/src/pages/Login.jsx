@@ -37,7 +37,7 @@ const Login = () => {
         ...(isEmail ? { email: formData.identifier } : { phone: formData.identifier })
       }
       const response = await axios.post(`${API_URL}/auth/login`, payload)
-      login(response.data.access_token)
+      login(response.data.access_token, response.data.refresh_token)
       navigate('/dashboard')
     } catch (err) {
       setError(err.response?.data?.error || t('loginFailed'))
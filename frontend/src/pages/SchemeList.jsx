@@ -15,7 +15,7 @@ const SchemeList = () => {
 
   useEffect(() => {
     fetchSchemes()
-  }, [type])
+  }, [type, i18n.language])
 
   const fetchSchemes = async () => {
     setLoading(true)
@@ -23,7 +23,9 @@ const SchemeList = () => {
       const endpoint = type === 'eligible' 
         ? `${API_URL}/schemes/eligible`
         : `${API_URL}/schemes/`
-      const response = await axios.get(endpoint)
+      const response = await axios.get(endpoint, {
+        params: { lang: i18n.language, fields: 'scheme_name,category,objective,tags' }
+      })
       setSchemes(response.data)
     } catch (error) {
       console.error('Failed to fetch schemes', error)
@@ -32,7 +32,7 @@ const Signup = () => {
     setError('')
     try {
       const response = await axios.post(`${API_URL}/auth/signup`, formData)
-      login(response.data.access_token)
+      login(response.data.access_token, response.data.refresh_token)
       navigate('/onboarding')
     } catch (err) {
       setError(err.response?.data?.error || t('signupFailed'))